@@ -0,0 +1,74 @@
+import asyncio
+import hashlib
+import time
+from typing import Any, Awaitable, Callable
+
+from fastapi import Request, Response, status
+
+
+def make_etag(*parts: Any) -> str:
+    """
+    Tạo ETag yếu từ các thành phần phiên bản (yếu vì nội dung có thể được nén khác nhau).
+    """
+    digest = hashlib.blake2b(repr(parts).encode("utf-8"), digest_size=16).hexdigest()
+    return f'W/"{digest}"'
+
+
+def _strip_weak(tag: str) -> str:
+    tag = tag.strip()
+    return tag[2:] if tag.startswith("W/") else tag
+
+
+def is_not_modified(request: Request, etag: str) -> bool:
+    """
+    Kiểm tra If-None-Match (so sánh yếu).
+    """
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is None:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    current = _strip_weak(etag)
+    return any(_strip_weak(tag) == current for tag in if_none_match.split(","))
+
+
+def validator_headers(etag: str) -> dict:
+    # no-cache: trình duyệt được lưu nhưng phải xác thực lại mỗi lần (tự gửi If-None-Match)
+    return {"ETag": etag, "Cache-Control": "no-cache"}
+
+
+def not_modified_response(etag: str) -> Response:
+    return Response(
+        status_code=status.HTTP_304_NOT_MODIFIED,
+        headers=validator_headers(etag),
+    )
+
+
+class VersionProbe:
+    """
+    Lấy token phiên bản của một bảng và giữ nó trong `ttl` giây, để một loạt
+    yêu cầu xác thực lại chỉ tốn một truy vấn.
+
+    Token chỉ phụ thuộc vào dữ liệu nên giống nhau giữa các worker. Nếu `fetch` quét cả bảng
+    (checksum khi bảng không có cột thời gian cập nhật), chi phí bị chặn ở một lần quét mỗi
+    `ttl` giây cho mỗi worker, và chỉ khi có yêu cầu hoặc tác vụ nền cần token; `invalidate()`
+    sau khi chính tiến trình này ghi để không phải chờ hết `ttl`.
+    """
+    def __init__(self, fetch: Callable[[], Awaitable[Any]], ttl: float = 2.0):
+        self.fetch = fetch
+        self.ttl = ttl
+        self._value: Any = None
+        self._expires_at = 0.0
+        self._lock = asyncio.Lock()
+
+    async def get(self) -> Any:
+        if time.monotonic() < self._expires_at:
+            return self._value
+        async with self._lock:
+            if time.monotonic() >= self._expires_at:
+                self._value = await self.fetch()
+                self._expires_at = time.monotonic() + self.ttl
+        return self._value
+
+    def invalidate(self) -> None:
+        self._expires_at = 0.0
@@ -0,0 +1,72 @@
+import logging
+import time
+import uuid
+
+from app.logging_config import request_id
+from app.services.metrics import http_in_flight, http_request_duration, http_requests, request_stages
+
+logger = logging.getLogger("casesurf.access")
+
+
+class MetricsMiddleware:
+    """
+    Middleware ASGI thuần (không bọc lại response nên không ảnh hưởng luồng streaming):
+
+    - gán request_id (lấy từ header X-Request-ID nếu có) cho log và trả lại trong response,
+    - đếm yêu cầu đang xử lý, ghi số lượng và histogram thời gian theo route,
+    - gom thời gian từng giai đoạn (DB, n8n, tuần tự hóa) vào header Server-Timing và log truy cập.
+    """
+    def __init__(self, app, skip_paths: tuple = ("/metrics",)):
+        self.app = app
+        self.skip_paths = skip_paths
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in self.skip_paths:
+            await self.app(scope, receive, send)
+            return
+
+        incoming = dict(scope["headers"]).get(b"x-request-id")
+        current_id = incoming.decode("latin-1")[:64] if incoming else uuid.uuid4().hex[:16]
+        stages = {}
+        id_token = request_id.set(current_id)
+        stages_token = request_stages.set(stages)
+        status_code = 500
+        started = time.perf_counter()
+
+        async def send_with_headers(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                headers = list(message.get("headers", []))
+                headers.append((b"x-request-id", current_id.encode("latin-1")))
+                if stages:
+                    timing = ", ".join(f"{name};dur={seconds * 1000:.1f}" for name, seconds in stages.items())
+                    headers.append((b"server-timing", timing.encode("latin-1", "replace")))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        http_in_flight.inc()
+        try:
+            await self.app(scope, receive, send_with_headers)
+        finally:
+            elapsed = time.perf_counter() - started
+            http_in_flight.dec()
+            # Dùng mẫu đường dẫn của route (không phải đường dẫn thật) để giới hạn số nhãn
+            route = scope.get("route")
+            route_path = getattr(route, "path", None) or "unmatched"
+            method = scope["method"]
+            http_requests.inc(method=method, route=route_path, status=str(status_code))
+            http_request_duration.observe(elapsed, method=method, route=route_path)
+            logger.info(
+                "%s %s %s %.1fms",
+                method, scope["path"], status_code, elapsed * 1000,
+                extra={
+                    "method": method,
+                    "route": route_path,
+                    "status": status_code,
+                    "duration_ms": round(elapsed * 1000, 2),
+                    "stages_ms": {name: round(seconds * 1000, 2) for name, seconds in stages.items()},
+                },
+            )
+            request_stages.reset(stages_token)
+            request_id.reset(id_token)
@@ -1,87 +1,440 @@
 import os
 import json
-import time
-from typing import Counter, List
-from webbrowser import get
+import logging
+import sqlite3
+from typing import List
 
+import base64
+import csv
+import io
 import urllib
 from app.services.service import n8nService
-from fastapi import APIRouter, HTTPException, status, Query
+from app.api import serialization
+from app.api.conditional import VersionProbe, is_not_modified, make_etag, not_modified_response, validator_headers
+from app.services.cache import TwoTierCache
+from app.services.database import database
+from app.services.executor import cpu_executor
+from app.services.jobs import JobQueue, QueueFullError
+from app.services.keywords import KEYWORD_TABLES, KeywordAggregate
+from app.services.metrics import Gauge, registry, timed
+from app.services.profiler import ProfilerBusyError, SamplingProfiler
+from app.services.resilience import ServiceUnavailableError
+from app.services.script_cache import ScriptCache, script_cache_key
+from app.services.search import FACET_COLUMNS, SearchIndex
+from app.services.similarity import SimilarityIndex, fetch_similarity_row, fetch_similarity_version
+from app.services.singleflight import SingleFlight
+from app.services.writer import ReportWriter
+from app.utils import normalize_tiktok_url
+from fastapi import APIRouter, Header, HTTPException, Request, status, Query
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, PlainTextResponse, Response, StreamingResponse
 # Giả sử các file trên nằm trong cùng thư mục app
-from app.models.promt import CombinedReportResponse, ImprovementRequest, ProductRequest,TiktokData, TiktokDataResponse, KeywordResponse
+from app.models.promt import BatchReportItem, BatchReportRequest, CombinedReportResponse, ImprovementRequest, ProductRequest,TiktokData, TiktokDataPage, KeywordResponse, ReportJobResponse, SearchResponse, SimilarVideosResponse
 import httpx
-import mysql.connector
 from mysql.connector import Error
 import asyncio
 
 router = APIRouter()
+logger = logging.getLogger(__name__)
 # Tạo một instance của service để tái sử dụng
 service = n8nService()
+# Gộp các yêu cầu /report đồng thời cho cùng một URL thành một lời gọi n8n
+report_flight = SingleFlight()
+# Hàng đợi tạo báo cáo chạy nền, được khởi động trong lifespan; lỗi của công việc được
+# ghi bằng cùng thông báo mà /report trả về
+report_jobs = JobQueue(describe_error=lambda e: str(_report_http_error(e).detail))
+# Cache cho báo cáo đã hoàn thành và /url_tiktok, lưu sẵn JSON bytes
+tiktok_cache = TwoTierCache()
+# Bảng tổng hợp từ khóa -> số lần xuất hiện, làm mới nền trong lifespan
+keyword_aggregate = KeywordAggregate(database)
+# Token phiên bản của tiktok_info cho ETag; quét cả bảng nên chạy trên luồng bulk và được
+# giữ tiktok_version_ttl giây
+tiktok_version = VersionProbe(lambda: database.run_bulk(_fetch_tiktok_version))
+# Chỉ mục tìm kiếm toàn văn, đồng bộ nền với tiktok_info
+search_index = SearchIndex()
+# Chỉ mục video tương tự (facet + từ khóa) cho /url_tiktok/similar, đồng bộ nền với tiktok_info
+similarity_index = SimilarityIndex()
+# Token phiên bản riêng của chỉ mục trên: gồm cả cột `keyword` mà tiktok_version không theo dõi
+similarity_version = VersionProbe(lambda: database.run_bulk(fetch_similarity_version))
+# Cache bền vững cho kịch bản cải tiến, khóa theo nội dung yêu cầu
+script_cache = ScriptCache()
+script_flight = SingleFlight()
+# Tuần tự hóa nhanh cho /tiktok_data, kiểu cột được kiểm tra một lần trong lifespan
+tiktok_serializer = serialization.RowSerializer(TiktokData)
+# Ghi báo cáo do n8n tạo vào tiktok_info và các bảng từ khóa theo lô
+report_writer = ReportWriter(database, keyword_aggregate, search_index, (tiktok_version, similarity_version), similarity_index)
+# Profiler lấy mẫu cho /debug/profile, chỉ hoạt động khi bật profiling_enabled
+profiler = SamplingProfiler()
 
-def get_db_connection():
+# Các chỉ số đọc từ trạng thái của các thành phần trên tại thời điểm scrape /metrics
+registry.register(Gauge(
+    "casesurf_db_pool_connections", "Số kết nối trong pool theo trạng thái.", ("state",),
+    source=lambda: {(state,): database.stats()[state] for state in ("in_use", "available")},
+))
+registry.register(Gauge(
+    "casesurf_n8n_circuit_open", "1 nếu cầu dao tới n8n đang mở.",
+    source=lambda: {(): 1 if service.breaker.state == "open" else 0},
+))
+registry.register(Gauge(
+    "casesurf_n8n_in_flight", "Số lời gọi tới n8n đang chạy.",
+    source=lambda: {(): service.limiter.in_flight},
+))
+registry.register(Gauge(
+    "casesurf_report_jobs", "Số công việc tạo báo cáo theo trạng thái.", ("status",),
+    source=lambda: {(state,): report_jobs.stats()[state] for state in ("queued", "running")},
+))
+registry.register(Gauge(
+    "casesurf_report_writer_pending", "Số báo cáo đang chờ ghi xuống MySQL.",
+    source=lambda: {(): report_writer.stats()["pending"]},
+))
+
+
+def _executor_stats() -> dict:
+    db_stats = database.stats()
+    return {"db": db_stats["executor"], "db_bulk": db_stats["bulk_executor"], "cpu": cpu_executor.stats()}
+
+
+registry.register(Gauge(
+    "casesurf_executor_workers", "Số luồng của thread-pool.", ("executor",),
+    source=lambda: {(name,): stats["workers"] for name, stats in _executor_stats().items()},
+))
+registry.register(Gauge(
+    "casesurf_executor_tasks", "Số tác vụ trong thread-pool theo trạng thái.", ("executor", "state"),
+    source=lambda: {
+        (name, state): stats[state]
+        for name, stats in _executor_stats().items()
+        for state in ("active", "queued")
+    },
+))
+
+def _service_unavailable(e: ServiceUnavailableError) -> HTTPException:
+    # n8n đang bị cầu dao chặn, hoặc n8n/thread-pool quá tải: báo client thử lại sau thay vì chờ
+    retry_after = getattr(e, "retry_after", None) or service.breaker_reset_timeout
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail=str(e),
+        headers={"Retry-After": str(max(1, int(retry_after)))},
+    )
+
+
+async def service_unavailable_handler(request: Request, e: ServiceUnavailableError) -> JSONResponse:
+    """
+    Trả 503 cho `ServiceUnavailableError` không được route nào bắt riêng (ví dụ thread-pool DB đã đầy).
+    """
+    error = _service_unavailable(e)
+    return JSONResponse({"detail": error.detail}, status_code=error.status_code, headers=error.headers)
+
+
+def _parse_keyword(row: dict) -> dict:
+    # Chuyển đổi chuỗi JSON 'keyword' thành danh sách nếu có
+    if row.get('keyword') and isinstance(row['keyword'], str):
+        try:
+            row['keyword'] = json.loads(row['keyword'])
+        except json.JSONDecodeError:
+            row['keyword'] = []
+    return row
+
+
+def _cache_keys(url_tiktok: str) -> tuple:
+    normalized = normalize_tiktok_url(url_tiktok)
+    return f"report:{normalized}", f"url_tiktok:{normalized}"
+
+
+def _fetch_completed_report(connection, url_tiktok: str):
+    with connection.cursor(dictionary=True) as cursor:
+        query = "SELECT * FROM tiktok_info WHERE url_tiktok = %s AND status = 'completed'"
+        cursor.execute(query, (url_tiktok,))
+        return cursor.fetchone()
+
+
+def _fetch_completed_reports(connection, urls: List[str]):
+    # Một truy vấn IN cho cả lô thay vì một round trip cho mỗi URL
+    placeholders = ", ".join(["%s"] * len(urls))
+    with connection.cursor(dictionary=True) as cursor:
+        query = f"SELECT * FROM tiktok_info WHERE url_tiktok IN ({placeholders}) AND status = 'completed'"
+        cursor.execute(query, tuple(urls))
+        return cursor.fetchall()
+
+
+def _fetch_all_tiktok(connection):
+    with connection.cursor(dictionary=True) as cursor:
+        cursor.execute("SELECT * FROM tiktok_info")
+        return cursor.fetchall()
+
+
+def _fetch_all_tiktok_rows(connection):
+    # Dạng tuple cho đường tuần tự hóa nhanh: chỉ các cột của TiktokData
+    with connection.cursor() as cursor:
+        cursor.execute(f"SELECT {', '.join(TIKTOK_COLUMNS)} FROM tiktok_info")
+        return cursor.fetchall()
+
+
+# Các cột được phép chọn và lọc trên /tiktok_data (khớp với schema TiktokData)
+TIKTOK_COLUMNS = tuple(TiktokData.model_fields)
+TIKTOK_FILTER_COLUMNS = ("niche", "hook_type", "product_type")
+
+
+def _encode_cursor(url_tiktok: str) -> str:
+    return base64.urlsafe_b64encode(url_tiktok.encode("utf-8")).decode("ascii")
+
+
+def _decode_cursor(cursor: str) -> str:
+    """
+    Giải mã cursor do _encode_cursor tạo ra. Cursor hỏng bị từ chối (400) thay vì âm thầm
+    trả về trang đầu, để lỗi phía client không biến thành vòng lặp đọc lại từ đầu.
+    """
     try:
-        connection = mysql.connector.connect(
-            host=os.getenv("HOSTNAME"),
-            database=os.getenv("DB_HOST"),
-            user=os.getenv("USERNAME"),
-            password=os.getenv("PASSWORD")
+        url_tiktok = base64.b64decode(cursor, altchars=b"-_", validate=True).decode("utf-8")
+    except (ValueError, UnicodeError):
+        url_tiktok = ""
+    # Khóa phải là một url_tiktok khác rỗng và cursor phải đúng dạng mà _encode_cursor trả về
+    if not url_tiktok or not url_tiktok.isprintable() or _encode_cursor(url_tiktok) != cursor:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Cursor không hợp lệ."
         )
-        if connection.is_connected():
-            return connection
-    except Error as e:
-        raise HTTPException(status_code=500, detail="Không thể kết nối đến cơ sở dữ liệu.")
-    return None
+    return url_tiktok
 
-@router.post("/report", response_model=CombinedReportResponse, status_code=status.HTTP_200_OK)
-async def create_report(request_data: ProductRequest) -> CombinedReportResponse:
-    connection = None
-    cursor = None
+
+def _parse_fields(fields: str | None) -> List[str]:
+    """
+    Chuyển tham số `fields` (phân tách bằng dấu phẩy) thành danh sách cột hợp lệ.
+    `url_tiktok` luôn được chọn vì nó là khóa phân trang.
+    """
+    if not fields:
+        return list(TIKTOK_COLUMNS)
+    requested = [f.strip() for f in fields.split(",") if f.strip()]
+    unknown = [f for f in requested if f not in TIKTOK_COLUMNS]
+    if unknown:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Trường không hợp lệ: {', '.join(unknown)}"
+        )
+    return ["url_tiktok"] + [f for f in requested if f != "url_tiktok"]
+
+
+def _fetch_tiktok_page(
+    connection, columns: List[str], after: str | None, limit: int, filters: dict, dictionary: bool = True
+):
+    """
+    Phân trang theo keyset trên `url_tiktok`: chỉ đọc `limit + 1` dòng sau cursor
+    để biết còn trang tiếp theo hay không. `dictionary=False` trả về tuple theo thứ tự `columns`.
+    """
+    conditions = []
+    params = []
+    if after is not None:
+        conditions.append("url_tiktok > %s")
+        params.append(after)
+    for column, value in filters.items():
+        conditions.append(f"{column} = %s")
+        params.append(value)
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    # Tên cột đã được kiểm tra với TIKTOK_COLUMNS nên an toàn khi ghép chuỗi
+    query = f"SELECT {', '.join(columns)} FROM tiktok_info {where} ORDER BY url_tiktok LIMIT %s"
+    params.append(limit + 1)
+    with connection.cursor(dictionary=dictionary) as cursor:
+        cursor.execute(query, tuple(params))
+        return cursor.fetchall()
+
+
+def _tiktok_filters(niche: str | None, hook_type: str | None, product_type: str | None) -> dict:
+    return {
+        column: value
+        for column, value in zip(TIKTOK_FILTER_COLUMNS, (niche, hook_type, product_type))
+        if value is not None
+    }
+
+
+async def _read_tiktok_page(
+    fields: str | None,
+    after: str | None,
+    limit: int,
+    niche: str | None,
+    hook_type: str | None,
+    product_type: str | None,
+    dictionary: bool = True,
+) -> tuple:
+    """
+    Đọc một trang /tiktok_data từ tham số của yêu cầu; dùng chung cho cả đường Pydantic và
+    đường tuần tự hóa nhanh để hai đường luôn trả về cùng dữ liệu.
+    Trả về (các cột, các dòng của trang, next_cursor).
+    """
+    columns = _parse_fields(fields)
+    last_url = _decode_cursor(after) if after else None
+    rows = await database.run(
+        _fetch_tiktok_page, columns, last_url, limit, _tiktok_filters(niche, hook_type, product_type), dictionary
+    )
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        # url_tiktok luôn là cột đầu tiên (xem _parse_fields)
+        last = rows[-1]
+        next_cursor = _encode_cursor(last["url_tiktok"] if dictionary else last[0])
+    return columns, rows, next_cursor
+
+
+def _fetch_tiktok_version(connection):
+    """
+    Token phiên bản của tiktok_info: số dòng và checksum tính trên MySQL, không có dòng nào
+    được chuyển về ứng dụng. Truy vấn quét cả bảng (không có cột thời gian cập nhật để dùng
+    MAX(updated_at)); VersionProbe chỉ chạy nó tối đa một lần mỗi tiktok_version_ttl giây.
+    """
+    columns = ", ".join(TIKTOK_COLUMNS)
+    query = f"SELECT COUNT(*), COALESCE(BIT_XOR(CRC32(CONCAT_WS('|', {columns}, status))), 0) FROM tiktok_info"
+    with connection.cursor() as cursor:
+        cursor.execute(query)
+        return tuple(cursor.fetchone())
+
+
+def _fetch_tiktok_by_urls(connection, urls: List[str]):
+    placeholders = ", ".join(["%s"] * len(urls))
+    with connection.cursor(dictionary=True) as cursor:
+        cursor.execute(f"SELECT * FROM tiktok_info WHERE url_tiktok IN ({placeholders})", tuple(urls))
+        return cursor.fetchall()
+
+
+def _fetch_tiktok_by_url(connection, url_tiktok: str):
+    with connection.cursor(dictionary=True) as cursor:
+        # Sử dụng tham số hóa truy vấn để tránh SQL injection
+        query = "SELECT * FROM tiktok_info WHERE url_tiktok = %s"
+        cursor.execute(query, (url_tiktok,))
+        return cursor.fetchone()
+
+
+@router.get("/health", status_code=status.HTTP_200_OK)
+async def health_check() -> dict:
+    """
+    Kiểm tra sức khỏe của pool kết nối và trả về các chỉ số sử dụng pool.
+    """
+    try:
+        healthy = await database.health_check()
+    except (Error, RuntimeError) as e:
+        logger.error(f"Kiểm tra sức khỏe cơ sở dữ liệu thất bại: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Cơ sở dữ liệu không khả dụng."
+        )
+    return {
+        "status": "ok" if healthy else "degraded",
+        # Mỗi worker có pool, cache và chỉ số riêng; pid cho biết worker nào đã trả lời
+        "pid": os.getpid(),
+        "db_pool": database.stats(),
+        "cpu_executor": cpu_executor.stats(),
+        "report_singleflight": report_flight.stats(),
+        "report_jobs": report_jobs.stats(),
+        "cache": tiktok_cache.stats(),
+        "keywords": keyword_aggregate.stats(),
+        "search_index": search_index.stats(),
+        "similarity_index": similarity_index.stats(),
+        "script_cache": script_cache.stats(),
+        "n8n": service.stats(),
+        "report_writer": report_writer.stats(),
+        "profiler": profiler.stats(),
+    }
+
+@router.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+async def metrics() -> PlainTextResponse:
+    """
+    Chỉ số theo định dạng Prometheus: độ trễ theo route và theo giai đoạn, số yêu cầu đang xử lý,
+    tỷ lệ lỗi khi gọi n8n và trạng thái pool/hàng đợi.
+    """
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+@router.get("/debug/profile", response_class=PlainTextResponse, include_in_schema=False)
+async def profile(
+    seconds: float = Query(10.0, gt=0, le=300),
+    interval_ms: float = Query(5.0, ge=1, le=1000),
+    n8n_auth_token: str | None = Header(None, alias="N8N_AUTH_TOKEN"),
+) -> PlainTextResponse:
+    """
+    Lấy mẫu stack của tiến trình trong `seconds` giây và trả về dạng folded stacks
+    (mở bằng speedscope hoặc flamegraph.pl). Chỉ hoạt động khi bật `profiling_enabled`.
+    """
+    if not profiler.enabled:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Profiler chưa được bật.")
+    if not service.auth_token or n8n_auth_token != service.auth_token:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Token xác thực không hợp lệ."
+        )
     try:
-        connection = get_db_connection()
-        cursor = connection.cursor(dictionary=True)
+        folded = await asyncio.to_thread(profiler.sample, seconds, interval_ms / 1000)
+    except ProfilerBusyError as e:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(e))
+    return PlainTextResponse(folded)
 
-        # Bước 1: Kiểm tra xem báo cáo đã hoàn thành và tồn tại trong DB chưa
-        query = "SELECT * FROM tiktok_info WHERE url_tiktok = %s AND status = 'completed'"
-        cursor.execute(query, (request_data.product,))
-        existing_video_data = cursor.fetchone()
-
-        # Nếu có, và đã có description (báo cáo), trả về ngay
-        if existing_video_data and existing_video_data.get('description'):
-            print(f"Báo cáo và dữ liệu cho {request_data.product} đã tồn tại. Trả về từ DB.")
-            
-            # Chuyển đổi chuỗi JSON 'keyword' thành danh sách nếu có
-            if existing_video_data.get('keyword') and isinstance(existing_video_data['keyword'], str):
-                try:
-                    existing_video_data['keyword'] = json.loads(existing_video_data['keyword'])
-                except json.JSONDecodeError:
-                    existing_video_data['keyword'] = []
-            
-            return CombinedReportResponse(
-                report_text=existing_video_data['description'],
-                video_data=TiktokData(**existing_video_data)
+
+@router.post("/report", response_model=CombinedReportResponse, status_code=status.HTTP_200_OK)
+async def create_report(
+    request_data: ProductRequest,
+    background: bool = Query(False, description="Đưa vào hàng đợi và trả về job id ngay (202)."),
+) -> CombinedReportResponse:
+    request_data = _canonical_request(request_data)
+    if background:
+        try:
+            job = report_jobs.submit(lambda: _build_report(request_data))
+        except QueueFullError:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Hàng đợi tạo báo cáo đang đầy, vui lòng thử lại sau."
             )
+        return JSONResponse(
+            status_code=status.HTTP_202_ACCEPTED,
+            content=jsonable_encoder(ReportJobResponse(**job.to_dict())),
+            headers={"Location": f"/report/jobs/{job.id}"},
+        )
+    # Báo cáo đã hoàn thành là bất biến: trả thẳng JSON đã lưu, bỏ qua DB và Pydantic
+    cached = await tiktok_cache.get(_cache_keys(request_data.product)[0])
+    if cached is not None:
+        return Response(content=cached, media_type="application/json")
+    return await _build_report(request_data)
 
-        # Bước 2: Nếu chưa có, gọi service n8n
-        print(f"Đang tạo báo cáo cho {request_data.product}...")
-        
-        # --- SỬA LỖI: Xử lý đúng cấu trúc dữ liệu trả về từ service ---
-        # service.generate_report giờ trả về một danh sách các dictionary
-        n8n_result_list = await service.generate_report(
-            product=request_data.product,
-            userId=request_data.userId
+
+def _canonical_request(request_data: ProductRequest) -> ProductRequest:
+    # Mọi bước sau (gộp lời gọi n8n, tra và ghi DB, cache) dùng URL chuẩn hóa, để các biến thể
+    # của cùng một URL (query string, dấu '/' ở cuối) chỉ tạo một dòng tiktok_info
+    return request_data.model_copy(update={"product": normalize_tiktok_url(request_data.product)})
+
+
+def _report_from_row(row: dict | None) -> CombinedReportResponse | None:
+    # Chỉ dòng đã có description (báo cáo) mới được coi là báo cáo hoàn chỉnh
+    if not row or not row.get('description'):
+        return None
+    with timed("pydantic", "report_from_row"):
+        _parse_keyword(row)
+        return CombinedReportResponse(
+            report_text=row['description'],
+            video_data=TiktokData(**row)
         )
 
-        # Kiểm tra xem danh sách có hợp lệ không
-        if not n8n_result_list or len(n8n_result_list) == 0:
-            raise HTTPException(status_code=500, detail="Phản hồi từ n8n không hợp lệ hoặc rỗng.")
 
-        # Lấy đối tượng đầu tiên từ danh sách
-        n8n_data_dict = n8n_result_list[0]
-        
-        report_text = n8n_data_dict.get('text')
-        if not report_text:
-            raise HTTPException(status_code=500, detail="Không tìm thấy nội dung báo cáo trong phản hồi từ n8n.")
+async def _lookup_completed_report(request_data: ProductRequest) -> CombinedReportResponse | None:
+    # Bước 1: Kiểm tra xem báo cáo đã hoàn thành và tồn tại trong DB chưa
+    existing_video_data = await database.run(_fetch_completed_report, request_data.product)
+
+    # Nếu có, và đã có description (báo cáo), trả về ngay
+    report = _report_from_row(existing_video_data)
+    if report is not None:
+        logger.info(f"Báo cáo và dữ liệu cho {request_data.product} đã tồn tại. Trả về từ DB.")
+        await tiktok_cache.set(_cache_keys(request_data.product)[0], report.model_dump_json().encode("utf-8"))
+    return report
+
 
+async def _report_from_n8n(request_data: ProductRequest, n8n_result_list: list) -> CombinedReportResponse:
+    # Kiểm tra xem danh sách có hợp lệ không
+    if not n8n_result_list or len(n8n_result_list) == 0:
+        raise HTTPException(status_code=500, detail="Phản hồi từ n8n không hợp lệ hoặc rỗng.")
+
+    # Lấy đối tượng đầu tiên từ danh sách (sao chép vì danh sách có thể được chia sẻ
+    # giữa các yêu cầu đã gộp)
+    n8n_data_dict = dict(n8n_result_list[0])
+    
+    report_text = n8n_data_dict.get('text')
+    if not report_text:
+        raise HTTPException(status_code=500, detail="Không tìm thấy nội dung báo cáo trong phản hồi từ n8n.")
+
+    with timed("pydantic", "report_from_n8n"):
         # Bước 3: Tạo đối tượng TiktokData từ kết quả của n8n
         # Đảm bảo các trường bắt buộc như url_tiktok và userId được cung cấp
         video_data_obj = TiktokData(
@@ -91,250 +444,695 @@ async def create_report(request_data: ProductRequest) -> CombinedReportResponse:
             **n8n_data_dict # Giải nén các trường còn lại từ n8n
         )
 
-        # Lưu ý: Workflow n8n của bạn vẫn NÊN cập nhật kết quả vào DB.
-
         # Bước 4: Đóng gói và trả về cho frontend
-        return CombinedReportResponse(
+        report = CombinedReportResponse(
             report_text=report_text,
             video_data=video_data_obj
         )
 
+    # Lưu kết quả vào DB qua bộ đệm ghi sau; trong lúc chờ ghi, các yêu cầu lặp lại
+    # được phục vụ từ cache báo cáo
+    # `keyword` không thuộc TiktokData nhưng được lưu vào cột keyword của tiktok_info
+    report_writer.add({**video_data_obj.model_dump(), "keyword": n8n_data_dict.get("keyword")})
+    report_key, url_key = _cache_keys(request_data.product)
+    await tiktok_cache.set(report_key, report.model_dump_json().encode("utf-8"))
+    await tiktok_cache.invalidate(url_key)
+    return report
+
+
+def _report_http_error(e: Exception) -> HTTPException:
+    # Ánh xạ lỗi khi tạo báo cáo sang mã HTTP tương ứng
+    if isinstance(e, HTTPException):
+        return e
+    if isinstance(e, httpx.HTTPStatusError):
+        return HTTPException(status_code=502, detail=f"Lỗi từ dịch vụ bên ngoài: {e.response.status_code}")
+    if isinstance(e, httpx.RequestError):
+        return HTTPException(status_code=504, detail="Không thể kết nối đến dịch vụ tạo báo cáo.")
+    if isinstance(e, ServiceUnavailableError):
+        return _service_unavailable(e)
+    return HTTPException(status_code=500, detail=str(e))
+
+
+async def _generate_report(request_data: ProductRequest) -> CombinedReportResponse:
+    # Bước 2: Nếu chưa có, gọi service n8n
+    logger.info(f"Đang tạo báo cáo cho {request_data.product}...")
+    
+    # --- SỬA LỖI: Xử lý đúng cấu trúc dữ liệu trả về từ service ---
+    # service.generate_report giờ trả về một danh sách các dictionary.
+    # Các yêu cầu đồng thời cho cùng URL dùng chung một lời gọi n8n.
+    n8n_result_list = await report_flight.do(
+        request_data.product,
+        lambda: service.generate_report(
+            product=request_data.product,
+            userId=request_data.userId
+        ),
+    )
+    return await _report_from_n8n(request_data, n8n_result_list)
+
+
+async def _build_report(request_data: ProductRequest) -> CombinedReportResponse:
+    try:
+        report = await _lookup_completed_report(request_data)
+        if report is not None:
+            return report
+        return await _generate_report(request_data)
+    except Exception as e:
+        raise _report_http_error(e)
+
+
+def _sse(event: str, data: str) -> str:
+    return f"event: {event}\ndata: {data}\n\n"
+
+
+async def _prime_stream(chunks):
+    """
+    Lấy trước đoạn đầu tiên của luồng n8n để lỗi kết nối/HTTP được trả về bằng mã lỗi
+    thích hợp trước khi header của StreamingResponse được gửi đi.
+    """
+    try:
+        first = await chunks.__anext__()
+    except StopAsyncIteration:
+        first = ""
     except httpx.HTTPStatusError as e:
         raise HTTPException(status_code=502, detail=f"Lỗi từ dịch vụ bên ngoài: {e.response.status_code}")
-    except httpx.RequestError as e:
-        raise HTTPException(status_code=504, detail="Không thể kết nối đến dịch vụ tạo báo cáo.")
-    except Exception as e:
+    except httpx.RequestError:
+        raise HTTPException(status_code=504, detail="Không thể kết nối đến dịch vụ bên ngoài.")
+    except ServiceUnavailableError as e:
+        raise _service_unavailable(e)
+    return first
+
+
+@router.post("/report/stream", status_code=status.HTTP_200_OK)
+async def stream_report(request_data: ProductRequest) -> StreamingResponse:
+    """
+    Server-sent events: chuyển tiếp từng đoạn phản hồi của n8n (`chunk`) ngay khi nhận được,
+    sau đó gửi `result` là CombinedReportResponse hoàn chỉnh (hoặc `error`).
+    """
+    request_data = _canonical_request(request_data)
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    try:
+        report = await _lookup_completed_report(request_data)
+    except Error as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    if report is not None:
+        async def cached_events():
+            yield _sse("result", report.model_dump_json())
+        return StreamingResponse(cached_events(), media_type="text/event-stream", headers=headers)
+
+    logger.info(f"Đang tạo báo cáo (stream) cho {request_data.product}...")
+    chunks = service.stream_report(product=request_data.product, userId=request_data.userId)
+    first = await _prime_stream(chunks)
+
+    async def events():
+        parts = [first]
+        try:
+            if first:
+                yield _sse("chunk", json.dumps({"text": first}, ensure_ascii=False))
+            async for chunk in chunks:
+                parts.append(chunk)
+                yield _sse("chunk", json.dumps({"text": chunk}, ensure_ascii=False))
+            # Ghép toàn bộ phản hồi để dựng bản ghi cuối cùng như /report
+            n8n_result_list = service.parse_report(json.loads("".join(parts)))
+            result = await _report_from_n8n(request_data, n8n_result_list)
+            yield _sse("result", result.model_dump_json())
+        except HTTPException as e:
+            yield _sse("error", json.dumps({"detail": e.detail}, ensure_ascii=False))
+        except (httpx.HTTPError, ValueError) as e:
+            yield _sse("error", json.dumps({"detail": str(e)}, ensure_ascii=False))
+        finally:
+            await chunks.aclose()
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers=headers)
+
+
+def _batch_line(item: BatchReportItem, sse: bool) -> str:
+    if sse:
+        return _sse("report", item.model_dump_json())
+    return item.model_dump_json() + "\n"
+
+
+@router.post("/reports/batch", status_code=status.HTTP_200_OK)
+async def create_reports_batch(
+    request_data: BatchReportRequest,
+    format: str = Query("ndjson", pattern="^(ndjson|sse)$"),
+    concurrency: int = Query(8, ge=1, le=16, description="Số báo cáo được tạo đồng thời qua n8n."),
+) -> StreamingResponse:
+    """
+    Tạo báo cáo cho nhiều URL TikTok cùng lúc. Mỗi URL được gửi về (NDJSON hoặc SSE `report`)
+    ngay khi xong: các báo cáo đã có trong DB được tra bằng một truy vấn duy nhất và trả về
+    trước, các URL còn lại được tạo song song qua n8n với số lượng đồng thời giới hạn.
+    """
+    # Loại bỏ URL trùng lặp theo dạng chuẩn hóa (dùng để tra DB và tạo báo cáo), giữ thứ tự
+    # và dạng gốc đầu tiên để trả về cho client
+    products = {}
+    for product in request_data.products:
+        products.setdefault(normalize_tiktok_url(product), product)
+
+    try:
+        rows = await database.run(_fetch_completed_reports, list(products))
+    except (Error, RuntimeError) as e:
         raise HTTPException(status_code=500, detail=str(e))
-    finally:
-        if connection and connection.is_connected():
-            if cursor:
-                cursor.close()
-            connection.close()
+    completed = {}
+    for row in rows:
+        report = _report_from_row(row)
+        if report is not None:
+            completed[row['url_tiktok']] = report
+    misses = [key for key in products if key not in completed]
+    logger.info(f"Lô {len(products)} URL: {len(completed)} đã có trong DB, {len(misses)} cần tạo qua n8n.")
+
+    sse = format == "sse"
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def generate(key: str) -> BatchReportItem:
+        product = products[key]
+        async with semaphore:
+            try:
+                report = await _generate_report(ProductRequest(product=key, userId=request_data.userId))
+            except Exception as e:
+                error = _report_http_error(e)
+                return BatchReportItem(
+                    product=product, status="failed", status_code=error.status_code, error=str(error.detail)
+                )
+        return BatchReportItem(product=product, status="completed", source="n8n", result=report)
+
+    async def results():
+        for key, report in completed.items():
+            yield _batch_line(
+                BatchReportItem(product=products[key], status="completed", source="db", result=report), sse
+            )
+        tasks = [asyncio.create_task(generate(key)) for key in misses]
+        try:
+            for finished in asyncio.as_completed(tasks):
+                yield _batch_line(await finished, sse)
+        finally:
+            # Client ngắt kết nối giữa chừng: hủy các URL chưa xong
+            for task in tasks:
+                task.cancel()
+
+    media_type = "text/event-stream" if sse else "application/x-ndjson"
+    # Content-Encoding: identity để middleware nén không giữ lại các dòng đang chờ gửi
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no", "Content-Encoding": "identity"}
+    return StreamingResponse(results(), media_type=media_type, headers=headers)
+
+
+def _get_job_or_404(job_id: str):
+    job = report_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Không tìm thấy công việc với id đã cho."
+        )
+    return job
+
+
+@router.get("/report/jobs/{job_id}", response_model=ReportJobResponse, status_code=status.HTTP_200_OK)
+async def get_report_job(job_id: str) -> ReportJobResponse:
+    """
+    Endpoint để kiểm tra trạng thái của một công việc tạo báo cáo.
+    """
+    return ReportJobResponse(**_get_job_or_404(job_id).to_dict())
+
+
+@router.get("/report/jobs/{job_id}/events", status_code=status.HTTP_200_OK)
+async def stream_report_job(job_id: str) -> StreamingResponse:
+    """
+    Server-sent events: đẩy mỗi lần chuyển trạng thái và kết quả cuối cùng của công việc.
+    """
+    job = _get_job_or_404(job_id)
+
+    async def events():
+        updates = job.subscribe()
+        try:
+            yield f"event: status\ndata: {ReportJobResponse(**job.to_dict()).model_dump_json()}\n\n"
+            while not job.finished:
+                try:
+                    await asyncio.wait_for(updates.get(), timeout=15)
+                except asyncio.TimeoutError:
+                    # Giữ kết nối qua proxy khi n8n xử lý lâu
+                    yield ": keep-alive\n\n"
+                    continue
+                yield f"event: status\ndata: {ReportJobResponse(**job.to_dict()).model_dump_json()}\n\n"
+        finally:
+            job.unsubscribe(updates)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 @router.post("/improvement-script", response_model=str, status_code=status.HTTP_200_OK)
-async def create_improvement_script(request_data: ImprovementRequest) -> str:
+async def create_improvement_script(
+    request_data: ImprovementRequest,
+    response: Response,
+    refresh: bool = Query(False, description="Bỏ qua cache và tạo lại kịch bản."),
+) -> str:
     """
     Endpoint để tạo kịch bản cải tiến dựa trên báo cáo gốc và các yếu tố cải tiến.
     """
-    print("Nhận request tạo kịch bản cải tiến:", request_data)
+    logger.debug("Nhận request tạo kịch bản cải tiến: %s", request_data)
 
-    connection = None
+    cache_key = script_cache_key(
+        request_data.base_text, request_data.improvements, request_data.is_iterative
+    )
+    if not refresh:
+        cached = await asyncio.to_thread(script_cache.get, cache_key)
+        if cached is not None:
+            response.headers["X-Cache"] = "HIT"
+            return cached
 
-    try:
+    async def generate() -> str:
         script_text = await service.generate_script(
             base_text=request_data.base_text,
             improvements=request_data.improvements,
             is_iterative=request_data.is_iterative  # <<< Truyền cờ đi
         )
-        
+        await asyncio.to_thread(script_cache.set, cache_key, script_text)
+        return script_text
+
+    try:
+        # Các yêu cầu giống hệt nhau đang chạy đồng thời dùng chung một lời gọi n8n
+        script_text = await script_flight.do(cache_key, generate)
+        response.headers["X-Cache"] = "MISS"
         return script_text
 
     except httpx.HTTPStatusError as e:
-        print(f"Lỗi HTTP từ n8n: {e.response.status_code} - {e.response.text}")
+        logger.error(f"Lỗi HTTP từ n8n: {e.response.status_code} - {e.response.text}")
         raise HTTPException(
             status_code=status.HTTP_502_BAD_GATEWAY,
             detail=f"Dịch vụ bên ngoài trả về lỗi: {e.response.status_code}"
         )
     except httpx.RequestError as e:
-        print(f"Lỗi kết nối đến n8n: {e}")
+        logger.error(f"Lỗi kết nối đến n8n: {e}")
         raise HTTPException(
             status_code=status.HTTP_504_GATEWAY_TIMEOUT,
             detail="Không thể kết nối đến dịch vụ tạo kịch bản."
         )
+    except ServiceUnavailableError as e:
+        raise _service_unavailable(e)
     except Exception as e:
-        print(f"Lỗi không xác định: {e}")
+        logger.error(f"Lỗi không xác định: {e}")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=str(e)
         )
     
-@router.get("/tiktok_data", response_model=TiktokDataResponse, status_code=status.HTTP_200_OK)
-async def get_tiktok_data() -> TiktokDataResponse:
-    connection = None
-    hostname = os.getenv("HOSTNAME")
-    db_host = os.getenv("DB_HOST")
-    username = os.getenv("USERNAME")
-    password = os.getenv("PASSWORD")
+@router.post("/improvement-script/stream", status_code=status.HTTP_200_OK)
+async def stream_improvement_script(
+    request_data: ImprovementRequest,
+    refresh: bool = Query(False, description="Bỏ qua cache và tạo lại kịch bản."),
+) -> StreamingResponse:
+    """
+    Giống /improvement-script nhưng chuyển tiếp từng đoạn kịch bản (text/plain) ngay khi n8n gửi tới.
+    Kịch bản hoàn chỉnh được lưu vào cache khi luồng kết thúc.
+    """
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    cache_key = script_cache_key(
+        request_data.base_text, request_data.improvements, request_data.is_iterative
+    )
+    if not refresh:
+        cached = await asyncio.to_thread(script_cache.get, cache_key)
+        if cached is not None:
+            return StreamingResponse(
+                iter([cached]),
+                media_type="text/plain; charset=utf-8",
+                headers={**headers, "X-Cache": "HIT"},
+            )
+
+    chunks = service.stream_script(
+        base_text=request_data.base_text,
+        improvements=request_data.improvements,
+        is_iterative=request_data.is_iterative
+    )
+    first = await _prime_stream(chunks)
+
+    async def relay():
+        parts = [first]
+        completed = False
+        try:
+            yield first
+            async for chunk in chunks:
+                parts.append(chunk)
+                yield chunk
+            completed = True
+        finally:
+            await chunks.aclose()
+            script_text = "".join(parts)
+            # Chỉ lưu kịch bản đã nhận đầy đủ
+            if completed and script_text:
+                await asyncio.to_thread(script_cache.set, cache_key, script_text)
+
+    return StreamingResponse(
+        relay(),
+        media_type="text/plain; charset=utf-8",
+        headers={**headers, "X-Cache": "MISS"},
+    )
+
+@router.get(
+    "/tiktok_data",
+    response_model=TiktokDataPage,
+    response_model_exclude_unset=True,
+    status_code=status.HTTP_200_OK,
+)
+async def get_tiktok_data(
+    request: Request,
+    response: Response,
+    after: str | None = Query(None, description="Cursor trả về từ trang trước (next_cursor)."),
+    limit: int = Query(20, ge=1, le=200),
+    fields: str | None = Query(None, description="Danh sách cột cần lấy, phân tách bằng dấu phẩy."),
+    niche: str | None = Query(None),
+    hook_type: str | None = Query(None),
+    product_type: str | None = Query(None),
+    include_all: bool = Query(False, alias="all", description="Trả về toàn bộ bảng như trước (không phân trang)."),
+) -> TiktokDataPage:
+    """
+    Endpoint trả về thư viện video TikTok theo trang (keyset trên `url_tiktok`).
+
+    Client đọc tiếp bằng `?after=<next_cursor>` cho tới khi `next_cursor` là null. Trang rỗng
+    (hết dữ liệu hoặc không dòng nào khớp bộ lọc) trả về 200 với `tiktok: []`; chỉ `?all=true`
+    (toàn bộ bảng, như trước) còn trả về 404 khi bảng trống.
+    """
     try:
-        connection = mysql.connector.connect(
-            host=hostname,
-            database=db_host,
-            user=username,
-            password=password
-        )
+        # Xác thực lại rẻ: so sánh ETag trước khi đọc bất kỳ dòng nào
+        etag = make_etag("tiktok_data", await tiktok_version.get(), sorted(request.query_params.multi_items()))
+        # Không có Last-Modified: bảng không có cột thời gian cập nhật, và thời điểm do từng
+        # worker tự ghi nhận sẽ khác nhau giữa các worker; ETag tính từ dữ liệu là đủ
+        if is_not_modified(request, etag):
+            return not_modified_response(etag)
+        headers = validator_headers(etag)
+        response.headers.update(headers)
 
-        if connection.is_connected():
-            with connection.cursor(dictionary=True) as cursor:
-                cursor.execute("SELECT * FROM tiktok_info")
-                rows = cursor.fetchall()
-            # Chuyển đổi danh sách dict sang TiktokData
-            rows = [TiktokData(**row) for row in rows]
+        if tiktok_serializer.enabled:
+            return await _tiktok_data_fast(include_all, fields, after, limit, niche, hook_type, product_type, headers)
+
+        if include_all:
+            # Chế độ cũ: trả về toàn bộ bảng, giữ để tương thích ngược
+            rows = await database.run_bulk(_fetch_all_tiktok)
 
             if not rows:
                 raise HTTPException(
                     status_code=status.HTTP_404_NOT_FOUND,
                     detail="Không tìm thấy dữ liệu TikTok."
                 )
-           
-            return TiktokDataResponse(tiktok=rows)
+
+            # Chuyển đổi danh sách dict sang TiktokData
+            return await _offload(lambda: TiktokDataPage(tiktok=[TiktokData(**row) for row in rows]), len(rows))
+
+        _, rows, next_cursor = await _read_tiktok_page(fields, after, limit, niche, hook_type, product_type)
+        return TiktokDataPage(
+            tiktok=[TiktokData(**row) for row in rows],
+            next_cursor=next_cursor,
+        )
 
     except Error as e:
         # Ghi lại lỗi đầy đủ hơn để debug
-        print(f"Lỗi database hoặc xử lý dữ liệu: {e}")
+        logger.error(f"Lỗi database hoặc xử lý dữ liệu: {e}")
         # Bao gồm cả các lỗi validation của Pydantic
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Không thể xử lý yêu cầu. Lỗi: {e}"
         )
-    finally:
-        if connection and connection.is_connected():
-            connection.close()
-            print("Kết nối đến cơ sở dữ liệu đã được đóng.")
+
+# Trang từ số dòng này trở lên được dựng/mã hóa trong cpu_executor thay vì trên event loop
+CPU_OFFLOAD_ROWS = 1000
+
+
+async def _offload(func, size: int):
+    if size < CPU_OFFLOAD_ROWS or not cpu_executor.is_running:
+        return func()
+    return await cpu_executor.run(func)
+
+
+async def _tiktok_data_fast(include_all, fields, after, limit, niche, hook_type, product_type, headers) -> Response:
+    """
+    Giống get_tiktok_data nhưng đọc tuple từ DB và mã hóa thẳng thành JSON bytes,
+    không dựng TiktokData cho từng dòng và không qua response_model.
+    """
+    if include_all:
+        rows = await database.run_bulk(_fetch_all_tiktok_rows)
+        if not rows:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Không tìm thấy dữ liệu TikTok."
+            )
+        columns, extra = TIKTOK_COLUMNS, {}
+    else:
+        columns, rows, next_cursor = await _read_tiktok_page(
+            fields, after, limit, niche, hook_type, product_type, dictionary=False
+        )
+        extra = {"next_cursor": next_cursor}
+
+    def encode() -> bytes:
+        body = {"tiktok": tiktok_serializer.rows(columns, rows), **extra}
+        with timed("serialize", "tiktok_data"):
+            return serialization.dumps(body)
+
+    content = await _offload(encode, len(rows))
+    return Response(content=content, media_type="application/json", headers=headers)
+
+
+async def _iter_tiktok_batches(columns: List[str], filters: dict, batch_size: int):
+    """
+    Duyệt toàn bộ tiktok_info theo từng lô bằng keyset trên `url_tiktok`.
+    Mỗi lô mượn kết nối từ pool rồi trả lại ngay, nên client đọc chậm không giữ kết nối.
+    """
+    last_url = None
+    while True:
+        rows = await database.run_bulk(_fetch_tiktok_page, columns, last_url, batch_size, filters)
+        has_more = len(rows) > batch_size
+        rows = rows[:batch_size]
+        if rows:
+            yield rows
+        if not has_more:
+            return
+        last_url = rows[-1]["url_tiktok"]
+
+
+async def _export_ndjson(columns: List[str], filters: dict, batch_size: int):
+    async for rows in _iter_tiktok_batches(columns, filters, batch_size):
+        yield "".join(
+            json.dumps(row, ensure_ascii=False, default=str) + "\n" for row in rows
+        ).encode("utf-8")
+
+
+async def _export_csv(columns: List[str], filters: dict, batch_size: int):
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=columns, extrasaction="ignore")
+    writer.writeheader()
+    # Gửi header ngay để byte đầu tiên đến client không phải chờ truy vấn
+    yield buffer.getvalue().encode("utf-8")
+    async for rows in _iter_tiktok_batches(columns, filters, batch_size):
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows(rows)
+        yield buffer.getvalue().encode("utf-8")
+
+
+@router.get("/tiktok_data/export", status_code=status.HTTP_200_OK)
+async def export_tiktok_data(
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+    batch_size: int = Query(1000, ge=10, le=10000),
+    fields: str | None = Query(None, description="Danh sách cột cần xuất, phân tách bằng dấu phẩy."),
+    niche: str | None = Query(None),
+    hook_type: str | None = Query(None),
+    product_type: str | None = Query(None),
+) -> StreamingResponse:
+    """
+    Xuất toàn bộ thư viện dưới dạng NDJSON hoặc CSV theo luồng, bộ nhớ không tăng theo kích thước bảng.
+    """
+    columns = _parse_fields(fields)
+    filters = _tiktok_filters(niche, hook_type, product_type)
+    if format == "csv":
+        return StreamingResponse(
+            _export_csv(columns, filters, batch_size),
+            media_type="text/csv; charset=utf-8",
+            headers={"Content-Disposition": 'attachment; filename="tiktok_info.csv"'},
+        )
+    return StreamingResponse(
+        _export_ndjson(columns, filters, batch_size),
+        media_type="application/x-ndjson",
+    )
+
+
+def _json_with_etag(request: Request, body: bytes) -> Response:
+    # ETag tính từ chính nội dung JSON; trả 304 nếu client đã có bản này
+    etag = make_etag(body)
+    if is_not_modified(request, etag):
+        return not_modified_response(etag)
+    return Response(content=body, media_type="application/json", headers=validator_headers(etag))
+
 
 @router.get("/url_tiktok", response_model=TiktokData, status_code=status.HTTP_200_OK)
 async def find_data_with_url(
+    request: Request,
     # Dùng Query() để FastAPI biết rằng đây là một tham số từ URL
     url_tiktok: str = Query(..., alias="url_tiktok")
 ) -> TiktokData:
     """
     Endpoint để tìm kiếm dữ liệu TikTok theo URL.
     """
-    connection = None
-    cursor = None
-    
     # FastAPI đã tự động giải mã URL, không cần xử lý thủ công
     decoded_url = urllib.parse.unquote(url_tiktok)
+    cache_key = _cache_keys(decoded_url)[1]
+
+    cached = await tiktok_cache.get(cache_key)
+    if cached is not None:
+        return _json_with_etag(request, cached)
     
     try:
-        connection = get_db_connection()
-        cursor = connection.cursor(dictionary=True)
-
-        # Sử dụng tham số hóa truy vấn để tránh SQL injection
-        query = "SELECT * FROM tiktok_info WHERE url_tiktok = %s"
-        cursor.execute(query, (decoded_url,))
-        row = cursor.fetchone()
+        row = await database.run(_fetch_tiktok_by_url, decoded_url)
 
         if row:
             # Chuyển đổi từ dict sang TiktokData (giả sử model của bạn khớp)
-            return TiktokData(**row)
+            body = TiktokData(**row).model_dump_json().encode("utf-8")
+            # Chỉ cache các video đã hoàn thành vì chúng không còn thay đổi
+            if row.get('status') == 'completed':
+                await tiktok_cache.set(cache_key, body)
+            return _json_with_etag(request, body)
         else:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Không tìm thấy dữ liệu TikTok với URL đã cho."
             )
     except Error as e:
-        print(f"Lỗi kết nối đến cơ sở dữ liệu: {e}")
+        logger.error(f"Lỗi kết nối đến cơ sở dữ liệu: {e}")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Không thể kết nối đến cơ sở dữ liệu."
         )
-    finally:
-        if connection and connection.is_connected():
-            if cursor:
-                cursor.close()
-            connection.close()
 
-@router.get("/keywords", response_model=List[KeywordResponse], status_code=status.HTTP_200_OK)
-async def get_keywords() -> List[KeywordResponse]:
-    connection = None
-    hostname = os.getenv("HOSTNAME")
-    db_host = os.getenv("DB_HOST")
-    username = os.getenv("USERNAME")
-    password = os.getenv("PASSWORD")
-
-    tables_to_query = [
-            "niche", 
-            "content_angle", 
-            "hook_type", 
-            "product_type",
-            "script_framework",
-            "title",
-            
-        ]
-    
-    all_keywords = []
+@router.get("/url_tiktok/similar", response_model=SimilarVideosResponse, status_code=status.HTTP_200_OK)
+async def find_similar_videos(
+    url_tiktok: str = Query(..., alias="url_tiktok"),
+    limit: int = Query(10, ge=1, le=50),
+) -> SimilarVideosResponse:
+    """
+    Endpoint trả về các video giống video đã cho nhất (cùng niche, hook_type, content_angle,
+    script_framework và có từ khóa chung), từ chỉ mục video tương tự trong bộ nhớ.
+    """
+    decoded_url = urllib.parse.unquote(url_tiktok)
+    if not similarity_index.loaded:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Chỉ mục video tương tự chưa sẵn sàng."
+        )
+    try:
+        neighbors = await asyncio.to_thread(similarity_index.similar, decoded_url, limit)
+        if neighbors is None:
+            # Video mới chưa được đồng bộ vào chỉ mục: tính trực tiếp từ dòng trong MySQL
+            row = await database.run(fetch_similarity_row, decoded_url)
+            if row is None:
+                raise HTTPException(
+                    status_code=status.HTTP_404_NOT_FOUND,
+                    detail="Không tìm thấy dữ liệu TikTok với URL đã cho."
+                )
+            neighbors = await asyncio.to_thread(similarity_index.similar_to, row, limit)
+        rows = await database.run(_fetch_tiktok_by_urls, [neighbor.url_tiktok for neighbor in neighbors]) if neighbors else []
+    except Error as e:
+        logger.error(f"Lỗi kết nối đến cơ sở dữ liệu: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Không thể kết nối đến cơ sở dữ liệu."
+        )
+    videos = {row["url_tiktok"]: row for row in rows}
+    return SimilarVideosResponse(
+        url_tiktok=decoded_url,
+        items=[
+            {
+                "video": TiktokData(**videos[neighbor.url_tiktok]),
+                "score": neighbor.score,
+                "matched_facets": neighbor.matched_facets,
+                "matched_keywords": neighbor.matched_keywords,
+            }
+            # Bỏ qua video vừa bị xóa khỏi tiktok_info nhưng chưa được đồng bộ khỏi chỉ mục
+            for neighbor in neighbors if neighbor.url_tiktok in videos
+        ],
+    )
 
+@router.get("/search", response_model=SearchResponse, status_code=status.HTTP_200_OK)
+async def search_tiktok(
+    q: str | None = Query(None, description="Từ khóa tìm trong tiêu đề và nội dung phân tích."),
+    niche: str | None = Query(None),
+    content_angle: str | None = Query(None),
+    hook_type: str | None = Query(None),
+    product_type: str | None = Query(None),
+    script_framework: str | None = Query(None),
+    limit: int = Query(20, ge=1, le=100),
+    offset: int = Query(0, ge=0, le=10000),
+) -> SearchResponse:
+    """
+    Endpoint tìm kiếm toàn văn có xếp hạng, kèm số đếm facet cho các nhóm phân loại.
+    """
+    filters = {
+        column: value
+        for column, value in zip(FACET_COLUMNS, (niche, content_angle, hook_type, product_type, script_framework))
+        if value is not None
+    }
+    if not search_index.is_open:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Chỉ mục tìm kiếm chưa sẵn sàng."
+        )
     try:
-        # Kết nối đến cơ sở dữ liệu MySQL
-        connection = mysql.connector.connect(
-            host=hostname,
-            database=db_host,
-            user=username,
-            password=password
+        total, hits, facets = await asyncio.to_thread(search_index.search, q, filters, limit, offset)
+    except sqlite3.Error as e:
+        # File chỉ mục bị khóa hoặc hỏng: dữ liệu gốc vẫn ở MySQL, báo tạm thời không khả dụng
+        logger.warning(f"Lỗi khi truy vấn chỉ mục tìm kiếm: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Chỉ mục tìm kiếm tạm thời không khả dụng."
+        )
+    return SearchResponse(
+        total=total,
+        hits=[TiktokData.model_validate_json(hit) for hit in hits],
+        facets={
+            column: [{"value": value, "count": count} for value, count in counts]
+            for column, counts in facets.items()
+        },
+    )
+
+
+@router.post("/cache/invalidate", status_code=status.HTTP_204_NO_CONTENT)
+async def invalidate_cache(
+    url_tiktok: str = Query(...),
+    n8n_auth_token: str | None = Header(None, alias="N8N_AUTH_TOKEN"),
+) -> Response:
+    """
+    Endpoint để workflow n8n báo rằng báo cáo của một URL vừa được cập nhật.
+    """
+    if not service.auth_token or n8n_auth_token != service.auth_token:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Token xác thực không hợp lệ."
+        )
+    await tiktok_cache.invalidate(*_cache_keys(url_tiktok))
+    tiktok_version.invalidate()
+    similarity_version.invalidate()
+    return Response(status_code=status.HTTP_204_NO_CONTENT)
+
+@router.get("/keywords", response_model=List[KeywordResponse], status_code=status.HTTP_200_OK)
+async def get_keywords(
+    request: Request,
+    limit: int | None = Query(None, ge=1, description="Chỉ trả về N từ khóa phổ biến nhất."),
+    category: str | None = Query(None, description=f"Chỉ đếm trong một nhóm: {', '.join(KEYWORD_TABLES)}."),
+) -> List[KeywordResponse]:
+    if category is not None and category not in KEYWORD_TABLES:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Nhóm từ khóa không hợp lệ: {category}"
         )
-        cursor = connection.cursor()
-
-        if connection.is_connected():
-            for table in tables_to_query:
-                cursor.execute(f"SELECT keyword FROM {table}")
-                rows = cursor.fetchall()
-                # Thêm tất cả từ khóa từ bảng hiện tại vào danh sách chung
-                all_keywords.extend([row[0] for row in rows])
-
-            if not all_keywords:
-                return [] # Trả về rỗng nếu không có từ khóa nào
-            keyword_counts = Counter(all_keywords)
-
-            # Chuyển đổi đối tượng Counter thành danh sách các dictionary
-            # Sắp xếp để lấy các từ khóa phổ biến nhất lên đầu
-            response_data = [
-                {"keyword": keyword, "count": count} 
-                for keyword, count in keyword_counts.most_common()
-            ]
-
-            print(f"Đã lấy và đếm {len(response_data)} từ khóa duy nhất từ cơ sở dữ liệu.")
-            return response_data
+
+    try:
+        # Sắp xếp để lấy các từ khóa phổ biến nhất lên đầu
+        keyword_counts = await keyword_aggregate.top(category=category, limit=limit)
     except Error as e:
-        print(f"Lỗi kết nối đến cơ sở dữ liệu: {e}")
+        logger.error(f"Lỗi kết nối đến cơ sở dữ liệu: {e}")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Không thể kết nối đến cơ sở dữ liệu."
         )
-    finally:
-        if connection and connection.is_connected():
-            connection.close()
-            print("Kết nối đến cơ sở dữ liệu đã được đóng.")
-
-    @router.get("/video", response_model=TiktokData, status_code=status.HTTP_200_OK)
-    async def get_video_by_url(
-        # Dùng Query() để FastAPI biết rằng đây là một tham số từ URL
-        url_tiktok: str = Query(..., description="The full URL of the TikTok video to fetch.")
-    ) -> TiktokData:
-        """
-        Endpoint để tìm kiếm và trả về dữ liệu chi tiết của một video TikTok theo URL.
-        """
-        connection = None
-        cursor = None
-        try:
-            connection = get_db_connection()
-            cursor = connection.cursor(dictionary=True)
-
-            query = "SELECT * FROM tiktok_info WHERE url_tiktok = %s"
-            cursor.execute(query, (url_tiktok,))
-            video_data = cursor.fetchone()
-
-            if video_data:
-                # Chuyển đổi chuỗi JSON 'keyword' thành danh sách nếu có
-                if video_data.get('keyword') and isinstance(video_data['keyword'], str):
-                    try:
-                        video_data['keyword'] = json.loads(video_data['keyword'])
-                    except json.JSONDecodeError:
-                        video_data['keyword'] = []
-                
-                return TiktokData(**video_data)
-            else:
-                raise HTTPException(
-                    status_code=status.HTTP_404_NOT_FOUND,
-                    detail="Không tìm thấy dữ liệu TikTok với URL đã cho."
-                )
-        except Error as e:
-            print(f"Lỗi cơ sở dữ liệu khi tìm video: {e}")
-            raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail="Lỗi truy vấn cơ sở dữ liệu."
-            )
-        finally:
-            if connection and connection.is_connected():
-                if cursor:
-                    cursor.close()
-                connection.close()
\ No newline at end of file
+
+    # ETag tính từ chính danh sách trả về (không từ bộ đếm làm mới của tiến trình), nên các
+    # worker có cùng dữ liệu trả cùng một ETag
+    body = serialization.dumps([{"keyword": keyword, "count": count} for keyword, count in keyword_counts])
+    return _json_with_etag(request, body)
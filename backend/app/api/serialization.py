@@ -0,0 +1,143 @@
+import json
+import logging
+import types
+import typing
+from decimal import Decimal
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple, Type
+
+from mysql.connector import Error
+from mysql.connector.constants import FieldType
+from pydantic import BaseModel
+
+try:
+    import orjson
+except ImportError:  # orjson là tùy chọn, dùng json chuẩn nếu chưa cài
+    orjson = None
+
+logger = logging.getLogger(__name__)
+
+
+def dumps(obj: Any) -> bytes:
+    """
+    JSON bytes gọn (UTF-8, không escape ký tự Unicode) giống định dạng FastAPI/Pydantic trả về.
+    """
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+_INTEGER_TYPES = {FieldType.TINY, FieldType.SHORT, FieldType.LONG, FieldType.LONGLONG, FieldType.INT24, FieldType.YEAR}
+_DECIMAL_TYPES = {FieldType.DECIMAL, FieldType.NEWDECIMAL}
+_STRING_TYPES = {FieldType.VARCHAR, FieldType.VAR_STRING, FieldType.STRING, FieldType.ENUM, FieldType.SET}
+# TEXT được MySQL báo là BLOB; cột nhị phân có thể trả về bytes
+_BLOB_TYPES = {FieldType.TINY_BLOB, FieldType.MEDIUM_BLOB, FieldType.LONG_BLOB, FieldType.BLOB, FieldType.JSON}
+
+
+def _to_int(value: Any) -> Any:
+    if value is None or type(value) is int:
+        return value
+    if isinstance(value, Decimal) and value == value.to_integral_value():
+        return int(value)
+    raise ValueError(f"Giá trị không phải số nguyên: {value!r}")
+
+
+def _to_str(value: Any) -> Any:
+    if isinstance(value, (bytes, bytearray)):
+        return value.decode("utf-8")
+    return value
+
+
+def _base_type(annotation: Any) -> Optional[type]:
+    # `int | None` -> int; các kiểu phức tạp hơn không được hỗ trợ trên đường nhanh
+    if isinstance(annotation, types.UnionType) or typing.get_origin(annotation) is typing.Union:
+        args = [arg for arg in typing.get_args(annotation) if arg is not type(None)]
+        annotation = args[0] if len(args) == 1 else None
+    return annotation if annotation in (int, str) else None
+
+
+class RowSerializer:
+    """
+    Tuần tự hóa dòng DB (tuple) thẳng thành JSON bytes cho một model Pydantic, bỏ qua
+    việc tạo model cho từng dòng.
+
+    Kiểu của từng cột được đối chiếu với schema của model một lần khi khởi động
+    (`prepare`). Nếu có cột không tương thích hoặc không kiểm tra được, `enabled`
+    giữ False và endpoint dùng lại đường Pydantic.
+    """
+    def __init__(self, model: Type[BaseModel]):
+        self.model = model
+        self.fields = tuple(model.model_fields)
+        self.enabled = False
+        self._converters: Dict[str, Optional[Callable[[Any], Any]]] = {}
+        self._plans: Dict[Tuple[str, ...], Tuple[Tuple[str, ...], Tuple[int, ...], Tuple[Tuple[int, Callable], ...]]] = {}
+
+    def validate(self, description: Sequence[Sequence[Any]]) -> List[str]:
+        """
+        Dựng bảng chuyển đổi theo cột từ `cursor.description`. Trả về danh sách lỗi (rỗng nếu hợp lệ).
+        """
+        types_by_name = {column[0]: column[1] for column in description}
+        converters: Dict[str, Optional[Callable[[Any], Any]]] = {}
+        problems = []
+        for name in self.fields:
+            expected = _base_type(self.model.model_fields[name].annotation)
+            type_code = types_by_name.get(name)
+            if type_code is None:
+                problems.append(f"{name}: không có trong bảng")
+            elif expected is int and type_code in _INTEGER_TYPES:
+                converters[name] = None
+            elif expected is int and type_code in _DECIMAL_TYPES:
+                converters[name] = _to_int
+            elif expected is str and type_code in _STRING_TYPES:
+                converters[name] = None
+            elif expected is str and type_code in _BLOB_TYPES:
+                converters[name] = _to_str
+            else:
+                problems.append(f"{name}: kiểu {FieldType.get_info(type_code)} không khớp với {expected}")
+        self._converters = converters
+        self._plans.clear()
+        self.enabled = not problems
+        return problems
+
+    async def prepare(self, database, table: str) -> None:
+        def describe(connection):
+            with connection.cursor() as cursor:
+                cursor.execute(f"SELECT {', '.join(self.fields)} FROM {table} LIMIT 0")
+                cursor.fetchall()
+                return cursor.description
+
+        try:
+            problems = self.validate(await database.run(describe))
+        except (Error, RuntimeError) as e:
+            problems = [str(e)]
+            self.enabled = False
+        if problems:
+            logger.warning(f"Tắt tuần tự hóa nhanh cho {table}: {'; '.join(problems)}")
+
+    def _plan(self, columns: Tuple[str, ...]):
+        plan = self._plans.get(columns)
+        if plan is None:
+            # Sắp xếp khóa theo thứ tự trường của model như Pydantic, bỏ cột ngoài schema
+            names = tuple(name for name in self.fields if name in columns)
+            indexes = tuple(columns.index(name) for name in names)
+            converters = tuple(
+                (position, self._converters[name])
+                for position, name in enumerate(names)
+                if self._converters.get(name) is not None
+            )
+            plan = self._plans[columns] = (names, indexes, converters)
+        return plan
+
+    def rows(self, columns: Sequence[str], rows: Sequence[Sequence[Any]]) -> List[Dict[str, Any]]:
+        """
+        Chuyển các tuple (theo thứ tự `columns`) thành dict sẵn sàng mã hóa JSON.
+        """
+        names, indexes, converters = self._plan(tuple(columns))
+        if indexes == tuple(range(len(columns))) and not converters:
+            return [dict(zip(names, row)) for row in rows]
+        result = []
+        for row in rows:
+            values = [row[index] for index in indexes]
+            for position, convert in converters:
+                values[position] = convert(values[position])
+            result.append(dict(zip(names, values)))
+        return result
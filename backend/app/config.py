@@ -1,6 +1,9 @@
+from functools import lru_cache
+
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 class Settings(BaseSettings):
+    api_host: str = "0.0.0.0"
     api_port: int = 8001
     debug: bool = True
     GOOGLE_API_KEY: str # Đảm bảo biến môi trường này được đặt
@@ -9,8 +12,112 @@ class Settings(BaseSettings):
     username: str 
     password: str 
 
+    # Cấu hình pool kết nối MySQL
+    db_pool_name: str = "casesurf"
+    db_pool_size: int = 10
+    db_connect_timeout: int = 10
+    # Số luồng (trong db_pool_size) dành cho truy vấn nặng: quét bảng, xuất dữ liệu, đồng bộ nền
+    db_bulk_workers: int = 3
+    # Số truy vấn được chờ luồng rảnh ngoài số đang chạy; vượt quá thì trả 503 ngay
+    db_max_queue: int = 100
+    db_bulk_max_queue: int = 50
+
+    # Thread-pool cho việc nặng CPU (dựng các trang /tiktok_data lớn)
+    cpu_executor_workers: int = 2
+    cpu_executor_max_queue: int = 32
+
+    # Cấu hình client HTTP dùng chung tới n8n
+    n8n_webhook_base_url: str = "https://seedxwork.app.n8n.cloud/webhook"
+    n8n_max_connections: int = 20
+    n8n_max_keepalive_connections: int = 10
+    n8n_keepalive_expiry: float = 60.0
+    n8n_http2: bool = True
+    n8n_connect_timeout: float = 10.0
+    n8n_read_timeout: float = 300.0
+
+    # Chính sách gọi n8n: giới hạn đồng thời, thời hạn theo endpoint, thử lại, cầu dao
+    n8n_max_concurrency: int = 16
+    n8n_limiter_timeout: float = 10.0
+    n8n_report_deadline: float = 300.0
+    n8n_script_deadline: float = 180.0
+    n8n_tiktok_data_deadline: float = 30.0
+    n8n_tiktok_data_retries: int = 2
+    n8n_breaker_failure_threshold: int = 5
+    n8n_breaker_reset_timeout: float = 30.0
+
+    # Hàng đợi công việc tạo báo cáo chạy nền
+    report_job_workers: int = 4
+    report_job_queue_size: int = 100
+    report_job_ttl: float = 3600.0
+
+    # Ghi sau báo cáo do n8n tạo vào MySQL (cần quyền ghi trên tiktok_info và các bảng từ khóa)
+    report_persist_enabled: bool = True
+    report_persist_batch_size: int = 50
+    report_persist_flush_interval: float = 1.0
+    report_persist_max_pending: int = 1000
+
+    # Cache báo cáo đã hoàn thành; redis_url bật tầng dùng chung (cần cài gói 'redis')
+    cache_max_bytes: int = 64 * 1024 * 1024
+    cache_local_ttl: float = 300.0
+    cache_shared_ttl: int = 86400
+    redis_url: str | None = None
+
+    # Token phiên bản của tiktok_info (ETag của /tiktok_data, đồng bộ chỉ mục): mỗi lần làm mới
+    # là một lần quét cả bảng, nên mỗi worker chỉ làm mới tối đa một lần mỗi chừng ấy giây
+    tiktok_version_ttl: float = 5.0
+
+    # Bảng tổng hợp từ khóa cho /keywords
+    keyword_refresh_interval: float = 60.0
+    keyword_max_staleness: float = 600.0
+
+    # Chỉ mục tìm kiếm nhúng (SQLite FTS5); ":memory:" để không ghi ra đĩa
+    search_index_path: str = "search_index.sqlite3"
+    search_sync_interval: float = 30.0
+    # Chỉ mục video tương tự cho /url_tiktok/similar (trong bộ nhớ)
+    similar_sync_interval: float = 30.0
+    # Bỏ qua từ khóa có ở hơn tỷ lệ này số video, khi thư viện có ít nhất chừng ấy video
+    similar_max_keyword_ratio: float = 0.1
+    similar_keyword_cap_min_documents: int = 1000
+
+    # Cache bền vững cho /improvement-script
+    script_cache_path: str = "script_cache.sqlite3"
+    script_cache_ttl: float = 7 * 24 * 3600
+    script_cache_max_bytes: int = 128 * 1024 * 1024
+
+    # Log có cấu trúc (JSON mỗi dòng) và profiler lấy mẫu qua /debug/profile
+    log_level: str = "INFO"
+    log_json: bool = True
+    profiling_enabled: bool = False
+    profiling_max_seconds: float = 60.0
+
+    # Chế độ chạy production (python -m app.server): số worker (0 = theo số CPU khả dụng),
+    # thời gian chờ xử lý nốt yêu cầu khi tắt, và tự khởi động lại worker sau N yêu cầu
+    web_concurrency: int = 0
+    web_max_workers: int = 8
+    web_graceful_timeout: int = 30
+    web_keepalive_timeout: int = 5
+    web_backlog: int = 2048
+    web_limit_concurrency: int | None = None
+    web_max_requests: int | None = None
+    web_max_requests_jitter: int = 0
+
     # Đây là cách đúng và duy nhất để cấu hình trong Pydantic v2 trở lên
     model_config = SettingsConfigDict(env_file=".env", env_file_encoding="utf-8")
 
-# Khởi tạo cài đặt để có thể sử dụng trong ứng dụng của bạn
-settings = Settings()
\ No newline at end of file
+
+@lru_cache(maxsize=1)
+def get_settings() -> Settings:
+    """
+    Đọc cấu hình (biến môi trường và .env) ở lần gọi đầu tiên rồi dùng lại.
+
+    Không tạo `Settings()` lúc import để việc import ứng dụng không có tác dụng phụ: cấu hình
+    được đọc khi cần (tiến trình giám sát của app.server, lifespan của từng worker).
+    """
+    return Settings()
+
+
+def __getattr__(name: str):
+    # Giữ tương thích với `from app.config import settings`
+    if name == "settings":
+        return get_settings()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,84 @@
+import json
+import logging
+import queue
+import sys
+import time
+from contextvars import ContextVar
+from logging.handlers import QueueHandler, QueueListener
+from typing import Optional
+
+# Mã yêu cầu hiện tại, được middleware gán và tự động thêm vào mọi dòng log
+request_id: ContextVar[Optional[str]] = ContextVar("request_id", default=None)
+
+# Các thuộc tính có sẵn của LogRecord; mọi thuộc tính khác (truyền qua `extra=`) được xuất thành trường JSON
+_RESERVED = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "request_id"}
+
+
+class _RequestIdFilter(logging.Filter):
+    # Chạy ở luồng ghi log (trước khi vào hàng đợi) nên đọc được ContextVar của yêu cầu
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = request_id.get()
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    Mỗi bản ghi là một dòng JSON: thời gian, mức, logger, thông điệp, request_id và các trường `extra`.
+    """
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(record.created)) + f".{int(record.msecs):03d}Z",
+            "level": record.levelname,
+            "logger": record.name,
+            "pid": record.process,
+            "msg": record.getMessage(),
+        }
+        if getattr(record, "request_id", None):
+            entry["request_id"] = record.request_id
+        for key, value in vars(record).items():
+            if key not in _RESERVED and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class _PlainFormatter(logging.Formatter):
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)s %(name)s [%(request_id)s] %(message)s")
+
+
+def setup_logging(level: str = "INFO", json_format: bool = True) -> QueueListener:
+    """
+    Cấu hình logging cho ứng dụng: các lời gọi log chỉ đưa bản ghi vào hàng đợi, một luồng
+    riêng (QueueListener) định dạng và ghi ra stdout, nên event loop không bị chặn bởi I/O.
+
+    Trả về listener; gọi `listener.stop()` khi tắt ứng dụng để ghi nốt các bản ghi còn lại.
+    """
+    handler = logging.StreamHandler(sys.stdout)
+    handler.setFormatter(JsonFormatter() if json_format else _PlainFormatter())
+    records: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+    queue_handler = _QueueHandler(records)
+    queue_handler.addFilter(_RequestIdFilter())
+
+    root = logging.getLogger()
+    for existing in list(root.handlers):
+        if isinstance(existing, _QueueHandler):
+            root.removeHandler(existing)
+    root.addHandler(queue_handler)
+    root.setLevel(level.upper())
+
+    listener = QueueListener(records, handler, respect_handler_level=True)
+    listener.start()
+    return listener
+
+
+class _QueueHandler(QueueHandler):
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Giữ nguyên record (kể cả exc_info và các trường extra) cho formatter ở luồng ghi;
+        # chỉ ghép sẵn thông điệp vì args có thể bị thay đổi sau khi hàm gọi log trả về
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info and not record.exc_text:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        return record
@@ -1,12 +1,17 @@
 from pydantic_settings import BaseSettings
-from pydantic import BaseModel
-from typing import List
+from pydantic import BaseModel, Field
+from typing import Dict, List
 
 class ProductRequest(BaseSettings):
     product: str
     userId: str  # Thêm userId để xác định người dùng
 
 
+class BatchReportRequest(BaseModel):
+    products: List[str] = Field(min_length=1, max_length=200)  # Danh sách URL TikTok
+    userId: str
+
+
 class ImprovementRequest(BaseModel):
     base_text: str  # Đổi tên cho rõ ràng
     improvements: List[str]
@@ -33,10 +38,64 @@ class TiktokDataResponse(BaseModel):
     """
     tiktok: List[TiktokData]
 
+class TiktokDataPage(BaseModel):
+    """
+    Response model cho một trang dữ liệu TikTok (phân trang theo keyset).
+    """
+    tiktok: List[TiktokData]
+    next_cursor: str | None = None  # None nếu đã hết dữ liệu
+
 class KeywordResponse(BaseModel):
     keyword: str
     count: int
 
+class FacetCount(BaseModel):
+    value: str
+    count: int
+
+class SearchResponse(BaseModel):
+    """
+    Kết quả tìm kiếm toàn văn kèm số đếm theo từng facet.
+    """
+    total: int
+    hits: List[TiktokData]
+    facets: Dict[str, List[FacetCount]]
+
+class SimilarVideo(BaseModel):
+    video: TiktokData
+    score: float
+    matched_facets: List[str]  # Các facet trùng với video gốc
+    matched_keywords: List[str]  # Các từ khóa chung với video gốc
+
+class SimilarVideosResponse(BaseModel):
+    """
+    Các video giống video `url_tiktok` nhất, theo điểm giảm dần.
+    """
+    url_tiktok: str
+    items: List[SimilarVideo]
+
 class CombinedReportResponse(BaseModel):
     report_text: str
-    video_data: TiktokData # Sử dụng lại model TiktokData đã có
\ No newline at end of file
+    video_data: TiktokData # Sử dụng lại model TiktokData đã có
+
+class BatchReportItem(BaseModel):
+    """
+    Kết quả của một URL trong /reports/batch, được gửi ngay khi URL đó xong.
+    """
+    product: str
+    status: str  # completed | failed
+    source: str | None = None  # db | n8n
+    result: CombinedReportResponse | None = None
+    status_code: int | None = None
+    error: str | None = None
+
+class ReportJobResponse(BaseModel):
+    """
+    Trạng thái của một công việc tạo báo cáo chạy nền.
+    """
+    job_id: str
+    status: str  # queued | running | completed | failed
+    created_at: float
+    updated_at: float
+    result: CombinedReportResponse | None = None
+    error: str | None = None
@@ -0,0 +1,125 @@
+"""
+Chạy backend ở chế độ production: nhiều worker uvicorn, uvloop/httptools, tắt êm.
+
+    python -m app.server [--workers N] [--host HOST] [--port PORT]
+
+Tiến trình giám sát chỉ đọc cấu hình và quản lý worker (khởi động lại worker bị chết,
+SIGHUP để khởi động lại lần lượt, SIGTTIN/SIGTTOU để tăng/giảm số worker). Mỗi worker tự
+import ứng dụng và tạo tài nguyên riêng (pool MySQL, client n8n, cache, luồng nền) trong
+lifespan; khi nhận SIGTERM, worker ngừng nhận kết nối mới, chờ các yêu cầu đang xử lý tối đa
+`web_graceful_timeout` giây rồi mới chạy phần tắt của lifespan (ghi nốt báo cáo, đóng pool).
+"""
+import argparse
+import importlib.util
+import logging
+import math
+import os
+from typing import Any, Dict, Optional
+
+import uvicorn
+
+from app.config import Settings, get_settings
+
+logger = logging.getLogger(__name__)
+
+
+def _cgroup_cpu_limit() -> Optional[float]:
+    # Giới hạn CPU của container (cgroup v2 rồi v1); None nếu không giới hạn
+    try:
+        with open("/sys/fs/cgroup/cpu.max") as file:
+            quota, period = file.read().split()[:2]
+        return None if quota == "max" else int(quota) / int(period)
+    except (OSError, ValueError):
+        pass
+    try:
+        with open("/sys/fs/cgroup/cpu/cpu.cfs_quota_us") as file:
+            quota = int(file.read())
+        with open("/sys/fs/cgroup/cpu/cpu.cfs_period_us") as file:
+            period = int(file.read())
+        return quota / period if quota > 0 else None
+    except (OSError, ValueError):
+        return None
+
+
+def available_cpus() -> int:
+    """
+    Số CPU tiến trình thực sự dùng được: theo CPU affinity và hạn mức CPU của container,
+    không phải số lõi của máy chủ (os.cpu_count()).
+    """
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpus = os.cpu_count() or 1
+    limit = _cgroup_cpu_limit()
+    if limit is not None:
+        cpus = min(cpus, math.ceil(limit))
+    return max(1, cpus)
+
+
+def worker_count(settings: Settings) -> int:
+    """
+    `web_concurrency` nếu được đặt, nếu không thì một worker cho mỗi CPU khả dụng
+    (tối đa `web_max_workers`). Ứng dụng chủ yếu chờ I/O nên không cần nhiều hơn số lõi.
+    """
+    if settings.web_concurrency > 0:
+        return settings.web_concurrency
+    return max(1, min(available_cpus(), settings.web_max_workers))
+
+
+def _installed(module: str) -> bool:
+    return importlib.util.find_spec(module) is not None
+
+
+def server_options(settings: Settings, workers: int) -> Dict[str, Any]:
+    """
+    Tham số cho `uvicorn.run`. uvloop/httptools được dùng nếu đã cài (có trong uvicorn[standard]).
+    """
+    return {
+        "host": settings.api_host,
+        "port": settings.api_port,
+        "workers": workers,
+        "loop": "uvloop" if _installed("uvloop") else "asyncio",
+        "http": "httptools" if _installed("httptools") else "h11",
+        "lifespan": "on",
+        "backlog": settings.web_backlog,
+        "timeout_keep_alive": settings.web_keepalive_timeout,
+        "timeout_graceful_shutdown": settings.web_graceful_timeout,
+        "limit_concurrency": settings.web_limit_concurrency,
+        "limit_max_requests": settings.web_max_requests,
+        "limit_max_requests_jitter": settings.web_max_requests_jitter,
+        # MetricsMiddleware đã ghi log truy cập có cấu trúc
+        "access_log": False,
+        "server_header": False,
+    }
+
+
+def main(argv: Optional[list] = None) -> None:
+    parser = argparse.ArgumentParser(description="Chạy backend CaseSurf ở chế độ production.")
+    parser.add_argument("--workers", type=int, help="Số worker (mặc định: WEB_CONCURRENCY hoặc số CPU khả dụng).")
+    parser.add_argument("--host", help="Mặc định: API_HOST.")
+    parser.add_argument("--port", type=int, help="Mặc định: API_PORT.")
+    parser.add_argument("--app", default="main:app", help="Ứng dụng ASGI dạng 'module:thuộc_tính'.")
+    parser.add_argument("--factory", action="store_true", help="--app là hàm tạo ứng dụng.")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s:     %(message)s")
+    # Đọc và kiểm tra cấu hình ngay ở tiến trình giám sát: thiếu biến môi trường thì dừng
+    # trước khi tạo worker nào
+    settings = get_settings()
+    workers = args.workers or worker_count(settings)
+    options = server_options(settings, workers)
+    if args.host:
+        options["host"] = args.host
+    if args.port:
+        options["port"] = args.port
+    logger.info(
+        "Khởi động %d worker (CPU khả dụng: %d, loop=%s, http=%s); tối đa %d kết nối MySQL và "
+        "%d lời gọi n8n đồng thời trên toàn bộ các worker.",
+        workers, available_cpus(), options["loop"], options["http"],
+        workers * settings.db_pool_size, workers * settings.n8n_max_concurrency,
+    )
+    uvicorn.run(args.app, factory=args.factory, **options)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class LRUCache:
+    """
+    Cache trong tiến trình lưu các giá trị bytes, loại bỏ theo LRU khi vượt `max_bytes`
+    và hết hạn sau `ttl` giây.
+    """
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024, ttl: float = 300.0):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._data: "OrderedDict[str, Tuple[float, bytes]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                self.misses += 1
+                return None
+            expires_at, value = item
+            if expires_at < time.monotonic():
+                self._remove(key)
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: str, value: bytes) -> None:
+        if len(value) > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._data:
+                self._remove(key)
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self.size += len(value)
+            while self.size > self.max_bytes:
+                oldest = next(iter(self._data))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            if key in self._data:
+                self._remove(key)
+
+    def _remove(self, key: str) -> None:
+        _, value = self._data.pop(key)
+        self.size -= len(value)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "entries": len(self._data),
+                "bytes": self.size,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+class TwoTierCache:
+    """
+    Cache đọc xuyên hai tầng: LRU trong tiến trình và một tầng dùng chung tùy chọn.
+
+    Tầng dùng chung là bất kỳ client bất đồng bộ nào có giao diện giống `redis.asyncio.Redis`
+    (`get`, `set(..., ex=)`, `delete`), ví dụ `fakeredis.aioredis.FakeRedis` khi kiểm thử.
+    Lỗi ở tầng dùng chung chỉ được ghi lại và coi như cache miss.
+    """
+    def __init__(self, local: Optional[LRUCache] = None, shared=None, shared_ttl: int = 86400, prefix: str = "casesurf:"):
+        self.local = local or LRUCache()
+        self.shared = shared
+        self.shared_ttl = shared_ttl
+        self.prefix = prefix
+        self.shared_hits = 0
+        self.shared_errors = 0
+
+    def configure(self, settings) -> None:
+        self.local = LRUCache(max_bytes=settings.cache_max_bytes, ttl=settings.cache_local_ttl)
+        self.shared_ttl = settings.cache_shared_ttl
+        if settings.redis_url:
+            try:
+                import redis.asyncio as redis
+            except ImportError:
+                logger.warning("Chưa cài gói 'redis', chỉ dùng cache trong tiến trình.")
+                return
+            self.shared = redis.from_url(settings.redis_url)
+
+    async def aclose(self) -> None:
+        if self.shared is not None and hasattr(self.shared, "aclose"):
+            await self.shared.aclose()
+
+    async def get(self, key: str) -> Optional[bytes]:
+        value = self.local.get(key)
+        if value is not None or self.shared is None:
+            return value
+        try:
+            value = await self.shared.get(self.prefix + key)
+        except Exception as e:
+            self.shared_errors += 1
+            logger.warning(f"Lỗi khi đọc cache dùng chung: {e}")
+            return None
+        if value is not None:
+            self.shared_hits += 1
+            self.local.set(key, value)
+        return value
+
+    async def set(self, key: str, value: bytes) -> None:
+        self.local.set(key, value)
+        if self.shared is None:
+            return
+        try:
+            await self.shared.set(self.prefix + key, value, ex=self.shared_ttl)
+        except Exception as e:
+            self.shared_errors += 1
+            logger.warning(f"Lỗi khi ghi cache dùng chung: {e}")
+
+    async def invalidate(self, *keys: str) -> None:
+        for key in keys:
+            self.local.delete(key)
+        if self.shared is None or not keys:
+            return
+        try:
+            await self.shared.delete(*(self.prefix + key for key in keys))
+        except Exception as e:
+            self.shared_errors += 1
+            logger.warning(f"Lỗi khi xóa cache dùng chung: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "local": self.local.stats(),
+            "shared_enabled": self.shared is not None,
+            "shared_hits": self.shared_hits,
+            "shared_errors": self.shared_errors,
+        }
@@ -0,0 +1,183 @@
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, Optional, TypeVar
+
+from mysql.connector import Error, pooling
+
+from app.services.executor import BoundedExecutor
+from app.services.metrics import timed
+
+T = TypeVar("T")
+
+logger = logging.getLogger(__name__)
+
+
+class Database:
+    """
+    Lớp quản lý pool kết nối MySQL dùng chung cho toàn bộ ứng dụng.
+
+    Pool được tạo một lần trong lifespan của FastAPI (xem `main.py`). Các truy vấn
+    đồng bộ của `mysql.connector` được chạy trong một thread-pool có giới hạn để
+    không chặn event loop của uvicorn; khi đã có `db_max_queue` truy vấn chờ, truy vấn
+    mới bị từ chối ngay (`ExecutorSaturatedError`, trả 503).
+
+    Truy vấn nặng (quét cả bảng, xuất dữ liệu, đồng bộ nền) chạy qua `run_bulk` trên
+    `db_bulk_workers` luồng riêng, nên không chiếm hết luồng của các truy vấn ngắn như
+    /url_tiktok. Tổng số luồng của hai nhóm bằng kích thước pool.
+    """
+    def __init__(self):
+        self._pool: Optional[pooling.MySQLConnectionPool] = None
+        self._executor = BoundedExecutor("db")
+        self._bulk_executor = BoundedExecutor("db_bulk")
+        self._lock = threading.Lock()
+        self.pool_size = 0
+        # Các chỉ số sử dụng pool
+        self.in_use = 0
+        self.checkouts = 0
+        self.checkout_errors = 0
+        self.reconnects = 0
+        self.total_wait_seconds = 0.0
+
+    @property
+    def is_open(self) -> bool:
+        return self._pool is not None
+
+    def open(self, settings) -> None:
+        """
+        Tạo pool kết nối và executor dựa trên `Settings`.
+        """
+        if self._pool is not None:
+            return
+        # mysql.connector giới hạn kích thước pool tối đa là 32
+        self.pool_size = max(1, min(settings.db_pool_size, pooling.CNX_POOL_MAXSIZE))
+        self._pool = pooling.MySQLConnectionPool(
+            pool_name=settings.db_pool_name,
+            pool_size=self.pool_size,
+            pool_reset_session=True,
+            host=settings.hostname,
+            database=settings.db_host,
+            user=settings.username,
+            password=settings.password,
+            connection_timeout=settings.db_connect_timeout,
+        )
+        # Mỗi luồng giữ tối đa một kết nối nên tổng số luồng bằng kích thước pool,
+        # pool sẽ không bao giờ bị cạn. Luôn chừa ít nhất một luồng cho truy vấn ngắn.
+        bulk_workers = max(0, min(settings.db_bulk_workers, self.pool_size - 1))
+        self._executor.start(max_workers=self.pool_size - bulk_workers, max_queue=settings.db_max_queue)
+        if bulk_workers:
+            self._bulk_executor.start(max_workers=bulk_workers, max_queue=settings.db_bulk_max_queue)
+        logger.info(f"Đã khởi tạo pool kết nối MySQL với {self.pool_size} kết nối.")
+
+    def close(self) -> None:
+        """
+        Chờ các truy vấn đang chạy kết thúc rồi đóng toàn bộ kết nối trong pool.
+        """
+        self._executor.shutdown(wait=True)
+        self._bulk_executor.shutdown(wait=True)
+        if self._pool is not None:
+            try:
+                self._pool._remove_connections()
+            except Error as e:
+                logger.error(f"Lỗi khi đóng pool kết nối: {e}")
+            self._pool = None
+            logger.info("Pool kết nối MySQL đã được đóng.")
+
+    def get_connection(self):
+        """
+        Lấy một kết nối từ pool và kiểm tra sức khỏe của nó trước khi trả về.
+
+        Raises:
+            RuntimeError: Nếu pool chưa được khởi tạo.
+            mysql.connector.Error: Nếu không thể lấy hoặc kết nối lại.
+        """
+        if self._pool is None:
+            raise RuntimeError("Pool kết nối chưa được khởi tạo.")
+        started = time.perf_counter()
+        try:
+            connection = self._pool.get_connection()
+            if not connection.is_connected():
+                # Kết nối đã bị server đóng (wait_timeout), thử kết nối lại
+                connection.reconnect(attempts=2, delay=0)
+                with self._lock:
+                    self.reconnects += 1
+        except Error:
+            with self._lock:
+                self.checkout_errors += 1
+            raise
+        with self._lock:
+            self.checkouts += 1
+            self.in_use += 1
+            self.total_wait_seconds += time.perf_counter() - started
+        return connection
+
+    def release(self, connection) -> None:
+        """
+        Trả kết nối về pool.
+        """
+        with self._lock:
+            self.in_use -= 1
+        connection.close()
+
+    def _call(self, func: Callable[..., T], args: tuple) -> T:
+        # Thời gian lấy kết nối rồi chạy truy vấn (thời gian chờ luồng rảnh do executor ghi)
+        with timed("db", "checkout"):
+            connection = self.get_connection()
+        try:
+            with timed("db", getattr(func, "__name__", "query")):
+                return func(connection, *args)
+        finally:
+            self.release(connection)
+
+    async def run(self, func: Callable[..., T], *args: Any) -> T:
+        """
+        Chạy `func(connection, *args)` trong thread-pool với một kết nối từ pool.
+
+        Raises:
+            RuntimeError: Nếu pool chưa được khởi tạo.
+            ExecutorSaturatedError: Nếu thread-pool đã đủ truy vấn đang chạy và đang chờ.
+        """
+        return await self._executor.run(self._call, func, args)
+
+    async def run_bulk(self, func: Callable[..., T], *args: Any) -> T:
+        """
+        Như `run` nhưng cho truy vấn nặng, chạy trên nhóm luồng riêng (hoặc nhóm chung nếu pool
+        quá nhỏ để tách).
+        """
+        executor = self._bulk_executor if self._bulk_executor.is_running else self._executor
+        return await executor.run(self._call, func, args)
+
+    @staticmethod
+    def _ping(connection) -> bool:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT 1")
+            return cursor.fetchone() is not None
+
+    async def health_check(self) -> bool:
+        """
+        Kiểm tra sức khỏe: lấy một kết nối từ pool và chạy `SELECT 1`.
+        """
+        return await self.run(self._ping)
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Trả về các chỉ số sử dụng pool.
+        """
+        with self._lock:
+            return {
+                "pool_size": self.pool_size,
+                "in_use": self.in_use,
+                "available": max(self.pool_size - self.in_use, 0),
+                "checkouts": self.checkouts,
+                "checkout_errors": self.checkout_errors,
+                "reconnects": self.reconnects,
+                "avg_checkout_ms": (
+                    self.total_wait_seconds / self.checkouts * 1000 if self.checkouts else 0.0
+                ),
+                "executor": self._executor.stats(),
+                "bulk_executor": self._bulk_executor.stats(),
+            }
+
+
+# Instance dùng chung, được mở/đóng trong lifespan của ứng dụng
+database = Database()
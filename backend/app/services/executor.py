@@ -0,0 +1,145 @@
+import asyncio
+import contextvars
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional, TypeVar
+
+from app.services.metrics import Counter, record_stage, registry
+from app.services.resilience import ServiceUnavailableError
+
+T = TypeVar("T")
+
+executor_rejected = registry.register(Counter(
+    "casesurf_executor_rejected_total", "Số tác vụ bị từ chối vì thread-pool đã đầy.", ("executor",),
+))
+executor_busy = registry.register(Counter(
+    "casesurf_executor_busy_seconds_total",
+    "Tổng thời gian các luồng của thread-pool bận (chia cho số luồng để ra mức sử dụng).", ("executor",),
+))
+
+
+class ExecutorSaturatedError(ServiceUnavailableError):
+    """
+    Thread-pool đã đủ tác vụ đang chạy và đang chờ: từ chối ngay (503) thay vì xếp hàng thêm.
+    """
+    def __init__(self, name: str, retry_after: float = 1.0):
+        super().__init__(f"Hệ thống đang quá tải ({name}), vui lòng thử lại sau.")
+        self.name = name
+        self.retry_after = retry_after
+
+
+class BoundedExecutor:
+    """
+    Thread-pool cho công việc chặn (truy vấn DB đồng bộ, dựng dữ liệu JSON lớn) với hàng đợi có giới hạn.
+
+    Tối đa `max_workers` tác vụ chạy cùng lúc và `max_queue` tác vụ chờ; khi đầy, `run` ném
+    `ExecutorSaturatedError` ngay lập tức để yêu cầu được trả 503 thay vì chờ vô hạn và kéo
+    theo độ trễ của mọi yêu cầu khác. Thời gian chờ trong hàng đợi được ghi vào giai đoạn
+    `<name>.queue` của yêu cầu hiện tại.
+    """
+    def __init__(self, name: str, max_workers: int = 4, max_queue: int = 100, retry_after: float = 1.0):
+        self.name = name
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.retry_after = retry_after
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+        self._started_at = 0.0
+        # Chỉ số sử dụng
+        self.pending = 0
+        self.active = 0
+        self.submitted = 0
+        self.completed = 0
+        self.rejected = 0
+        self.busy_seconds = 0.0
+        self.max_pending = 0
+
+    @property
+    def is_running(self) -> bool:
+        return self._executor is not None
+
+    def start(self, max_workers: Optional[int] = None, max_queue: Optional[int] = None) -> None:
+        if self._executor is not None:
+            return
+        if max_workers is not None:
+            self.max_workers = max(1, max_workers)
+        if max_queue is not None:
+            self.max_queue = max(0, max_queue)
+        self._started_at = time.monotonic()
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix=self.name)
+
+    def shutdown(self, wait: bool = True) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait)
+            self._executor = None
+
+    def _invoke(self, func: Callable[..., T], args: tuple, submitted: float) -> T:
+        started = time.perf_counter()
+        record_stage(self.name, "queue", started - submitted)
+        with self._lock:
+            self.active += 1
+        try:
+            return func(*args)
+        finally:
+            busy = time.perf_counter() - started
+            executor_busy.inc(busy, executor=self.name)
+            with self._lock:
+                self.active -= 1
+                self.busy_seconds += busy
+
+    def _done(self, future: Future) -> None:
+        # Gọi khi tác vụ thật sự kết thúc (hoặc bị hủy trước khi chạy), kể cả khi người chờ đã bỏ đi
+        with self._lock:
+            self.pending -= 1
+            self.completed += 1
+
+    async def run(self, func: Callable[..., T], *args: Any) -> T:
+        """
+        Chạy `func(*args)` trong thread-pool, trong bản sao context của yêu cầu hiện tại.
+
+        Raises:
+            RuntimeError: Nếu executor chưa được khởi động.
+            ExecutorSaturatedError: Nếu số tác vụ đang chạy và đang chờ đã tới giới hạn.
+        """
+        if self._executor is None:
+            raise RuntimeError(f"Executor '{self.name}' chưa được khởi động.")
+        with self._lock:
+            if self.pending >= self.max_workers + self.max_queue:
+                self.rejected += 1
+                executor_rejected.inc(executor=self.name)
+                raise ExecutorSaturatedError(self.name, self.retry_after)
+            self.pending += 1
+            self.submitted += 1
+            self.max_pending = max(self.max_pending, self.pending)
+        context = contextvars.copy_context()
+        future = self._executor.submit(context.run, self._invoke, func, args, time.perf_counter())
+        future.add_done_callback(self._done)
+        return await asyncio.wrap_future(future)
+
+    def utilization(self) -> float:
+        # Tỷ lệ thời gian bận trung bình của các luồng kể từ khi khởi động
+        elapsed = time.monotonic() - self._started_at if self._started_at else 0.0
+        if elapsed <= 0:
+            return 0.0
+        return min(1.0, self.busy_seconds / (elapsed * self.max_workers))
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "workers": self.max_workers,
+                "max_queue": self.max_queue,
+                "active": self.active,
+                "queued": max(self.pending - self.active, 0),
+                "max_pending": self.max_pending,
+                "submitted": self.submitted,
+                "completed": self.completed,
+                "rejected": self.rejected,
+                "utilization": round(self.utilization(), 4),
+            }
+
+
+# Thread-pool cho việc nặng CPU viết bằng Python (dựng/tuần tự hóa các trang dữ liệu lớn),
+# được khởi động trong lifespan. Luồng vẫn cần GIL, nhưng interpreter nhường GIL định kỳ nên
+# event loop tiếp tục phục vụ các yêu cầu khác thay vì bị chặn đến khi xong.
+cpu_executor = BoundedExecutor("cpu", max_workers=2, max_queue=32)
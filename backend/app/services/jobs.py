@@ -0,0 +1,153 @@
+import asyncio
+import time
+import uuid
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from pydantic import BaseModel
+
+
+class QueueFullError(Exception):
+    """
+    Hàng đợi công việc đã đầy.
+    """
+
+
+class Job:
+    """
+    Một công việc tạo báo cáo chạy nền và các client đang theo dõi nó.
+    """
+    def __init__(self, fn: Callable[[], Awaitable[BaseModel]]):
+        self.id = uuid.uuid4().hex
+        self.fn = fn
+        self.status = "queued"
+        self.result: Optional[BaseModel] = None
+        self.error: Optional[str] = None
+        self.created_at = time.time()
+        self.updated_at = self.created_at
+        self._subscribers: List[asyncio.Queue] = []
+
+    @property
+    def finished(self) -> bool:
+        return self.status in ("completed", "failed")
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "created_at": self.created_at,
+            "updated_at": self.updated_at,
+            "result": self.result,
+            "error": self.error,
+        }
+
+    def set_status(self, status: str) -> None:
+        self.status = status
+        self.updated_at = time.time()
+        for queue in self._subscribers:
+            queue.put_nowait(status)
+
+    def subscribe(self) -> asyncio.Queue:
+        queue: asyncio.Queue = asyncio.Queue()
+        self._subscribers.append(queue)
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue) -> None:
+        if queue in self._subscribers:
+            self._subscribers.remove(queue)
+
+
+class JobQueue:
+    """
+    Hàng đợi công việc trong bộ nhớ với số worker cố định.
+
+    Số worker cũng là giới hạn số lời gọi n8n đồng thời do hàng đợi phát ra. Công việc
+    đã kết thúc được giữ lại `ttl` giây để client kịp lấy kết quả. `describe_error` chuyển
+    lỗi của công việc thất bại thành thông báo lưu trong `Job.error` (mặc định `str(e)`).
+    """
+    def __init__(
+        self,
+        workers: int = 4,
+        max_size: int = 100,
+        ttl: float = 3600.0,
+        describe_error: Callable[[Exception], str] = str,
+    ):
+        self.workers = workers
+        self.max_size = max_size
+        self.ttl = ttl
+        self.describe_error = describe_error
+        self._jobs: Dict[str, Job] = {}
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+        self.running = 0
+
+    def configure(self, settings) -> None:
+        self.workers = settings.report_job_workers
+        self.max_size = settings.report_job_queue_size
+        self.ttl = settings.report_job_ttl
+
+    async def start(self) -> None:
+        if self._tasks:
+            return
+        self._queue = asyncio.Queue(maxsize=self.max_size)
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._queue = None
+
+    def submit(self, fn: Callable[[], Awaitable[BaseModel]]) -> Job:
+        """
+        Đưa công việc vào hàng đợi.
+
+        Raises:
+            RuntimeError: Nếu hàng đợi chưa được khởi động.
+            QueueFullError: Nếu hàng đợi đã đầy.
+        """
+        if self._queue is None:
+            raise RuntimeError("Hàng đợi công việc chưa được khởi động.")
+        self._evict_expired()
+        job = Job(fn)
+        try:
+            self._queue.put_nowait(job)
+        except asyncio.QueueFull:
+            raise QueueFullError("Hàng đợi công việc đã đầy.")
+        self._jobs[job.id] = job
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        return self._jobs.get(job_id)
+
+    async def _worker(self) -> None:
+        while True:
+            job = await self._queue.get()
+            self.running += 1
+            job.set_status("running")
+            try:
+                job.result = await job.fn()
+                job.set_status("completed")
+            except Exception as e:
+                job.error = self.describe_error(e)
+                job.set_status("failed")
+            finally:
+                self.running -= 1
+                self._queue.task_done()
+
+    def _evict_expired(self) -> None:
+        cutoff = time.time() - self.ttl
+        expired = [
+            job_id for job_id, job in self._jobs.items()
+            if job.finished and job.updated_at < cutoff
+        ]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "workers": self.workers,
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "running": self.running,
+            "tracked": len(self._jobs),
+        }
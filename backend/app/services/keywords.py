@@ -0,0 +1,164 @@
+import asyncio
+import heapq
+import logging
+import time
+from collections import Counter
+from typing import Any, Dict, List, Optional, Tuple
+
+from mysql.connector import Error
+
+from app.services.executor import ExecutorSaturatedError
+
+logger = logging.getLogger(__name__)
+
+# Các bảng từ khóa, mỗi bảng là một nhóm (category)
+KEYWORD_TABLES = (
+    "niche",
+    "content_angle",
+    "hook_type",
+    "product_type",
+    "script_framework",
+    "title",
+)
+
+
+def _fetch_table_sizes(connection) -> Tuple[int, ...]:
+    # Một truy vấn duy nhất để biết các bảng có thay đổi số dòng hay không
+    query = "SELECT " + ", ".join(f"(SELECT COUNT(*) FROM {table})" for table in KEYWORD_TABLES)
+    with connection.cursor() as cursor:
+        cursor.execute(query)
+        return tuple(cursor.fetchone())
+
+
+def _fetch_grouped_counts(connection, tables: Tuple[str, ...]) -> Dict[str, Counter]:
+    counts = {}
+    with connection.cursor() as cursor:
+        for table in tables:
+            cursor.execute(
+                f"SELECT keyword, COUNT(*) FROM {table} WHERE keyword IS NOT NULL GROUP BY keyword"
+            )
+            counts[table] = Counter({keyword: count for keyword, count in cursor.fetchall()})
+    return counts
+
+
+def _rank(item: Tuple[str, int]) -> Tuple[int, str]:
+    return -item[1], item[0]
+
+
+def fetch_top_keywords(connection, tables: Tuple[str, ...], limit: Optional[int]) -> List[Tuple[str, int]]:
+    """
+    Đếm từ khóa trực tiếp bằng GROUP BY trên MySQL (dùng khi chưa có bảng tổng hợp).
+    """
+    union = " UNION ALL ".join(
+        f"SELECT keyword, COUNT(*) AS c FROM {table} WHERE keyword IS NOT NULL GROUP BY keyword"
+        for table in tables
+    )
+    query = f"SELECT keyword, SUM(c) AS total FROM ({union}) AS k GROUP BY keyword ORDER BY total DESC, keyword"
+    params: tuple = ()
+    if limit is not None:
+        query += " LIMIT %s"
+        params = (limit,)
+    with connection.cursor() as cursor:
+        cursor.execute(query, params)
+        return [(keyword, int(total)) for keyword, total in cursor.fetchall()]
+
+
+class KeywordAggregate:
+    """
+    Bảng tổng hợp từ khóa -> số lần xuất hiện, giữ trong bộ nhớ.
+
+    Một tác vụ nền kiểm tra định kỳ số dòng của các bảng từ khóa và chỉ tải lại
+    (bằng GROUP BY trên MySQL) khi có thay đổi, hoặc khi dữ liệu cũ hơn `max_staleness`.
+    Các dòng mới do backend tự ghi được cộng dồn ngay qua `add()`.
+    """
+    def __init__(self, database, refresh_interval: float = 60.0, max_staleness: float = 600.0):
+        self.database = database
+        self.refresh_interval = refresh_interval
+        self.max_staleness = max_staleness
+        self._counts: Optional[Dict[str, Counter]] = None
+        self._total: Counter = Counter()
+        self._version: Optional[Tuple[int, ...]] = None
+        self._task: Optional[asyncio.Task] = None
+        self.refreshed_at = 0.0
+        self.refreshes = 0
+
+    def configure(self, settings) -> None:
+        self.refresh_interval = settings.keyword_refresh_interval
+        self.max_staleness = settings.keyword_max_staleness
+
+    @property
+    def loaded(self) -> bool:
+        return self._counts is not None
+
+    async def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._refresh_loop())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _refresh_loop(self) -> None:
+        while True:
+            try:
+                await self.refresh()
+            except (Error, RuntimeError, ExecutorSaturatedError) as e:
+                logger.error(f"Lỗi khi làm mới bảng tổng hợp từ khóa: {e}")
+            await asyncio.sleep(self.refresh_interval)
+
+    async def refresh(self, force: bool = False) -> bool:
+        """
+        Tải lại bảng tổng hợp nếu dữ liệu đã cũ. Trả về True nếu đã tải lại.
+        """
+        version = await self.database.run(_fetch_table_sizes)
+        expired = time.monotonic() - self.refreshed_at > self.max_staleness
+        if not force and self.loaded and version == self._version and not expired:
+            return False
+        counts = await self.database.run_bulk(_fetch_grouped_counts, KEYWORD_TABLES)
+        total: Counter = Counter()
+        for counter in counts.values():
+            total.update(counter)
+        self._counts, self._total, self._version = counts, total, version
+        self.refreshed_at = time.monotonic()
+        self.refreshes += 1
+        return True
+
+    def add(self, category: str, keywords: List[str]) -> None:
+        """
+        Cộng dồn các từ khóa vừa được ghi vào bảng `category`.
+        """
+        if self._counts is None or category not in self._counts:
+            return
+        self._counts[category].update(keywords)
+        self._total.update(keywords)
+        if self._version is not None:
+            # Giữ version khớp với số dòng mới để lần kiểm tra sau không tải lại vô ích
+            index = KEYWORD_TABLES.index(category)
+            version = list(self._version)
+            version[index] += len(keywords)
+            self._version = tuple(version)
+
+    async def top(self, category: Optional[str] = None, limit: Optional[int] = None) -> List[Tuple[str, int]]:
+        """
+        Trả về các từ khóa phổ biến nhất. Nếu bảng tổng hợp chưa sẵn sàng,
+        đếm trực tiếp bằng GROUP BY trên MySQL.
+        """
+        if self._counts is None:
+            tables = (category,) if category else KEYWORD_TABLES
+            return await self.database.run_bulk(fetch_top_keywords, tables, limit)
+        counter = self._counts[category] if category else self._total
+        # Từ khóa cùng số lần xuất hiện được xếp theo chữ cái, để thứ tự (và ETag của /keywords)
+        # không phụ thuộc vào thứ tự nạp dữ liệu của từng worker
+        if limit is None:
+            return sorted(counter.items(), key=_rank)
+        return heapq.nsmallest(limit, counter.items(), key=_rank)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "loaded": self.loaded,
+            "keywords": len(self._total),
+            "refreshes": self.refreshes,
+            "age_seconds": time.monotonic() - self.refreshed_at if self.loaded else None,
+        }
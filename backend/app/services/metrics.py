@@ -0,0 +1,214 @@
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import httpx
+
+# Ngưỡng histogram mặc định (giây), đủ rộng cho cả truy vấn DB và lời gọi n8n
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+# Thời gian theo từng giai đoạn của yêu cầu hiện tại, để ghi vào log truy cập
+request_stages: ContextVar[Optional[Dict[str, float]]] = ContextVar("request_stages", default=None)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def collect(self) -> List[str]:
+        with self._lock:
+            items = list(self._values.items())
+        return self.header() + [f"{self.name}{_labels(self.labelnames, key)} {_format(value)}" for key, value in items]
+
+
+class Gauge(_Metric):
+    """
+    Gauge đặt trực tiếp (`set`/`inc`/`dec`) hoặc đọc từ hàm `source` lúc scrape.
+    """
+    kind = "gauge"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        source: Optional[Callable[[], Dict[Tuple[str, ...], float]]] = None,
+    ):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self.source = source
+
+    def set(self, value: float, **labels: str) -> None:
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels: str) -> None:
+        self.inc(-amount, **labels)
+
+    def collect(self) -> List[str]:
+        if self.source is not None:
+            items = list(self.source().items())
+        else:
+            with self._lock:
+                items = list(self._values.items())
+        return self.header() + [f"{self.name}{_labels(self.labelnames, key)} {_format(value)}" for key, value in items]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(
+        self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # Mỗi bộ nhãn: [đếm theo từng bucket (không cộng dồn) + bucket +Inf, tổng, số lần]
+        self._values: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    def collect(self) -> List[str]:
+        with self._lock:
+            items = [(key, (list(state[0]), state[1], state[2])) for key, state in self._values.items()]
+        lines = self.header()
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = f'le="{_format(bound)}"'
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, key)} {_format(total)}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, key)} {count}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        """
+        Xuất toàn bộ chỉ số theo định dạng văn bản của Prometheus (text/plain; version=0.0.4).
+        """
+        lines: List[str] = []
+        for metric in self._metrics:
+            lines.extend(metric.collect())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+http_requests = registry.register(Counter(
+    "casesurf_http_requests_total", "Số yêu cầu HTTP đã xử lý.", ("method", "route", "status"),
+))
+http_request_duration = registry.register(Histogram(
+    "casesurf_http_request_duration_seconds", "Thời gian xử lý yêu cầu HTTP.", ("method", "route"),
+))
+http_in_flight = registry.register(Gauge(
+    "casesurf_http_requests_in_flight", "Số yêu cầu HTTP đang xử lý.",
+))
+stage_duration = registry.register(Histogram(
+    "casesurf_stage_duration_seconds", "Thời gian của từng giai đoạn (DB, n8n, tuần tự hóa).", ("stage", "name"),
+))
+upstream_requests = registry.register(Counter(
+    "casesurf_upstream_requests_total", "Số lời gọi tới dịch vụ bên ngoài theo kết quả.",
+    ("upstream", "endpoint", "outcome"),
+))
+
+
+def record_stage(stage: str, name: str, elapsed: float) -> None:
+    stage_duration.observe(elapsed, stage=stage, name=name)
+    stages = request_stages.get()
+    if stages is not None:
+        label = f"{stage}.{name}" if name else stage
+        stages[label] = stages.get(label, 0.0) + elapsed
+
+
+@contextmanager
+def timed(stage: str, name: str = "") -> Iterator[None]:
+    """
+    Đo thời gian một giai đoạn: ghi vào histogram và vào bảng giai đoạn của yêu cầu hiện tại.
+    Dùng được cả trong code đồng bộ lẫn bất đồng bộ (`with timed("db", "query"): await ...`).
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(stage, name, time.perf_counter() - started)
+
+
+def outcome(error: Optional[BaseException]) -> str:
+    """
+    Phân loại kết quả lời gọi ra ngoài cho nhãn `outcome`.
+    """
+    if error is None:
+        return "success"
+    if isinstance(error, httpx.HTTPStatusError):
+        return f"http_{error.response.status_code // 100}xx"
+    if isinstance(error, httpx.TimeoutException):
+        return "timeout"
+    if isinstance(error, httpx.RequestError):
+        return "connection_error"
+    return type(error).__name__
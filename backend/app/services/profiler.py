@@ -0,0 +1,71 @@
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Any, Dict
+
+
+class ProfilerBusyError(Exception):
+    """
+    Đang có một phiên lấy mẫu khác chạy.
+    """
+
+
+class SamplingProfiler:
+    """
+    Profiler lấy mẫu cho tiến trình đang chạy: cứ mỗi `interval` giây chụp stack của mọi luồng
+    (event loop, thread-pool DB, ...) qua `sys._current_frames()`.
+
+    Kết quả ở định dạng "folded stacks" (mỗi dòng `luồng;hàm;hàm... số_mẫu`), mở được trực tiếp
+    bằng speedscope hoặc flamegraph.pl. Chỉ tốn chi phí trong lúc đang lấy mẫu, và chỉ chạy khi
+    được bật bằng cấu hình.
+    """
+    def __init__(self, enabled: bool = False, max_seconds: float = 60.0):
+        self.enabled = enabled
+        self.max_seconds = max_seconds
+        self._lock = threading.Lock()
+        self.sessions = 0
+
+    def configure(self, settings) -> None:
+        self.enabled = settings.profiling_enabled
+        self.max_seconds = settings.profiling_max_seconds
+
+    @staticmethod
+    def _frame_name(frame) -> str:
+        code = frame.f_code
+        return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+    def sample(self, seconds: float, interval: float = 0.005) -> str:
+        """
+        Lấy mẫu trong `seconds` giây (chặn luồng gọi; hãy chạy bằng `asyncio.to_thread`).
+
+        Raises:
+            ProfilerBusyError: Nếu đang có phiên khác.
+        """
+        if not self._lock.acquire(blocking=False):
+            raise ProfilerBusyError("Đang có một phiên profile khác.")
+        try:
+            self.sessions += 1
+            seconds = min(seconds, self.max_seconds)
+            own = threading.get_ident()
+            stacks: Counter = Counter()
+            deadline = time.monotonic() + seconds
+            while time.monotonic() < deadline:
+                names = {thread.ident: thread.name for thread in threading.enumerate()}
+                for ident, frame in sys._current_frames().items():
+                    if ident == own:
+                        continue
+                    stack = []
+                    while frame is not None:
+                        stack.append(self._frame_name(frame))
+                        frame = frame.f_back
+                    stack.append(names.get(ident, str(ident)))
+                    stacks[";".join(reversed(stack))] += 1
+                time.sleep(interval)
+            return "".join(f"{stack} {count}\n" for stack, count in stacks.most_common())
+        finally:
+            self._lock.release()
+
+    def stats(self) -> Dict[str, Any]:
+        return {"enabled": self.enabled, "running": self._lock.locked(), "sessions": self.sessions}
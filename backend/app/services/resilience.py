@@ -0,0 +1,272 @@
+import asyncio
+import random
+import time
+from contextlib import asynccontextmanager
+from typing import Any, AsyncContextManager, AsyncIterator, Awaitable, Callable, Dict, TypeVar
+
+import httpx
+
+T = TypeVar("T")
+
+
+class ServiceUnavailableError(Exception):
+    """
+    Lời gọi bị từ chối ngay mà không gửi tới dịch vụ bên ngoài (nên trả về 503).
+    """
+
+
+class CircuitOpenError(ServiceUnavailableError):
+    """
+    Cầu dao đang mở do dịch vụ bên ngoài lỗi liên tục.
+    """
+
+
+class ConcurrencyLimitError(ServiceUnavailableError):
+    """
+    Không lấy được suất gọi trong thời gian chờ cho phép.
+    """
+
+
+class DeadlineExceededError(httpx.TimeoutException):
+    """
+    Lời gọi vượt quá thời hạn tổng của endpoint (kể cả các lần thử lại).
+    Kế thừa `httpx.TimeoutException` nên được xử lý như lỗi timeout của httpx.
+    """
+
+
+def is_failure(error: BaseException) -> bool:
+    """
+    Lỗi có phản ánh tình trạng của dịch vụ bên ngoài không (dùng cho cầu dao và thử lại).
+    Lỗi 4xx là lỗi của yêu cầu nên không tính.
+    """
+    if isinstance(error, httpx.HTTPStatusError):
+        return error.response.status_code >= 500
+    return isinstance(error, httpx.RequestError)
+
+
+class CircuitBreaker:
+    """
+    Cầu dao ba trạng thái: closed -> open sau `failure_threshold` lỗi liên tiếp,
+    open -> half_open sau `reset_timeout` giây (cho một lời gọi thử), thành công thì đóng lại.
+    """
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.opens = 0
+        self.rejected = 0
+        self._trial_in_flight = False
+
+    def check(self) -> None:
+        """
+        Raises:
+            CircuitOpenError: Nếu cầu dao đang mở hoặc đã có một lời gọi thử đang chạy.
+        """
+        if self.state == "open":
+            if time.monotonic() - self.opened_at < self.reset_timeout:
+                self.rejected += 1
+                raise CircuitOpenError("Dịch vụ n8n tạm thời không khả dụng.")
+            self.state = "half_open"
+        if self.state == "half_open":
+            if self._trial_in_flight:
+                self.rejected += 1
+                raise CircuitOpenError("Dịch vụ n8n tạm thời không khả dụng.")
+            self._trial_in_flight = True
+
+    def record_success(self) -> None:
+        self.state = "closed"
+        self.consecutive_failures = 0
+        self._trial_in_flight = False
+
+    def record_failure(self) -> None:
+        self.consecutive_failures += 1
+        self._trial_in_flight = False
+        if self.state == "half_open" or self.consecutive_failures >= self.failure_threshold:
+            if self.state != "open":
+                self.opens += 1
+            self.state = "open"
+            self.opened_at = time.monotonic()
+
+    def release(self) -> None:
+        # Lời gọi kết thúc mà không phản ánh tình trạng dịch vụ (ví dụ lỗi 4xx)
+        self._trial_in_flight = False
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "state": self.state,
+            "consecutive_failures": self.consecutive_failures,
+            "opens": self.opens,
+            "rejected": self.rejected,
+        }
+
+
+class ConcurrencyLimiter:
+    """
+    Giới hạn số lời gọi đồng thời ra dịch vụ bên ngoài bằng semaphore; chờ tối đa
+    `acquire_timeout` giây để lấy suất.
+    """
+    def __init__(self, max_concurrency: int = 16, acquire_timeout: float = 10.0):
+        self.max_concurrency = max_concurrency
+        self.acquire_timeout = acquire_timeout
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self.in_flight = 0
+        self.waiting = 0
+        self.rejected = 0
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[None]:
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), self.acquire_timeout)
+        except asyncio.TimeoutError:
+            self.rejected += 1
+            raise ConcurrencyLimitError("Quá nhiều yêu cầu đang chờ dịch vụ n8n.")
+        finally:
+            self.waiting -= 1
+        self.in_flight += 1
+        try:
+            yield
+        finally:
+            self.in_flight -= 1
+            self._semaphore.release()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "max_concurrency": self.max_concurrency,
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "rejected": self.rejected,
+        }
+
+
+class ResiliencePolicy:
+    """
+    Chính sách gọi một endpoint bên ngoài: thời hạn tổng, thử lại có jitter (chỉ cho lời gọi
+    idempotent), giới hạn đồng thời và cầu dao dùng chung.
+    """
+    def __init__(
+        self,
+        name: str,
+        breaker: CircuitBreaker,
+        limiter: ConcurrencyLimiter,
+        deadline: float,
+        retries: int = 0,
+        backoff_base: float = 0.5,
+        backoff_max: float = 5.0,
+    ):
+        self.name = name
+        self.breaker = breaker
+        self.limiter = limiter
+        self.deadline = deadline
+        self.retries = retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.calls = 0
+        self.failures = 0
+        self.retried = 0
+        self.timeouts = 0
+
+    def _backoff(self, attempt: int) -> float:
+        # Full jitter: ngẫu nhiên trong [0, min(max, base * 2^attempt)]
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    async def call(self, fn: Callable[[], Awaitable[T]]) -> T:
+        """
+        Gọi `fn()` theo chính sách.
+
+        Raises:
+            CircuitOpenError, ConcurrencyLimitError: Bị từ chối ngay.
+            DeadlineExceededError: Vượt quá thời hạn tổng.
+            Các lỗi khác của `fn()` sau khi đã hết số lần thử lại.
+        """
+        self.calls += 1
+        deadline_at = time.monotonic() + self.deadline
+        attempt = 0
+        while True:
+            self.breaker.check()
+            remaining = deadline_at - time.monotonic()
+            try:
+                async with self.limiter.slot():
+                    result = await asyncio.wait_for(fn(), max(remaining, 0))
+            except asyncio.TimeoutError:
+                self.timeouts += 1
+                self.failures += 1
+                self.breaker.record_failure()
+                raise DeadlineExceededError(f"Lời gọi {self.name} vượt quá {self.deadline} giây.")
+            except ConcurrencyLimitError:
+                self.breaker.release()
+                raise
+            except Exception as e:
+                if not is_failure(e):
+                    self.breaker.release()
+                    raise
+                self.failures += 1
+                self.breaker.record_failure()
+                delay = self._backoff(attempt)
+                if attempt >= self.retries or time.monotonic() + delay >= deadline_at:
+                    raise
+                attempt += 1
+                self.retried += 1
+                await asyncio.sleep(delay)
+                continue
+            except BaseException:
+                # Bị hủy (client ngắt kết nối, wait_for bên ngoài): không phản ánh tình trạng
+                # dịch vụ, nhưng phải trả lại suất gọi thử nếu cầu dao đang half_open
+                self.breaker.release()
+                raise
+            self.breaker.record_success()
+            return result
+
+    @asynccontextmanager
+    async def stream(self) -> AsyncIterator[Callable[[], AsyncContextManager[None]]]:
+        """
+        Bảo vệ một lời gọi dạng luồng: giữ suất gọi trong suốt thời gian luồng và ghi nhận
+        kết quả vào cầu dao. Không thử lại vì dữ liệu có thể đã được gửi cho client.
+
+        Trả về `within`: mỗi bước chờ n8n (gửi yêu cầu, đọc từng đoạn) được bọc trong
+        `async with within():` để thời hạn tổng được áp dụng. Thời hạn không bọc quanh các
+        `yield` của luồng, vì khi đó việc hủy sẽ rơi vào code của người đọc luồng.
+
+        Raises:
+            DeadlineExceededError: Trong `within()`, khi vượt quá thời hạn tổng.
+        """
+        self.calls += 1
+        self.breaker.check()
+        deadline_at = asyncio.get_running_loop().time() + self.deadline
+
+        @asynccontextmanager
+        async def within() -> AsyncIterator[None]:
+            try:
+                async with asyncio.timeout_at(deadline_at):
+                    yield
+            except TimeoutError:
+                raise DeadlineExceededError(f"Lời gọi {self.name} vượt quá {self.deadline} giây.")
+
+        try:
+            async with self.limiter.slot():
+                yield within
+        except ConcurrencyLimitError:
+            self.breaker.release()
+            raise
+        except BaseException as e:
+            if isinstance(e, DeadlineExceededError):
+                self.timeouts += 1
+            if is_failure(e):
+                self.failures += 1
+                self.breaker.record_failure()
+            else:
+                self.breaker.release()
+            raise
+        self.breaker.record_success()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "deadline": self.deadline,
+            "retries": self.retries,
+            "calls": self.calls,
+            "failures": self.failures,
+            "retried": self.retried,
+            "timeouts": self.timeouts,
+        }
@@ -0,0 +1,161 @@
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+def script_cache_key(base_text: str, improvements: List[str], is_iterative: bool) -> str:
+    """
+    Khóa nội dung (content-addressed) ổn định cho một yêu cầu tạo kịch bản.
+
+    Văn bản được chuẩn hóa khoảng trắng/xuống dòng và danh sách cải tiến được sắp xếp,
+    nên cùng một checklist gửi theo thứ tự khác vẫn cho cùng một khóa.
+    """
+    normalized = {
+        "base_text": "\n".join(line.rstrip() for line in base_text.strip().splitlines()),
+        "improvements": sorted(item.strip() for item in improvements),
+        "is_iterative": bool(is_iterative),
+    }
+    payload = json.dumps(normalized, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ScriptCache:
+    """
+    Cache bền vững (SQLite) cho kết quả /improvement-script.
+
+    Mỗi mục hết hạn sau `ttl` giây; khi tổng dung lượng vượt `max_bytes`, các mục
+    ít được dùng gần đây nhất bị loại bỏ trước. Lỗi SQLite (file bị khóa bởi worker khác,
+    file hỏng) chỉ được ghi lại và coi như cache miss, để yêu cầu vẫn được chuyển tới n8n.
+    """
+    def __init__(self, path: str = ":memory:", ttl: float = 7 * 24 * 3600, max_bytes: int = 128 * 1024 * 1024):
+        self.path = path
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.errors = 0
+
+    def configure(self, settings) -> None:
+        self.path = settings.script_cache_path
+        self.ttl = settings.script_cache_ttl
+        self.max_bytes = settings.script_cache_max_bytes
+
+    def open(self) -> None:
+        if self._conn is not None:
+            return
+        try:
+            self._conn = self._connect()
+        except sqlite3.Error as e:
+            self.errors += 1
+            logger.error(f"Không mở được cache kịch bản '{self.path}', chạy không có cache: {e}")
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, check_same_thread=False)
+        if self.path != ":memory:":
+            conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS scripts (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_scripts_accessed_at ON scripts (accessed_at);
+            """
+        )
+        return conn
+
+    def close(self) -> None:
+        if self._conn is not None:
+            with self._lock:
+                self._conn.close()
+            self._conn = None
+
+    def get(self, key: str) -> Optional[str]:
+        if self._conn is None:
+            return None
+        try:
+            return self._get(key)
+        except sqlite3.Error as e:
+            self.errors += 1
+            logger.warning(f"Lỗi khi đọc cache kịch bản: {e}")
+            return None
+
+    def _get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                "SELECT value, created_at FROM scripts WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or row[1] + self.ttl < now:
+                if row is not None:
+                    self._conn.execute("DELETE FROM scripts WHERE key = ?", (key,))
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE scripts SET accessed_at = ? WHERE key = ?", (now, key))
+            self.hits += 1
+            return row[0]
+
+    def set(self, key: str, value: str) -> None:
+        if self._conn is None:
+            return
+        try:
+            self._set(key, value)
+        except sqlite3.Error as e:
+            self.errors += 1
+            logger.warning(f"Lỗi khi ghi cache kịch bản: {e}")
+
+    def _set(self, key: str, value: str) -> None:
+        size = len(value.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO scripts (key, value, size, created_at, accessed_at) VALUES (?, ?, ?, ?, ?)",
+                (key, value, size, now, now),
+            )
+            self._conn.execute("DELETE FROM scripts WHERE created_at < ?", (now - self.ttl,))
+            total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM scripts").fetchone()[0]
+            if total > self.max_bytes:
+                # Loại bỏ theo LRU cho đến khi về dưới giới hạn dung lượng
+                for old_key, old_size in self._conn.execute(
+                    "SELECT key, size FROM scripts WHERE key != ? ORDER BY accessed_at", (key,)
+                ).fetchall():
+                    self._conn.execute("DELETE FROM scripts WHERE key = ?", (old_key,))
+                    self.evictions += 1
+                    total -= old_size
+                    if total <= self.max_bytes:
+                        break
+
+    def stats(self) -> Dict[str, Any]:
+        entries = 0
+        size = 0
+        if self._conn is not None:
+            try:
+                with self._lock:
+                    entries, size = self._conn.execute(
+                        "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM scripts"
+                    ).fetchone()
+            except sqlite3.Error as e:
+                logger.warning(f"Lỗi khi đọc thống kê cache kịch bản: {e}")
+        return {
+            "entries": entries,
+            "bytes": size,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "errors": self.errors,
+        }
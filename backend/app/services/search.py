@@ -0,0 +1,297 @@
+import asyncio
+import logging
+import re
+import sqlite3
+import threading
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from mysql.connector import Error
+
+from app.models.promt import TiktokData
+from app.services.executor import ExecutorSaturatedError
+
+logger = logging.getLogger(__name__)
+
+# Các cột được đánh chỉ mục toàn văn và các cột dùng làm facet
+TEXT_COLUMNS = ("title", "title1", "title2", "description")
+FACET_COLUMNS = ("niche", "content_angle", "hook_type", "product_type", "script_framework")
+TIKTOK_COLUMNS = tuple(TiktokData.model_fields)
+# Checksum mỗi dòng tính trên MySQL, dùng để biết dòng nào cần đồng bộ lại
+ROW_CHECKSUM_SQL = f"CRC32(CONCAT_WS('|', {', '.join(TIKTOK_COLUMNS)}, status))"
+
+_SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS videos (
+    url_tiktok TEXT PRIMARY KEY,
+    checksum INTEGER NOT NULL,
+    data TEXT NOT NULL,
+    {", ".join(f"{column} TEXT" for column in FACET_COLUMNS)}
+);
+{"".join(f"CREATE INDEX IF NOT EXISTS idx_videos_{column} ON videos ({column});" for column in FACET_COLUMNS)}
+CREATE VIRTUAL TABLE IF NOT EXISTS videos_fts USING fts5(
+    {", ".join(TEXT_COLUMNS)},
+    tokenize = 'unicode61 remove_diacritics 2'
+);
+"""
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def _fetch_checksums(connection) -> Dict[str, int]:
+    with connection.cursor() as cursor:
+        cursor.execute(f"SELECT url_tiktok, {ROW_CHECKSUM_SQL} FROM tiktok_info")
+        return {url: int(checksum) for url, checksum in cursor.fetchall()}
+
+
+def _fetch_rows(connection, urls: List[str]) -> List[Dict[str, Any]]:
+    placeholders = ", ".join(["%s"] * len(urls))
+    query = (
+        f"SELECT {', '.join(TIKTOK_COLUMNS)}, {ROW_CHECKSUM_SQL} AS checksum "
+        f"FROM tiktok_info WHERE url_tiktok IN ({placeholders})"
+    )
+    with connection.cursor(dictionary=True) as cursor:
+        cursor.execute(query, tuple(urls))
+        return cursor.fetchall()
+
+
+def to_match_query(text: str) -> Optional[str]:
+    """
+    Chuyển chuỗi người dùng nhập thành truy vấn FTS5 an toàn: mọi từ đều phải xuất hiện,
+    từ cuối cùng được so khớp theo tiền tố để hỗ trợ gõ dần.
+    """
+    tokens = _TOKEN_RE.findall(text)
+    if not tokens:
+        return None
+    quoted = [f'"{token}"' for token in tokens]
+    quoted[-1] += "*"
+    return " ".join(quoted)
+
+
+class SearchIndex:
+    """
+    Chỉ mục tìm kiếm toàn văn và facet nhúng (SQLite FTS5) cho tiktok_info.
+
+    Chỉ mục được đồng bộ tăng dần: mỗi lần đồng bộ chỉ đọc checksum của từng dòng từ
+    MySQL và chỉ tải lại những dòng đã thay đổi. Các truy vấn SQLite chạy trong luồng
+    riêng để không chặn event loop.
+
+    Lỗi SQLite khi mở (file bị khóa bởi worker khác, file hỏng) chỉ được ghi lại: chỉ mục
+    coi như đóng, /search trả về 503 và tác vụ đồng bộ thử mở lại ở lần sau.
+    """
+    def __init__(self, path: str = ":memory:", sync_interval: float = 30.0, batch_size: int = 500):
+        self.path = path
+        self.sync_interval = sync_interval
+        self.batch_size = batch_size
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self._synced_version: Any = None
+        self.syncs = 0
+        self.last_changed = 0
+        self.errors = 0
+
+    def configure(self, settings) -> None:
+        self.path = settings.search_index_path
+        self.sync_interval = settings.search_sync_interval
+
+    @property
+    def is_open(self) -> bool:
+        return self._conn is not None
+
+    def open(self) -> None:
+        if self._conn is not None:
+            return
+        conn = None
+        try:
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            if self.path != ":memory:":
+                conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+        except sqlite3.Error as e:
+            # Không để chỉ mục ở trạng thái mở dở: đóng kết nối và chạy như chưa có chỉ mục
+            if conn is not None:
+                conn.close()
+            self.errors += 1
+            logger.error(f"Không mở được chỉ mục tìm kiếm '{self.path}': {e}")
+            return
+        self._conn = conn
+
+    def close(self) -> None:
+        if self._conn is not None:
+            with self._lock:
+                self._conn.close()
+            self._conn = None
+
+    async def start(self, database, version_probe=None) -> None:
+        """
+        Mở chỉ mục và chạy tác vụ đồng bộ nền. Nếu có `version_probe`, chỉ đồng bộ
+        khi token phiên bản của tiktok_info thay đổi.
+        """
+        self.open()
+        if self._task is None:
+            self._task = asyncio.create_task(self._sync_loop(database, version_probe))
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        self.close()
+
+    async def _sync_loop(self, database, version_probe) -> None:
+        while True:
+            if not self.is_open:
+                await asyncio.to_thread(self.open)
+                if not self.is_open:
+                    await asyncio.sleep(self.sync_interval)
+                    continue
+                self._synced_version = None
+            try:
+                version = await version_probe.get() if version_probe is not None else None
+                if version is None or version != self._synced_version:
+                    await self.sync(database)
+                    self._synced_version = version
+            except (Error, RuntimeError, ExecutorSaturatedError, sqlite3.Error) as e:
+                logger.error(f"Lỗi khi đồng bộ chỉ mục tìm kiếm: {e}")
+            await asyncio.sleep(self.sync_interval)
+
+    async def sync(self, database) -> int:
+        """
+        Đồng bộ chỉ mục với tiktok_info. Trả về số dòng đã thêm, cập nhật hoặc xóa.
+        """
+        remote = await database.run_bulk(_fetch_checksums)
+        local = await asyncio.to_thread(self._local_checksums)
+        changed = [url for url, checksum in remote.items() if local.get(url) != checksum]
+        removed = [url for url in local if url not in remote]
+        for start in range(0, len(changed), self.batch_size):
+            rows = await database.run_bulk(_fetch_rows, changed[start:start + self.batch_size])
+            await asyncio.to_thread(self.upsert, rows)
+        if removed:
+            await asyncio.to_thread(self.delete, removed)
+        self.syncs += 1
+        self.last_changed = len(changed) + len(removed)
+        return self.last_changed
+
+    def _local_checksums(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._conn.execute("SELECT url_tiktok, checksum FROM videos"))
+
+    def upsert(self, rows: Iterable[Dict[str, Any]]) -> None:
+        """
+        Thêm hoặc cập nhật các dòng (mỗi dòng gồm các cột của TiktokData và `checksum`).
+        """
+        with self._lock, self._conn:
+            for row in rows:
+                data = TiktokData(**row).model_dump_json()
+                facets = [row.get(column) for column in FACET_COLUMNS]
+                rowid = self._conn.execute(
+                    f"""
+                    INSERT INTO videos (url_tiktok, checksum, data, {", ".join(FACET_COLUMNS)})
+                    VALUES (?, ?, ?, {", ".join("?" * len(FACET_COLUMNS))})
+                    ON CONFLICT(url_tiktok) DO UPDATE SET
+                        checksum = excluded.checksum,
+                        data = excluded.data,
+                        {", ".join(f"{column} = excluded.{column}" for column in FACET_COLUMNS)}
+                    RETURNING rowid
+                    """,
+                    (row["url_tiktok"], int(row.get("checksum") or 0), data, *facets),
+                ).fetchone()[0]
+                self._conn.execute("DELETE FROM videos_fts WHERE rowid = ?", (rowid,))
+                self._conn.execute(
+                    f"INSERT INTO videos_fts (rowid, {', '.join(TEXT_COLUMNS)}) "
+                    f"VALUES (?, {', '.join('?' * len(TEXT_COLUMNS))})",
+                    (rowid, *(row.get(column) or "" for column in TEXT_COLUMNS)),
+                )
+
+    def delete(self, urls: List[str]) -> None:
+        with self._lock, self._conn:
+            for url in urls:
+                found = self._conn.execute("SELECT rowid FROM videos WHERE url_tiktok = ?", (url,)).fetchone()
+                if found is None:
+                    continue
+                self._conn.execute("DELETE FROM videos_fts WHERE rowid = ?", found)
+                self._conn.execute("DELETE FROM videos WHERE rowid = ?", found)
+
+    def search(
+        self,
+        text: Optional[str],
+        filters: Dict[str, str],
+        limit: int = 20,
+        offset: int = 0,
+        facet_limit: int = 20,
+    ) -> Tuple[int, List[str], Dict[str, List[Tuple[str, int]]]]:
+        """
+        Tìm kiếm có xếp hạng (bm25, tiêu đề được ưu tiên hơn mô tả) kèm số đếm facet.
+
+        Returns:
+            (tổng số kết quả, danh sách JSON của TiktokData, facet -> [(giá trị, số lượng)])
+        """
+        match = to_match_query(text) if text else None
+        joins = "FROM videos v"
+        conditions: List[str] = []
+        params: List[Any] = []
+        if match is not None:
+            # CROSS JOIN buộc SQLite duyệt kết quả FTS trước rồi mới tra bảng videos,
+            # tránh kế hoạch quét theo chỉ mục facet và so khớp MATCH cho từng dòng
+            joins = "FROM videos_fts CROSS JOIN videos v ON v.rowid = videos_fts.rowid"
+            conditions.append("videos_fts MATCH ?")
+            params.append(match)
+        for column, value in filters.items():
+            conditions.append(f"v.{column} = ?")
+            params.append(value)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        # Trọng số bm25 theo thứ tự TEXT_COLUMNS: title, title1, title2, description
+        order = "bm25(videos_fts, 4.0, 3.0, 3.0, 1.0)" if match is not None else "v.url_tiktok"
+
+        with self._lock:
+            hits = [
+                data for (data,) in self._conn.execute(
+                    f"SELECT v.data {joins} {where} ORDER BY {order} LIMIT ? OFFSET ?",
+                    (*params, limit, offset),
+                )
+            ]
+            if match is not None:
+                # Có truy vấn văn bản: đọc các cột facet của tập kết quả một lần rồi đếm,
+                # rẻ hơn chạy lại MATCH cho COUNT và cho từng facet
+                counters = [Counter() for _ in FACET_COLUMNS]
+                total = 0
+                for values in self._conn.execute(
+                    f"SELECT {', '.join(f'v.{column}' for column in FACET_COLUMNS)} {joins} {where}",
+                    params,
+                ):
+                    total += 1
+                    for counter, value in zip(counters, values):
+                        if value is not None:
+                            counter[value] += 1
+                facets = {
+                    column: counter.most_common(facet_limit)
+                    for column, counter in zip(FACET_COLUMNS, counters)
+                }
+            else:
+                # Chỉ lọc theo facet: để SQLite dùng chỉ mục trên từng cột
+                total = self._conn.execute(f"SELECT COUNT(*) {joins} {where}", params).fetchone()[0]
+                facets = {}
+                for column in FACET_COLUMNS:
+                    facet_where = f"{where} {'AND' if where else 'WHERE'} v.{column} IS NOT NULL"
+                    facets[column] = self._conn.execute(
+                        f"SELECT v.{column}, COUNT(*) AS c {joins} {facet_where} "
+                        f"GROUP BY v.{column} ORDER BY c DESC LIMIT ?",
+                        (*params, facet_limit),
+                    ).fetchall()
+        return total, hits, facets
+
+    def stats(self) -> Dict[str, Any]:
+        documents = 0
+        if self._conn is not None:
+            try:
+                with self._lock:
+                    documents = self._conn.execute("SELECT COUNT(*) FROM videos").fetchone()[0]
+            except sqlite3.Error as e:
+                logger.warning(f"Lỗi khi đọc thống kê chỉ mục tìm kiếm: {e}")
+        return {
+            "open": self.is_open,
+            "documents": documents,
+            "syncs": self.syncs,
+            "last_changed": self.last_changed,
+            "errors": self.errors,
+        }
@@ -1,16 +1,162 @@
 import httpx
-from typing import Dict, List, Any
+import logging
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, List, Any, Optional
 import os
 
+from app.services.metrics import outcome, timed, upstream_requests
+from app.services.resilience import CircuitBreaker, ConcurrencyLimiter, ResiliencePolicy
+
+logger = logging.getLogger(__name__)
+
 
 class n8nService:
     """
     Lớp dịch vụ để tương tác với workflow của n8n.
 
+    Service giữ một `httpx.AsyncClient` dùng lâu dài (keep-alive, tùy chọn HTTP/2),
+    được mở và đóng trong lifespan của FastAPI, để các lời gọi liên tiếp tái sử dụng
+    kết nối TLS tới n8n thay vì bắt tay lại mỗi lần.
+
+    Mọi lời gọi đi qua một `ResiliencePolicy` theo endpoint (thời hạn, thử lại cho lời gọi
+    idempotent) với bộ giới hạn đồng thời và cầu dao dùng chung cho n8n.
     """
-    def __init__(self):
+    WEBHOOK_BASE_URL = "https://seedxwork.app.n8n.cloud/webhook"
+    REPORT_WEBHOOK = "43e61f00-0b9d-43ac-bb05-b3fea922d521"
+    SCRIPT_WEBHOOK = "3a23e18f-3390-479a-ab82-f612520f5471"
+    TIKTOK_DATA_WEBHOOK = "8759adb6-c75e-4937-9ee8-b49b5cdfa361"
+
+    def __init__(
+        self,
+        base_url: Optional[str] = None,
+        max_connections: int = 20,
+        max_keepalive_connections: int = 10,
+        keepalive_expiry: float = 60.0,
+        http2: bool = True,
+        connect_timeout: float = 10.0,
+        read_timeout: float = 300.0,
+        max_concurrency: int = 16,
+        limiter_timeout: float = 10.0,
+        report_deadline: float = 300.0,
+        script_deadline: float = 180.0,
+        tiktok_data_deadline: float = 30.0,
+        tiktok_data_retries: int = 2,
+        breaker_failure_threshold: int = 5,
+        breaker_reset_timeout: float = 30.0,
+    ):
         # Lấy API key từ biến môi trường hoặc cấu hình
         self.auth_token = os.getenv("N8N_AUTH_TOKEN")
+        self.base_url = (base_url or self.WEBHOOK_BASE_URL).rstrip("/")
+        self.max_connections = max_connections
+        self.max_keepalive_connections = max_keepalive_connections
+        self.keepalive_expiry = keepalive_expiry
+        self.http2 = http2
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.max_concurrency = max_concurrency
+        self.limiter_timeout = limiter_timeout
+        self.report_deadline = report_deadline
+        self.script_deadline = script_deadline
+        self.tiktok_data_deadline = tiktok_data_deadline
+        self.tiktok_data_retries = tiktok_data_retries
+        self.breaker_failure_threshold = breaker_failure_threshold
+        self.breaker_reset_timeout = breaker_reset_timeout
+        self._client: Optional[httpx.AsyncClient] = None
+        self._build_policies()
+
+    def _build_policies(self) -> None:
+        self.breaker = CircuitBreaker(self.breaker_failure_threshold, self.breaker_reset_timeout)
+        self.limiter = ConcurrencyLimiter(self.max_concurrency, self.limiter_timeout)
+        self.policies: Dict[str, ResiliencePolicy] = {
+            "report": ResiliencePolicy("report", self.breaker, self.limiter, self.report_deadline),
+            "script": ResiliencePolicy("script", self.breaker, self.limiter, self.script_deadline),
+            # Chỉ lấy dữ liệu TikTok là idempotent nên được phép thử lại
+            "tiktok_data": ResiliencePolicy(
+                "tiktok_data", self.breaker, self.limiter, self.tiktok_data_deadline,
+                retries=self.tiktok_data_retries,
+            ),
+        }
+
+    @asynccontextmanager
+    async def _observe(self, endpoint: str) -> AsyncIterator[None]:
+        # Thời gian (kể cả thử lại và chờ suất gọi) và kết quả của mỗi lời gọi tới n8n
+        error: Optional[BaseException] = None
+        try:
+            with timed("n8n", endpoint):
+                yield
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            upstream_requests.inc(upstream="n8n", endpoint=endpoint, outcome=outcome(error))
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "circuit_breaker": self.breaker.stats(),
+            "limiter": self.limiter.stats(),
+            "policies": {name: policy.stats() for name, policy in self.policies.items()},
+        }
+
+    def configure(self, settings) -> None:
+        """
+        Cập nhật cấu hình kết nối từ `Settings`. Phải gọi trước `start()`.
+        """
+        self.base_url = settings.n8n_webhook_base_url.rstrip("/")
+        self.max_connections = settings.n8n_max_connections
+        self.max_keepalive_connections = settings.n8n_max_keepalive_connections
+        self.keepalive_expiry = settings.n8n_keepalive_expiry
+        self.http2 = settings.n8n_http2
+        self.connect_timeout = settings.n8n_connect_timeout
+        self.read_timeout = settings.n8n_read_timeout
+        self.max_concurrency = settings.n8n_max_concurrency
+        self.limiter_timeout = settings.n8n_limiter_timeout
+        self.report_deadline = settings.n8n_report_deadline
+        self.script_deadline = settings.n8n_script_deadline
+        self.tiktok_data_deadline = settings.n8n_tiktok_data_deadline
+        self.tiktok_data_retries = settings.n8n_tiktok_data_retries
+        self.breaker_failure_threshold = settings.n8n_breaker_failure_threshold
+        self.breaker_reset_timeout = settings.n8n_breaker_reset_timeout
+        self._build_policies()
+
+    def _webhook_url(self, webhook_id: str) -> str:
+        return f"{self.base_url}/{webhook_id}"
+
+    async def start(self) -> None:
+        """
+        Mở client HTTP dùng chung.
+        """
+        if self._client is not None:
+            return
+        http2 = self.http2
+        if http2:
+            try:
+                import h2  # noqa: F401
+            except ImportError:
+                logger.warning("Chưa cài gói 'h2', n8nService sẽ dùng HTTP/1.1.")
+                http2 = False
+        self._client = httpx.AsyncClient(
+            http2=http2,
+            limits=httpx.Limits(
+                max_connections=self.max_connections,
+                max_keepalive_connections=self.max_keepalive_connections,
+                keepalive_expiry=self.keepalive_expiry,
+            ),
+            timeout=httpx.Timeout(self.read_timeout, connect=self.connect_timeout),
+        )
+
+    async def aclose(self) -> None:
+        """
+        Đóng client HTTP dùng chung và giải phóng các kết nối keep-alive.
+        """
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            raise RuntimeError("n8nService chưa được khởi động, hãy gọi start() trước.")
+        return self._client
 
     async def generate_report(self, product: str, userId: str) -> List[Dict[str, Any]]:
         """
@@ -21,24 +167,100 @@ class n8nService:
             "N8N_AUTH_TOKEN": self.auth_token
         }
         payload = {"product": product, "userId": userId}
-        webhook_url = "https://seedxwork.app.n8n.cloud/webhook/43e61f00-0b9d-43ac-bb05-b3fea922d521"
-        async with httpx.AsyncClient(timeout=300.0) as client:
-            response = await client.post(webhook_url, headers=headers, json=payload)
+        webhook_url = self._webhook_url(self.REPORT_WEBHOOK)
+
+        async def send() -> httpx.Response:
+            response = await self.client.post(webhook_url, headers=headers, json=payload)
             response.raise_for_status()
+            return response
+
+        async with self._observe("report"):
+            response = await self.policies["report"].call(send)
+
+        # 1. Phân tích phản hồi dưới dạng JSON
+        data = response.json()
+
+        
+        # 2. In ra để kiểm tra cấu trúc
+        logger.debug("Đã nhận JSON từ n8n: %s", data)
+
+        # 3. Kiểm tra xem có phải là danh sách không, 4. Trả về TOÀN BỘ danh sách
+        return self.parse_report(data)
+
+    @staticmethod
+    def parse_report(data: Any) -> List[Dict[str, Any]]:
+        """
+        Kiểm tra phản hồi báo cáo của n8n (đã phân tích JSON) phải là một danh sách.
+
+        Raises:
+            ValueError: Nếu phản hồi không phải là danh sách.
+        """
+        if not isinstance(data, list):
+            raise ValueError("Phản hồi từ n8n không phải là một danh sách.")
+        return data
+
+    async def _stream_text(
+        self, policy: str, endpoint: str, url: str, headers: Dict[str, str], payload: Dict[str, Any]
+    ) -> AsyncIterator[str]:
+        # Gửi yêu cầu và đọc từng đoạn đều nằm trong thời hạn tổng của policy, để luồng bị
+        # treo (n8n ngừng gửi) kết thúc bằng DeadlineExceededError thay vì chờ hết read_timeout
+        async with self._observe(endpoint), self.policies[policy].stream() as within:
+            async with within():
+                response = await self.client.send(
+                    self.client.build_request("POST", url, headers=headers, json=payload), stream=True
+                )
+            try:
+                response.raise_for_status()
+                response.encoding = 'utf-8'
+                chunks = response.aiter_text()
+                while True:
+                    async with within():
+                        chunk = await anext(chunks, None)
+                    if chunk is None:
+                        break
+                    if chunk:
+                        yield chunk
+            finally:
+                await response.aclose()
 
-            # 1. Phân tích phản hồi dưới dạng JSON
-            data = response.json()
+    async def stream_report(self, product: str, userId: str) -> AsyncIterator[str]:
+        """
+        Gọi webhook báo cáo và trả về từng đoạn văn bản của phản hồi ngay khi nhận được.
+        Người gọi tự ghép các đoạn rồi dùng `parse_report(json.loads(...))`.
 
-            
-            # 2. In ra để kiểm tra cấu trúc
-            print("Đã nhận JSON từ n8n:", data)
+        Raises:
+            httpx.HTTPStatusError: Nếu API trả về mã lỗi (4xx, 5xx), trước đoạn đầu tiên.
+            httpx.RequestError: Nếu có lỗi kết nối mạng.
+        """
+        headers = {
+            "Content-Type": "application/json",
+            "N8N_AUTH_TOKEN": self.auth_token
+        }
+        payload = {"product": product, "userId": userId}
+        webhook_url = self._webhook_url(self.REPORT_WEBHOOK)
+        async for chunk in self._stream_text("report", "report_stream", webhook_url, headers, payload):
+            yield chunk
 
-            # 3. Kiểm tra xem có phải là danh sách không
-            if not isinstance(data, list):
-                raise ValueError("Phản hồi từ n8n không phải là một danh sách.")
+    async def stream_script(self, base_text: str, improvements: List[str], is_iterative: bool) -> AsyncIterator[str]:
+        """
+        Giống `generate_script` nhưng trả về từng đoạn kịch bản ngay khi n8n gửi tới.
 
-            # 4. Trả về TOÀN BỘ danh sách
-            return data
+        Raises:
+            httpx.HTTPStatusError: Nếu API trả về mã lỗi (4xx, 5xx), trước đoạn đầu tiên.
+            httpx.RequestError: Nếu có lỗi kết nối mạng.
+        """
+        webhook_url = self._webhook_url(self.SCRIPT_WEBHOOK)
+        headers: Dict[str, str] = {
+            "Content-Type": "application/json",
+            "N8N_AUTH_TOKEN": self.auth_token
+        }
+        payload = {
+            "base_text": base_text,
+            "improvements": improvements,
+            "is_iterative": is_iterative
+        }
+        async for chunk in self._stream_text("script", "script_stream", webhook_url, headers, payload):
+            yield chunk
 
         
     async def generate_script(self, base_text: str, improvements: List[str], is_iterative: bool) -> str:
@@ -57,7 +279,7 @@ class n8nService:
             httpx.RequestError: Nếu có lỗi kết nối mạng.
             ValueError: Nếu phản hồi từ API là rỗng.
         """
-        webhook_url = "https://seedxwork.app.n8n.cloud/webhook/3a23e18f-3390-479a-ab82-f612520f5471"
+        webhook_url = self._webhook_url(self.SCRIPT_WEBHOOK)
         headers: Dict[str, str] = {
             "Content-Type": "application/json",
             "N8N_AUTH_TOKEN": self.auth_token
@@ -68,20 +290,24 @@ class n8nService:
             "is_iterative": is_iterative
         }
         
-        async with httpx.AsyncClient(timeout=300.0) as client:
-            print("Đang gửi yêu cầu tạo kịch bản cải tiến...")
-            response = await client.post(webhook_url, headers=headers, json=payload)
-            
+        logger.info("Đang gửi yêu cầu tạo kịch bản cải tiến...")
+
+        async def send() -> httpx.Response:
+            response = await self.client.post(webhook_url, headers=headers, json=payload)
             response.raise_for_status()
-            
-            response.encoding = 'utf-8'
-            script_text = response.text
-
-            if not script_text:
-                raise ValueError("Phản hồi từ n8n service là một chuỗi rỗng.")
-            
-            print("Nhận phản hồi thành công từ n8n cho kịch bản cải tiến.")
-            return script_text
+            return response
+
+        async with self._observe("script"):
+            response = await self.policies["script"].call(send)
+        
+        response.encoding = 'utf-8'
+        script_text = response.text
+
+        if not script_text:
+            raise ValueError("Phản hồi từ n8n service là một chuỗi rỗng.")
+        
+        logger.info("Nhận phản hồi thành công từ n8n cho kịch bản cải tiến.")
+        return script_text
         
     async def get_tiktok_data(self) -> List[Dict]:
         """
@@ -95,19 +321,23 @@ class n8nService:
             httpx.RequestError: Nếu có lỗi kết nối mạng.
             ValueError: Nếu phản hồi từ API là rỗng.
         """
-        webhook_url = "https://seedxwork.app.n8n.cloud/webhook/8759adb6-c75e-4937-9ee8-b49b5cdfa361"
+        webhook_url = self._webhook_url(self.TIKTOK_DATA_WEBHOOK)
         
-        async with httpx.AsyncClient(timeout=300.0) as client:
-            print("Đang gửi yêu cầu lấy dữ liệu TikTok...")
-            response = await client.get(webhook_url, headers={"N8N_AUTH_TOKEN": self.auth_token})
-            
+        logger.info("Đang gửi yêu cầu lấy dữ liệu TikTok...")
+
+        async def send() -> httpx.Response:
+            response = await self.client.get(webhook_url, headers={"N8N_AUTH_TOKEN": self.auth_token})
             response.raise_for_status()
-            
-            response.encoding = 'utf-8'
-            tiktok_data = response.json()
-
-            if not tiktok_data:
-                raise ValueError("Phản hồi từ n8n service là một chuỗi rỗng.")
-            
-            print("Nhận dữ liệu TikTok thành công từ n8n.")
-            return tiktok_data
\ No newline at end of file
+            return response
+
+        async with self._observe("tiktok_data"):
+            response = await self.policies["tiktok_data"].call(send)
+        
+        response.encoding = 'utf-8'
+        tiktok_data = response.json()
+
+        if not tiktok_data:
+            raise ValueError("Phản hồi từ n8n service là một chuỗi rỗng.")
+        
+        logger.info("Nhận dữ liệu TikTok thành công từ n8n.")
+        return tiktok_data
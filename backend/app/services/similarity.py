@@ -0,0 +1,403 @@
+import asyncio
+import heapq
+import json
+import logging
+import math
+import re
+import threading
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Set, Tuple
+
+from mysql.connector import Error
+
+from app.services.executor import ExecutorSaturatedError
+
+logger = logging.getLogger(__name__)
+
+# Trọng số của từng facet khi hai video có cùng giá trị
+FACET_WEIGHTS = {
+    "niche": 3.0,
+    "hook_type": 2.0,
+    "content_angle": 2.0,
+    "script_framework": 1.5,
+}
+SIMILARITY_FACETS = tuple(FACET_WEIGHTS)
+# Điểm tối đa từ từ khóa chung (khi mọi từ khóa của video gốc đều xuất hiện)
+KEYWORD_WEIGHT = 3.0
+# Từ khóa xuất hiện ở hơn tỷ lệ này số video không mang thông tin, bỏ qua khi tính điểm;
+# chỉ áp dụng khi thư viện có ít nhất KEYWORD_CAP_MIN_DOCUMENTS video (thư viện nhỏ thì tỷ lệ
+# này loại gần hết từ khóa)
+MAX_KEYWORD_RATIO = 0.1
+KEYWORD_CAP_MIN_DOCUMENTS = 1000
+# Từ khóa của một video: danh sách trong cột `keyword` và các từ của tiêu đề
+# (cùng nguồn mà ReportWriter ghi vào các bảng từ khóa)
+SIMILARITY_COLUMNS = ("url_tiktok", *SIMILARITY_FACETS, "title", "keyword")
+SIMILARITY_CHECKSUM_SQL = f"CRC32(CONCAT_WS('|', {', '.join(SIMILARITY_COLUMNS)}))"
+
+_TOKEN_RE = re.compile(r"\w{2,}", re.UNICODE)
+
+
+def _fetch_checksums(connection) -> Dict[str, int]:
+    with connection.cursor() as cursor:
+        cursor.execute(f"SELECT url_tiktok, {SIMILARITY_CHECKSUM_SQL} FROM tiktok_info")
+        return {url: int(checksum) for url, checksum in cursor.fetchall()}
+
+
+def fetch_similarity_version(connection) -> Tuple[int, int]:
+    """
+    Token phiên bản của các cột SIMILARITY_COLUMNS trong tiktok_info (số dòng và checksum).
+    Khác token của /tiktok_data vì chỉ mục này dùng cả cột `keyword`.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(f"SELECT COUNT(*), COALESCE(BIT_XOR({SIMILARITY_CHECKSUM_SQL}), 0) FROM tiktok_info")
+        return tuple(cursor.fetchone())
+
+
+def _fetch_rows(connection, urls: List[str]) -> List[Dict[str, Any]]:
+    placeholders = ", ".join(["%s"] * len(urls))
+    query = (
+        f"SELECT {', '.join(SIMILARITY_COLUMNS)}, {SIMILARITY_CHECKSUM_SQL} AS checksum "
+        f"FROM tiktok_info WHERE url_tiktok IN ({placeholders})"
+    )
+    with connection.cursor(dictionary=True) as cursor:
+        cursor.execute(query, tuple(urls))
+        return cursor.fetchall()
+
+
+def fetch_similarity_row(connection, url_tiktok: str) -> Optional[Dict[str, Any]]:
+    with connection.cursor(dictionary=True) as cursor:
+        cursor.execute(f"SELECT {', '.join(SIMILARITY_COLUMNS)} FROM tiktok_info WHERE url_tiktok = %s", (url_tiktok,))
+        return cursor.fetchone()
+
+
+def video_keywords(row: Dict[str, Any]) -> Set[str]:
+    """
+    Tập từ khóa (chữ thường) của một video: các mục của cột `keyword` (JSON) và các từ của tiêu đề.
+    """
+    keywords: Set[str] = set()
+    value = row.get("keyword")
+    if isinstance(value, (bytes, bytearray)):
+        value = value.decode("utf-8", "replace")
+    if isinstance(value, str):
+        try:
+            value = json.loads(value)
+        except json.JSONDecodeError:
+            value = [value]
+    if isinstance(value, list):
+        keywords.update(item.strip().lower() for item in value if isinstance(item, str) and item.strip())
+    title = row.get("title")
+    if isinstance(title, str):
+        keywords.update(token.lower() for token in _TOKEN_RE.findall(title))
+    return keywords
+
+
+class Neighbor(NamedTuple):
+    url_tiktok: str
+    score: float
+    matched_facets: List[str]
+    matched_keywords: List[str]
+
+
+class SimilarityIndex:
+    """
+    Chỉ mục "video tương tự" trong bộ nhớ cho tiktok_info.
+
+    Mỗi video được mã hóa thành một vector facet số nguyên (mã của niche, hook_type,
+    content_angle, script_framework) và một tập mã từ khóa. Các video có cùng vector được
+    gom vào một nhóm (số nhóm nhỏ vì facet có ít giá trị), còn từ khóa có chỉ mục ngược
+    (từ khóa -> video). Khi truy vấn, điểm facet được tính một lần cho mỗi nhóm và điểm từ
+    khóa (trọng số IDF) chỉ cho các video có từ khóa chung, nên không phải duyệt cả thư viện.
+
+    Thêm, sửa hoặc xóa một video chỉ cập nhật nhóm và danh sách ngược của chính nó (O(số từ
+    khóa)). Chỉ mục được đồng bộ tăng dần với MySQL theo checksum như SearchIndex.
+    """
+    def __init__(
+        self,
+        sync_interval: float = 30.0,
+        batch_size: int = 1000,
+        max_keyword_ratio: float = MAX_KEYWORD_RATIO,
+        keyword_cap_min_documents: int = KEYWORD_CAP_MIN_DOCUMENTS,
+    ):
+        self.sync_interval = sync_interval
+        self.batch_size = batch_size
+        self.max_keyword_ratio = max_keyword_ratio
+        self.keyword_cap_min_documents = keyword_cap_min_documents
+        self._lock = threading.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self._synced_version: Any = None
+        # Video: url -> mã, và theo mã: url, mã nhóm facet, mã từ khóa, checksum
+        self._doc_ids: Dict[str, int] = {}
+        self._urls: List[Optional[str]] = []
+        self._doc_groups: List[int] = []
+        self._doc_terms: List[Tuple[int, ...]] = []
+        self._checksums: List[int] = []
+        # Mã hóa giá trị facet theo từng cột; -1 là không có giá trị
+        self._facet_codes: Tuple[Dict[str, int], ...] = tuple({} for _ in SIMILARITY_FACETS)
+        # Nhóm facet: vector -> mã nhóm, các video của nhóm (dict giữ thứ tự thêm vào)
+        self._group_ids: Dict[Tuple[int, ...], int] = {}
+        self._groups: List[Tuple[int, ...]] = []
+        self._group_docs: List[Dict[int, None]] = []
+        # Với mỗi cột facet: mã giá trị -> các nhóm có giá trị đó
+        self._group_postings: Tuple[Dict[int, Set[int]], ...] = tuple({} for _ in SIMILARITY_FACETS)
+        # Từ khóa: chuỗi -> mã, và chỉ mục ngược mã -> các video
+        self._term_ids: Dict[str, int] = {}
+        self._term_names: List[str] = []
+        self._postings: List[Set[int]] = []
+        self.documents = 0
+        self.syncs = 0
+        self.last_changed = 0
+
+    def configure(self, settings) -> None:
+        self.sync_interval = settings.similar_sync_interval
+        self.max_keyword_ratio = settings.similar_max_keyword_ratio
+        self.keyword_cap_min_documents = settings.similar_keyword_cap_min_documents
+
+    @property
+    def loaded(self) -> bool:
+        return self.syncs > 0
+
+    async def start(self, database, version_probe=None) -> None:
+        """
+        Chạy tác vụ đồng bộ nền; lần đồng bộ đầu tiên nạp toàn bộ tiktok_info. `version_probe`
+        phải phản ánh mọi cột SIMILARITY_COLUMNS (xem fetch_similarity_version), nếu không
+        thay đổi ở cột thiếu sẽ không bao giờ được đồng bộ.
+        """
+        if self._task is None:
+            self._task = asyncio.create_task(self._sync_loop(database, version_probe))
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _sync_loop(self, database, version_probe) -> None:
+        while True:
+            try:
+                version = await version_probe.get() if version_probe is not None else None
+                if version is None or version != self._synced_version:
+                    await self.sync(database)
+                    self._synced_version = version
+            except (Error, RuntimeError, ExecutorSaturatedError) as e:
+                logger.error(f"Lỗi khi đồng bộ chỉ mục video tương tự: {e}")
+            await asyncio.sleep(self.sync_interval)
+
+    async def sync(self, database) -> int:
+        """
+        Đồng bộ với tiktok_info, chỉ tải lại các dòng có checksum thay đổi. Trả về số dòng đã
+        thêm, cập nhật hoặc xóa.
+        """
+        remote = await database.run_bulk(_fetch_checksums)
+        with self._lock:
+            local = {url: self._checksums[doc] for url, doc in self._doc_ids.items()}
+        changed = [url for url, checksum in remote.items() if local.get(url) != checksum]
+        removed = [url for url in local if url not in remote]
+        for start in range(0, len(changed), self.batch_size):
+            rows = await database.run_bulk(_fetch_rows, changed[start:start + self.batch_size])
+            await asyncio.to_thread(self.upsert, rows)
+        if removed:
+            await asyncio.to_thread(self.delete, removed)
+        self.syncs += 1
+        self.last_changed = len(changed) + len(removed)
+        return self.last_changed
+
+    def _encode_facets(self, row: Dict[str, Any], create: bool) -> Tuple[int, ...]:
+        vector = []
+        for column, codes in zip(SIMILARITY_FACETS, self._facet_codes):
+            value = row.get(column)
+            if not isinstance(value, str) or not value.strip():
+                vector.append(-1)
+                continue
+            value = value.strip().lower()
+            code = codes.get(value)
+            if code is None and create:
+                code = codes[value] = len(codes)
+            vector.append(-1 if code is None else code)
+        return tuple(vector)
+
+    def _encode_terms(self, row: Dict[str, Any], create: bool) -> Tuple[int, ...]:
+        terms = []
+        for keyword in video_keywords(row):
+            term = self._term_ids.get(keyword)
+            if term is None and create:
+                term = self._term_ids[keyword] = len(self._term_names)
+                self._term_names.append(keyword)
+                self._postings.append(set())
+            if term is not None:
+                terms.append(term)
+        return tuple(terms)
+
+    def _group(self, vector: Tuple[int, ...]) -> int:
+        group = self._group_ids.get(vector)
+        if group is None:
+            group = self._group_ids[vector] = len(self._groups)
+            self._groups.append(vector)
+            self._group_docs.append({})
+            for code, postings in zip(vector, self._group_postings):
+                if code >= 0:
+                    postings.setdefault(code, set()).add(group)
+        return group
+
+    def _unlink(self, doc: int) -> None:
+        group = self._doc_groups[doc]
+        if group >= 0:
+            self._group_docs[group].pop(doc, None)
+        for term in self._doc_terms[doc]:
+            self._postings[term].discard(doc)
+
+    def upsert(self, rows: Iterable[Dict[str, Any]]) -> None:
+        """
+        Thêm hoặc cập nhật các video (các cột SIMILARITY_COLUMNS và `checksum` nếu có).
+        """
+        with self._lock:
+            for row in rows:
+                url = row["url_tiktok"]
+                group = self._group(self._encode_facets(row, create=True))
+                terms = self._encode_terms(row, create=True)
+                doc = self._doc_ids.get(url)
+                if doc is None:
+                    doc = self._doc_ids[url] = len(self._urls)
+                    self._urls.append(url)
+                    self._doc_groups.append(-1)
+                    self._doc_terms.append(())
+                    self._checksums.append(0)
+                    self.documents += 1
+                else:
+                    self._unlink(doc)
+                self._doc_groups[doc] = group
+                self._doc_terms[doc] = terms
+                self._checksums[doc] = int(row.get("checksum") or 0)
+                self._group_docs[group][doc] = None
+                for term in terms:
+                    self._postings[term].add(doc)
+
+    def delete(self, urls: Iterable[str]) -> None:
+        with self._lock:
+            for url in urls:
+                doc = self._doc_ids.pop(url, None)
+                if doc is None:
+                    continue
+                self._unlink(doc)
+                self._urls[doc] = None
+                self._doc_groups[doc] = -1
+                self._doc_terms[doc] = ()
+                self.documents -= 1
+
+    def similar(self, url_tiktok: str, limit: int = 10) -> Optional[List[Neighbor]]:
+        """
+        Các video giống video `url_tiktok` nhất. None nếu video chưa có trong chỉ mục.
+        """
+        with self._lock:
+            doc = self._doc_ids.get(url_tiktok)
+            if doc is None:
+                return None
+            return self._query(self._groups[self._doc_groups[doc]], self._doc_terms[doc], doc, limit)
+
+    def similar_to(self, row: Dict[str, Any], limit: int = 10) -> List[Neighbor]:
+        """
+        Như `similar` nhưng cho một video chưa được đồng bộ vào chỉ mục (các cột SIMILARITY_COLUMNS).
+        """
+        with self._lock:
+            exclude = self._doc_ids.get(row.get("url_tiktok"), -1)
+            return self._query(self._encode_facets(row, create=False), self._encode_terms(row, create=False), exclude, limit)
+
+    def _idf(self, term: int) -> float:
+        return math.log(1 + self.documents / max(len(self._postings[term]), 1))
+
+    def _query(self, vector: Tuple[int, ...], terms: Tuple[int, ...], exclude: int, limit: int) -> List[Neighbor]:
+        # Điểm facet cho từng nhóm có ít nhất một giá trị chung
+        group_scores: Dict[int, float] = {}
+        for code, weight, postings in zip(vector, FACET_WEIGHTS.values(), self._group_postings):
+            if code >= 0:
+                for group in postings.get(code, ()):
+                    group_scores[group] = group_scores.get(group, 0.0) + weight
+        ranked_groups = sorted(group_scores.items(), key=lambda item: item[1], reverse=True)
+
+        # Cận dưới của điểm thứ `limit`: điểm facet của nhóm mà các nhóm tốt nhất tính tới nó
+        # đã đủ `limit` video
+        threshold = 0.0
+        found = 0
+        for group, score in ranked_groups:
+            docs = self._group_docs[group]
+            found += len(docs) - (exclude in docs)
+            if found >= limit:
+                threshold = score
+                break
+
+        # Điểm từ khóa: tổng IDF của từ khóa chung, chuẩn hóa về [0, KEYWORD_WEIGHT]. Duyệt từ
+        # khóa hiếm trước; khi phần điểm từ khóa còn lại không đủ đưa một video chưa gặp của nhóm
+        # yếu lên tới `threshold`, chỉ xét video đã gặp và video của các nhóm đủ mạnh thay vì cả
+        # danh sách ngược (kết quả top-k vẫn chính xác)
+        idf = {term: self._idf(term) for term in terms}
+        total_idf = sum(idf.values())
+        max_postings = self.documents
+        if self.documents >= self.keyword_cap_min_documents:
+            max_postings = max(1, int(self.documents * self.max_keyword_ratio))
+        scored = sorted(
+            (term for term in idf if len(self._postings[term]) <= max_postings),
+            key=lambda term: len(self._postings[term]),
+        )
+        weights = {term: KEYWORD_WEIGHT * idf[term] / total_idf for term in scored}
+        remaining = sum(weights.values())
+        keyword_scores: Dict[int, float] = {}
+        for term in scored:
+            weight = weights[term]
+            postings = self._postings[term]
+            floor = threshold - remaining
+            eligible = [group for group, score in ranked_groups if score >= floor] if floor > 0 else None
+            if eligible is not None and sum(len(self._group_docs[group]) for group in eligible) + len(keyword_scores) < len(postings):
+                added = [
+                    other for group in eligible for other in self._group_docs[group]
+                    if other not in keyword_scores and term in self._doc_terms[other]
+                ]
+                for other in keyword_scores:
+                    if term in self._doc_terms[other]:
+                        keyword_scores[other] += weight
+                for other in added:
+                    keyword_scores[other] = weight
+            else:
+                for other in postings:
+                    keyword_scores[other] = keyword_scores.get(other, 0.0) + weight
+            remaining -= weight
+        keyword_scores.pop(exclude, None)
+
+        candidates = [
+            (-group_scores.get(self._doc_groups[other], 0.0) - score, other)
+            for other, score in keyword_scores.items()
+        ]
+        # Video không có từ khóa chung chỉ có điểm facet của nhóm: lấy đủ `limit` video từ
+        # các nhóm có điểm cao nhất là đủ để ra top-k chính xác
+        needed = limit
+        for group, score in ranked_groups:
+            if needed <= 0:
+                break
+            for other in self._group_docs[group]:
+                if other == exclude or other in keyword_scores:
+                    continue
+                candidates.append((-score, other))
+                needed -= 1
+                if needed <= 0:
+                    break
+
+        query_terms = set(terms)
+        neighbors = []
+        for negative_score, other in heapq.nsmallest(limit, candidates):
+            other_vector = self._groups[self._doc_groups[other]]
+            neighbors.append(Neighbor(
+                url_tiktok=self._urls[other],
+                score=round(-negative_score, 4),
+                matched_facets=[
+                    column for column, code, other_code in zip(SIMILARITY_FACETS, vector, other_vector)
+                    if code >= 0 and code == other_code
+                ],
+                matched_keywords=sorted(self._term_names[term] for term in query_terms.intersection(self._doc_terms[other])),
+            ))
+        return neighbors
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "documents": self.documents,
+            "facet_groups": len(self._groups),
+            "keywords": len(self._term_names),
+            "syncs": self.syncs,
+            "last_changed": self.last_changed,
+        }
@@ -0,0 +1,271 @@
+import asyncio
+import json
+import logging
+from typing import Any, Dict, List, Optional
+
+from mysql.connector import Error
+
+from app.models.promt import TiktokData
+from app.services.executor import ExecutorSaturatedError
+from app.services.keywords import KEYWORD_TABLES
+
+logger = logging.getLogger(__name__)
+
+TIKTOK_COLUMNS = tuple(TiktokData.model_fields)
+# Các cột được cập nhật khi dòng đã tồn tại (mọi cột trừ khóa url_tiktok)
+_UPDATE_COLUMNS = tuple(column for column in TIKTOK_COLUMNS if column != "url_tiktok")
+
+
+def _keywords(row: Dict[str, Any], category: str) -> List[str]:
+    value = row.get(category)
+    if isinstance(value, str):
+        value = [value]
+    if not isinstance(value, list):
+        return []
+    return [keyword.strip() for keyword in value if isinstance(keyword, str) and keyword.strip()]
+
+
+def _keyword_json(value: Any) -> Optional[str]:
+    # Cột `keyword` lưu danh sách từ khóa dạng JSON; n8n có thể trả về list hoặc chuỗi JSON
+    if isinstance(value, str):
+        try:
+            value = json.loads(value)
+        except json.JSONDecodeError:
+            value = [value]
+    if not isinstance(value, list):
+        return None
+    return json.dumps([item for item in value if isinstance(item, str)], ensure_ascii=False)
+
+
+def _write_reports(connection, rows: List[Dict[str, Any]]) -> Dict[str, List[str]]:
+    """
+    Ghi một lô báo cáo vào tiktok_info (các cột của TiktokData, `keyword` dạng JSON,
+    status = 'completed') và các bảng từ khóa trong một transaction, bằng `executemany`
+    cho từng loại câu lệnh.
+
+    Dòng đã ở trạng thái 'completed' (ví dụ do workflow n8n tự ghi) được bỏ qua để
+    từ khóa không bị đếm hai lần. Trả về các từ khóa đã thêm theo từng bảng.
+    """
+    urls = [row["url_tiktok"] for row in rows]
+    placeholders = ", ".join(["%s"] * len(urls))
+    added: Dict[str, List[str]] = {table: [] for table in KEYWORD_TABLES}
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT url_tiktok, status FROM tiktok_info WHERE url_tiktok IN ({placeholders})",
+                tuple(urls),
+            )
+            existing = dict(cursor.fetchall())
+            pending = [row for row in rows if existing.get(row["url_tiktok"]) != "completed"]
+            updates = [row for row in pending if row["url_tiktok"] in existing]
+            inserts = [row for row in pending if row["url_tiktok"] not in existing]
+
+            if updates:
+                # Giữ từ khóa đã có nếu báo cáo mới không kèm từ khóa
+                cursor.executemany(
+                    f"UPDATE tiktok_info SET {', '.join(f'{column} = %s' for column in _UPDATE_COLUMNS)}, "
+                    f"keyword = COALESCE(%s, keyword), status = 'completed' WHERE url_tiktok = %s",
+                    [
+                        tuple(row.get(column) for column in _UPDATE_COLUMNS)
+                        + (_keyword_json(row.get("keyword")), row["url_tiktok"])
+                        for row in updates
+                    ],
+                )
+            if inserts:
+                # mysql.connector gộp executemany INSERT thành một câu lệnh nhiều dòng
+                cursor.executemany(
+                    f"INSERT INTO tiktok_info ({', '.join(TIKTOK_COLUMNS)}, keyword, status) "
+                    f"VALUES ({', '.join(['%s'] * (len(TIKTOK_COLUMNS) + 1))}, 'completed')",
+                    [
+                        tuple(row.get(column) for column in TIKTOK_COLUMNS) + (_keyword_json(row.get("keyword")),)
+                        for row in inserts
+                    ],
+                )
+            for table in KEYWORD_TABLES:
+                for row in pending:
+                    added[table].extend(_keywords(row, table))
+                if added[table]:
+                    cursor.executemany(
+                        f"INSERT INTO {table} (keyword) VALUES (%s)",
+                        [(keyword,) for keyword in added[table]],
+                    )
+        connection.commit()
+    except Error:
+        connection.rollback()
+        raise
+    return added
+
+
+class ReportWriter:
+    """
+    Bộ đệm ghi sau (write-behind) cho báo cáo do n8n tạo ra.
+
+    Báo cáo được gom theo URL (ghi nhiều lần cho cùng URL chỉ giữ bản mới nhất) và ghi
+    xuống MySQL theo lô khi đủ `batch_size` dòng hoặc sau `flush_interval` giây. Khi dừng,
+    phần còn lại được ghi nốt. Sau mỗi lô, bảng tổng hợp từ khóa, chỉ mục tìm kiếm, chỉ mục
+    video tương tự và các token phiên bản của tiktok_info (`version_probes`) được cập nhật.
+    """
+    def __init__(
+        self,
+        database,
+        keyword_aggregate=None,
+        search_index=None,
+        version_probes=(),
+        similarity_index=None,
+        batch_size: int = 50,
+        flush_interval: float = 1.0,
+        max_pending: int = 1000,
+        enabled: bool = True,
+    ):
+        self.database = database
+        self.keyword_aggregate = keyword_aggregate
+        self.search_index = search_index
+        self.version_probes = tuple(version_probes)
+        self.similarity_index = similarity_index
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.enabled = enabled
+        self._pending: Dict[str, Dict[str, Any]] = {}
+        self._wakeup = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+        self.written = 0
+        self.coalesced = 0
+        self.dropped = 0
+        self.flushes = 0
+        self.errors = 0
+        self.index_errors = 0
+
+    def configure(self, settings) -> None:
+        self.enabled = settings.report_persist_enabled
+        self.batch_size = settings.report_persist_batch_size
+        self.flush_interval = settings.report_persist_flush_interval
+        self.max_pending = settings.report_persist_max_pending
+
+    async def start(self) -> None:
+        if self.enabled and self._task is None:
+            self._stopping = False
+            self._task = asyncio.create_task(self._flush_loop())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            # Không hủy tác vụ: lô đang chờ luồng bulk sẽ bị mất (đã lấy khỏi bộ đệm nhưng
+            # chưa ghi). Báo cho vòng lặp dừng sau lô hiện tại rồi chờ nó kết thúc.
+            self._stopping = True
+            self._wakeup.set()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        # Ghi nốt các báo cáo còn trong bộ đệm trước khi đóng pool kết nối
+        while self._pending:
+            if not await self.flush():
+                logger.warning(f"Bỏ {len(self._pending)} báo cáo chưa ghi được khi tắt ứng dụng.")
+                self.dropped += len(self._pending)
+                self._pending.clear()
+
+    def add(self, row: Dict[str, Any]) -> None:
+        """
+        Đưa một báo cáo (các cột của TiktokData và `keyword`) vào bộ đệm; không chặn.
+        """
+        if not self.enabled:
+            return
+        url = row["url_tiktok"]
+        if url in self._pending:
+            self.coalesced += 1
+        elif len(self._pending) >= self.max_pending:
+            # Bộ đệm đầy (ví dụ MySQL không ghi được): bỏ bản cũ nhất
+            self._pending.pop(next(iter(self._pending)))
+            self.dropped += 1
+        self._pending[url] = row
+        if len(self._pending) >= self.batch_size:
+            self._wakeup.set()
+
+    async def _flush_loop(self) -> None:
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            if self._stopping:
+                break
+            try:
+                while self._pending:
+                    if not await self.flush():
+                        break
+            except Exception:
+                # Lỗi bất ngờ không được làm dừng tác vụ ghi nền: ghi lại và thử lô sau
+                self.errors += 1
+                logger.exception("Lỗi không mong đợi trong vòng lặp ghi báo cáo")
+
+    async def flush(self) -> bool:
+        """
+        Ghi một lô tối đa `batch_size` báo cáo. Trả về False nếu ghi thất bại
+        (các báo cáo được giữ lại để thử lại ở lần sau).
+        """
+        async with self._flush_lock:
+            if not self._pending:
+                return True
+            urls = list(self._pending)[:self.batch_size]
+            rows = [self._pending.pop(url) for url in urls]
+            try:
+                added = await self.database.run_bulk(_write_reports, rows)
+            except (Error, RuntimeError, ExecutorSaturatedError) as e:
+                self.errors += 1
+                logger.error(f"Lỗi khi ghi báo cáo vào cơ sở dữ liệu: {e}")
+                for row in rows:
+                    # Bản mới hơn có thể đã được thêm trong lúc ghi
+                    self._pending.setdefault(row["url_tiktok"], row)
+                return False
+            except asyncio.CancelledError:
+                # Bị hủy khi lô còn chờ luồng bulk: trả lại bộ đệm để lần ghi sau không làm mất.
+                # Nếu lô đã kịp ghi, dòng ở trạng thái 'completed' sẽ được bỏ qua khi ghi lại
+                for row in rows:
+                    self._pending.setdefault(row["url_tiktok"], row)
+                raise
+            except Exception:
+                # Lỗi không phải của MySQL (dữ liệu không ghi được): thử lại sẽ lỗi tiếp nên bỏ lô này
+                self.errors += 1
+                self.dropped += len(rows)
+                logger.exception(f"Bỏ {len(rows)} báo cáo không ghi được vào cơ sở dữ liệu")
+                return False
+            self.written += len(rows)
+            self.flushes += 1
+        self._after_write(rows, added)
+        await self._update_indexes(rows)
+        return True
+
+    async def _update_indexes(self, rows: List[Dict[str, Any]]) -> None:
+        # Dữ liệu đã nằm trong MySQL: lỗi của chỉ mục cục bộ (ví dụ SQLite bị khóa) chỉ được
+        # ghi lại, lần đồng bộ nền sau sẽ tải lại các dòng này.
+        # checksum 0: lần đồng bộ sau sẽ tải lại dòng này với checksum thật từ MySQL
+        indexed = [{**row, "checksum": 0} for row in rows]
+        for name, index in (("tìm kiếm", self.search_index), ("video tương tự", self.similarity_index)):
+            if index is None or not getattr(index, "is_open", True):
+                continue
+            try:
+                await asyncio.to_thread(index.upsert, indexed)
+            except Exception:
+                self.index_errors += 1
+                logger.exception(f"Lỗi khi cập nhật chỉ mục {name} sau khi ghi báo cáo")
+
+    def _after_write(self, rows: List[Dict[str, Any]], added: Dict[str, List[str]]) -> None:
+        if self.keyword_aggregate is not None:
+            for table, keywords in added.items():
+                if keywords:
+                    self.keyword_aggregate.add(table, keywords)
+        for probe in self.version_probes:
+            probe.invalidate()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "pending": len(self._pending),
+            "written": self.written,
+            "coalesced": self.coalesced,
+            "dropped": self.dropped,
+            "flushes": self.flushes,
+            "errors": self.errors,
+            "index_errors": self.index_errors,
+        }
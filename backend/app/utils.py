@@ -0,0 +1,13 @@
+from urllib.parse import urlsplit, urlunsplit
+
+
+def normalize_tiktok_url(url: str) -> str:
+    """
+    Chuẩn hóa URL TikTok để dùng làm khóa: bỏ khoảng trắng, query string, fragment,
+    dấu '/' ở cuối và viết thường scheme/host.
+    """
+    parts = urlsplit(url.strip())
+    if not parts.netloc:
+        return url.strip()
+    path = parts.path.rstrip("/")
+    return urlunsplit((parts.scheme.lower() or "https", parts.netloc.lower(), path, "", ""))
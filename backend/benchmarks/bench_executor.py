@@ -0,0 +1,177 @@
+"""
+Kiểm tra độ trễ /url_tiktok khi có truy vấn chậm chạy song song.
+
+Ứng dụng chạy ngay trong tiến trình (httpx.ASGITransport, có lifespan) với cơ sở dữ liệu
+thay thế MySQL (`benchmarks/standin.py`, tắt cache để mọi yêu cầu đều truy vấn DB). Trong
+mỗi giai đoạn, `--probe-concurrency` client gọi /url_tiktok liên tục trong `--duration` giây:
+
+- idle: không có tải nào khác,
+- slow_bulk: `--slow-queries` truy vấn `SELECT SLEEP(--slow-ms)` chạy liên tục qua
+  `database.run_bulk` (như xuất dữ liệu, quét bảng, đồng bộ nền),
+- slow_shared: cùng tải đó nhưng qua `database.run`, tức là chung nhóm luồng với /url_tiktok
+  (như trước khi tách nhóm luồng).
+
+Cuối cùng, giai đoạn overload gửi dồn một lượng truy vấn chậm vượt sức chứa của nhóm luồng
+và đếm số truy vấn bị từ chối ngay (ExecutorSaturatedError -> 503) cùng độ trễ của /url_tiktok.
+
+    cd backend
+    python -m benchmarks.bench_executor --slow-queries 8 --slow-ms 500
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List
+
+import httpx
+
+
+def _slow_query(connection, seconds: float) -> None:
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT SLEEP(%s)", (seconds,))
+        cursor.fetchall()
+
+
+def _summary(latencies: List[float], statuses: Dict[int, int]) -> Dict[str, Any]:
+    latencies = sorted(latencies)
+
+    def percentile(percent: float) -> float:
+        if not latencies:
+            return 0.0
+        return round(latencies[min(len(latencies) - 1, int(percent / 100 * len(latencies)))] * 1000, 2)
+
+    return {
+        "requests": len(latencies),
+        "p50_ms": percentile(50),
+        "p95_ms": percentile(95),
+        "p99_ms": percentile(99),
+        "max_ms": round(latencies[-1] * 1000, 2) if latencies else 0.0,
+        "statuses": {str(code): count for code, count in sorted(statuses.items())},
+    }
+
+
+async def _probe(client: httpx.AsyncClient, urls: List[str], concurrency: int, duration: float) -> Dict[str, Any]:
+    latencies: List[float] = []
+    statuses: Dict[int, int] = {}
+    deadline = time.perf_counter() + duration
+
+    async def worker(index: int) -> None:
+        rng = random.Random(index)
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            response = await client.get("/url_tiktok", params={"url_tiktok": rng.choice(urls)})
+            latencies.append(time.perf_counter() - started)
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+    await asyncio.gather(*(worker(index) for index in range(concurrency)))
+    return _summary(latencies, statuses)
+
+
+async def _slow_load(run, count: int, seconds: float, stop: asyncio.Event) -> Dict[str, int]:
+    from app.services.executor import ExecutorSaturatedError
+
+    result = {"completed": 0, "rejected": 0}
+
+    async def worker() -> None:
+        while not stop.is_set():
+            try:
+                await run(_slow_query, seconds)
+                result["completed"] += 1
+            except ExecutorSaturatedError:
+                result["rejected"] += 1
+                await asyncio.sleep(seconds)
+
+    await asyncio.gather(*(worker() for _ in range(count)))
+    return result
+
+
+async def _phase(client, urls, args, run=None, count: int = 0) -> Dict[str, Any]:
+    stop = asyncio.Event()
+    load = asyncio.ensure_future(_slow_load(run, count, args.slow_ms / 1000, stop)) if run else None
+    # Cho truy vấn chậm kịp chiếm luồng trước khi đo
+    await asyncio.sleep(0.05 if run else 0)
+    result = await _probe(client, urls, args.probe_concurrency, args.duration)
+    stop.set()
+    if load is not None:
+        result["slow_queries"] = await load
+    return result
+
+
+async def run(args) -> Dict[str, Any]:
+    from benchmarks.standin import install, seed, video_url
+
+    with tempfile.TemporaryDirectory(prefix="casesurf-executor-") as workdir:
+        path = os.path.join(workdir, "standin.sqlite3")
+        seed(path, args.rows)
+        os.environ.update({
+            "GOOGLE_API_KEY": "benchmark",
+            "HOSTNAME": "127.0.0.1",
+            "DB_HOST": "benchmark",
+            "USERNAME": "benchmark",
+            "PASSWORD": "benchmark",
+            "DB_POOL_SIZE": str(args.db_pool_size),
+            "DB_BULK_WORKERS": str(args.db_bulk_workers),
+            "DB_MAX_QUEUE": str(args.db_max_queue),
+            "CACHE_MAX_BYTES": "0",
+            "SEARCH_INDEX_PATH": ":memory:",
+            "SCRIPT_CACHE_PATH": ":memory:",
+            "LOG_LEVEL": "WARNING",
+        })
+        install(path)
+        from main import app
+        from app.services.database import database
+
+        urls = [video_url(i) for i in range(args.rows)]
+        results: Dict[str, Any] = {}
+        async with app.router.lifespan_context(app):
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=60) as client:
+                # Làm nóng (kết nối, import lười, cache của Pydantic) trước khi đo
+                await _probe(client, urls, args.probe_concurrency, 0.5)
+                results["idle"] = await _phase(client, urls, args)
+                results["slow_bulk"] = await _phase(client, urls, args, database.run_bulk, args.slow_queries)
+                results["slow_shared"] = await _phase(client, urls, args, database.run, args.slow_queries)
+                stats = database.stats()["executor"]
+                overload = stats["workers"] + stats["max_queue"] + args.slow_queries
+                results["overload"] = await _phase(client, urls, args, database.run, overload)
+                results["db_pool"] = database.stats()
+
+        for name in ("idle", "slow_bulk", "slow_shared", "overload"):
+            result = results[name]
+            print(
+                f"{name:<12} /url_tiktok p50={result['p50_ms']:.1f}ms p95={result['p95_ms']:.1f}ms "
+                f"p99={result['p99_ms']:.1f}ms statuses={result['statuses']} "
+                f"slow={result.get('slow_queries', {})}",
+                file=sys.stderr,
+            )
+    return {"meta": vars(args), "results": results}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=5000)
+    parser.add_argument("--duration", type=float, default=3.0, help="Số giây đo cho mỗi giai đoạn.")
+    parser.add_argument("--probe-concurrency", type=int, default=4)
+    parser.add_argument("--slow-queries", type=int, default=8, help="Số truy vấn chậm chạy song song.")
+    parser.add_argument("--slow-ms", type=float, default=500.0)
+    parser.add_argument("--db-pool-size", type=int, default=10)
+    parser.add_argument("--db-bulk-workers", type=int, default=3)
+    parser.add_argument("--db-max-queue", type=int, default=20)
+    parser.add_argument("--output", help="Ghi kết quả JSON ra file (mặc định in ra stdout).")
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as output:
+            output.write(text)
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
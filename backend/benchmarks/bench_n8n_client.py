@@ -0,0 +1,129 @@
+"""
+Benchmark so sánh client HTTP tạo mới mỗi lần gọi với client dùng chung của n8nService.
+
+Chạy một webhook giả lập trên máy (HTTP/1.1 keep-alive). Độ trễ bắt tay TLS được mô phỏng
+bằng `--handshake-ms`: server chờ một lần cho mỗi kết nối TCP mới trước khi phục vụ request.
+
+    cd backend
+    python -m benchmarks.bench_n8n_client --requests 200 --concurrency 10 --handshake-ms 30
+"""
+import argparse
+import asyncio
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import httpx
+
+# Webhook giả lập không kiểm tra token nhưng header không được rỗng
+os.environ.setdefault("N8N_AUTH_TOKEN", "benchmark")
+
+from app.services.service import n8nService  # noqa: E402
+
+
+class MockWebhookHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Header và body được ghi riêng: tắt Nagle để không bị cộng thêm độ trễ delayed-ACK
+    disable_nagle_algorithm = True
+    handshake_delay = 0.0
+    response_delay = 0.0
+
+    def setup(self):
+        super().setup()
+        # Mô phỏng chi phí bắt tay cho mỗi kết nối mới
+        time.sleep(self.handshake_delay)
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        payload = json.loads(self.rfile.read(length) or b"{}")
+        time.sleep(self.response_delay)
+        body = json.dumps([{"text": f"Báo cáo cho {payload.get('product')}"}]).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_mock_server(handshake_ms: float, latency_ms: float) -> ThreadingHTTPServer:
+    MockWebhookHandler.handshake_delay = handshake_ms / 1000
+    MockWebhookHandler.response_delay = latency_ms / 1000
+    server = ThreadingHTTPServer(("127.0.0.1", 0), MockWebhookHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+async def run_per_call(base_url: str, total: int, concurrency: int) -> float:
+    """
+    Cách cũ: mỗi lời gọi mở và đóng một httpx.AsyncClient riêng.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    url = f"{base_url}/{n8nService.REPORT_WEBHOOK}"
+
+    async def one(i: int):
+        async with semaphore:
+            async with httpx.AsyncClient(timeout=300.0) as client:
+                response = await client.post(url, json={"product": f"p{i}", "userId": "bench"})
+                response.raise_for_status()
+                response.json()
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(total)))
+    return time.perf_counter() - started
+
+
+async def run_shared(base_url: str, total: int, concurrency: int) -> float:
+    """
+    Cách mới: một client dùng chung do n8nService quản lý.
+    """
+    service = n8nService(base_url=base_url, max_connections=concurrency, max_keepalive_connections=concurrency)
+    await service.start()
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(i: int):
+        async with semaphore:
+            await service.generate_report(product=f"p{i}", userId="bench")
+
+    try:
+        started = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(total)))
+        return time.perf_counter() - started
+    finally:
+        await service.aclose()
+
+
+async def main(args) -> None:
+    server = start_mock_server(args.handshake_ms, args.latency_ms)
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    try:
+        per_call = await run_per_call(base_url, args.requests, args.concurrency)
+        shared = await run_shared(base_url, args.requests, args.concurrency)
+    finally:
+        server.shutdown()
+    result = {
+        "requests": args.requests,
+        "concurrency": args.concurrency,
+        "handshake_ms": args.handshake_ms,
+        "latency_ms": args.latency_ms,
+        "per_call_client_s": round(per_call, 4),
+        "shared_client_s": round(shared, 4),
+        "per_call_client_rps": round(args.requests / per_call, 1),
+        "shared_client_rps": round(args.requests / shared, 1),
+        "speedup": round(per_call / shared, 2),
+    }
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--handshake-ms", type=float, default=30.0)
+    parser.add_argument("--latency-ms", type=float, default=5.0)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,104 @@
+"""
+Benchmark so sánh hai cách tuần tự hóa một trang /tiktok_data:
+
+- pydantic: dict từ DB -> TiktokData(**row) -> TiktokDataPage, sau đó xác thực lại và
+  chuyển sang JSON như FastAPI làm với `response_model` (exclude_unset) + JSONResponse.
+- fast: tuple từ DB -> RowSerializer.rows() -> serialization.dumps() (orjson nếu có).
+
+Dữ liệu được sinh giả lập nên không cần MySQL.
+
+    cd backend
+    python -m benchmarks.bench_serialization --rows 1000 10000 100000
+"""
+import argparse
+import json
+import random
+import string
+import time
+
+from fastapi.responses import JSONResponse
+from mysql.connector.constants import FieldType
+from pydantic import TypeAdapter
+
+from app.api import serialization
+from app.models.promt import TiktokData, TiktokDataPage
+
+COLUMNS = tuple(TiktokData.model_fields)
+# cursor.description giả lập: cột số nguyên là LONG, description là TEXT (BLOB), còn lại VARCHAR
+DESCRIPTION = [
+    (name, FieldType.LONG if name in ("click", "tym") else FieldType.BLOB if name == "description" else FieldType.VAR_STRING)
+    for name in COLUMNS
+]
+
+
+def _text(rng: random.Random, length: int) -> str:
+    return "".join(rng.choice(string.ascii_letters + " ") for _ in range(length))
+
+
+def make_rows(count: int, seed: int = 0):
+    rng = random.Random(seed)
+    rows = []
+    for i in range(count):
+        row = []
+        for name in COLUMNS:
+            if name == "url_tiktok":
+                row.append(f"https://www.tiktok.com/@user/video/{i:012d}")
+            elif name in ("click", "tym"):
+                row.append(rng.randint(0, 10_000_000))
+            elif name == "description":
+                row.append(_text(rng, 400))
+            else:
+                row.append(_text(rng, 20))
+        rows.append(tuple(row))
+    return rows
+
+
+PAGE_ADAPTER = TypeAdapter(TiktokDataPage)
+
+
+def pydantic_path(rows) -> bytes:
+    dict_rows = [dict(zip(COLUMNS, row)) for row in rows]  # dictionary=True cursor
+    page = TiktokDataPage(tiktok=[TiktokData(**row) for row in dict_rows], next_cursor=None)
+    # FastAPI: xác thực lại theo response_model rồi dump với exclude_unset, JSONResponse.render
+    validated = PAGE_ADAPTER.validate_python(page)
+    content = PAGE_ADAPTER.dump_python(validated, mode="json", exclude_unset=True)
+    return JSONResponse(content).body
+
+
+def fast_path(serializer, rows) -> bytes:
+    return serialization.dumps({"tiktok": serializer.rows(COLUMNS, rows), "next_cursor": None})
+
+
+def timed(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    serializer = serialization.RowSerializer(TiktokData)
+    problems = serializer.validate(DESCRIPTION)
+    assert not problems, problems
+
+    print(f"encoder: {'orjson' if serialization.orjson is not None else 'json'}")
+    print(f"{'rows':>8} {'pydantic (ms)':>14} {'fast (ms)':>10} {'speedup':>8}")
+    for count in args.rows:
+        rows = make_rows(count)
+        slow, fast = pydantic_path(rows), fast_path(serializer, rows)
+        # Hai đường phải cho cùng một JSON
+        assert json.loads(slow) == json.loads(fast)
+        slow_time = timed(lambda: pydantic_path(rows), args.repeat)
+        fast_time = timed(lambda: fast_path(serializer, rows), args.repeat)
+        print(f"{count:>8} {slow_time * 1000:>14.1f} {fast_time * 1000:>10.1f} {slow_time / fast_time:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
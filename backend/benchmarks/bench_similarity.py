@@ -0,0 +1,113 @@
+"""
+Đo chỉ mục video tương tự (`app.services.similarity.SimilarityIndex`) trên dữ liệu tổng hợp,
+không cần cơ sở dữ liệu: thời gian dựng toàn bộ chỉ mục, thời gian thêm/cập nhật từng video
+sau đó và độ trễ truy vấn top-k cho từng kích thước thư viện trong `--rows`.
+
+Giá trị facet lấy từ `benchmarks/standin.py`; từ khóa của mỗi video lấy theo phân phối Zipf
+từ `--vocabulary` từ khóa (ít từ rất phổ biến, nhiều từ hiếm) để gần với dữ liệu thật.
+
+    cd backend
+    python -m benchmarks.bench_similarity --rows 10000 100000
+"""
+import argparse
+import itertools
+import json
+import random
+import sys
+import time
+from typing import Any, Dict, List
+
+from app.services.similarity import SimilarityIndex
+from benchmarks.standin import _VALUES, video_url
+
+
+def _rows(count: int, vocabulary: int, seed: int, start: int = 0) -> List[Dict[str, Any]]:
+    rng = random.Random(seed)
+    words = [f"kw{i}" for i in range(vocabulary)]
+    weights = list(itertools.accumulate(1 / (rank + 1) for rank in range(vocabulary)))
+    rows = []
+    for i in range(start, start + count):
+        rows.append({
+            "url_tiktok": video_url(i),
+            **{column: rng.choice(values) for column, values in _VALUES.items()},
+            "title": " ".join(rng.choices(words, cum_weights=weights, k=4)),
+            "keyword": json.dumps(rng.choices(words, cum_weights=weights, k=4)),
+            "checksum": i,
+        })
+    return rows
+
+
+def _percentile(values: List[float], percent: float) -> float:
+    values = sorted(values)
+    return round(values[min(len(values) - 1, int(percent / 100 * len(values)))] * 1000, 3)
+
+
+def run(args) -> Dict[str, Any]:
+    results: Dict[str, Any] = {}
+    for count in args.rows:
+        index = SimilarityIndex()
+        rows = _rows(count, args.vocabulary, args.seed)
+        started = time.perf_counter()
+        index.upsert(rows)
+        build_s = time.perf_counter() - started
+
+        rng = random.Random(args.seed)
+        latencies = []
+        for _ in range(args.queries):
+            started = time.perf_counter()
+            index.similar(video_url(rng.randrange(count)), args.limit)
+            latencies.append(time.perf_counter() - started)
+
+        # Thêm video mới rồi cập nhật video cũ, từng video một như khi ReportWriter ghi báo cáo
+        inserts = []
+        for row in _rows(args.updates, args.vocabulary, args.seed + 1, start=count):
+            started = time.perf_counter()
+            index.upsert([row])
+            inserts.append(time.perf_counter() - started)
+        updates = []
+        for row in _rows(args.updates, args.vocabulary, args.seed + 2):
+            started = time.perf_counter()
+            index.upsert([row])
+            updates.append(time.perf_counter() - started)
+
+        results[str(count)] = result = {
+            "build_s": round(build_s, 3),
+            "query_p50_ms": _percentile(latencies, 50),
+            "query_p99_ms": _percentile(latencies, 99),
+            "insert_p50_ms": _percentile(inserts, 50),
+            "insert_p99_ms": _percentile(inserts, 99),
+            "update_p50_ms": _percentile(updates, 50),
+            "update_p99_ms": _percentile(updates, 99),
+            "index": index.stats(),
+        }
+        print(
+            f"{count:>8} rows build={result['build_s']:.2f}s "
+            f"query p50={result['query_p50_ms']:.2f}ms p99={result['query_p99_ms']:.2f}ms "
+            f"insert p50={result['insert_p50_ms']:.3f}ms update p50={result['update_p50_ms']:.3f}ms",
+            file=sys.stderr,
+        )
+    return {"meta": vars(args), "results": results}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, nargs="+", default=[10000, 100000])
+    parser.add_argument("--vocabulary", type=int, default=5000, help="Số từ khóa khác nhau.")
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--updates", type=int, default=500, help="Số video thêm mới và số video cập nhật.")
+    parser.add_argument("--limit", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Ghi kết quả JSON ra file (mặc định in ra stdout).")
+    args = parser.parse_args()
+
+    report = run(args)
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as output:
+            output.write(text)
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,398 @@
+"""
+Bộ kiểm thử tải cho backend FastAPI, chạy hoàn toàn trên máy.
+
+Ứng dụng chạy trong một tiến trình uvicorn riêng với cơ sở dữ liệu thay thế MySQL
+(SQLite, xem `benchmarks/standin.py`) được tạo sẵn `--rows` video, và trỏ tới một webhook
+n8n giả lập có độ trễ `--n8n-latency-ms`. Mỗi kịch bản được chạy ở từng mức đồng thời
+trong `--duration` giây (vòng kín: mỗi worker gửi yêu cầu tiếp theo ngay khi nhận phản hồi).
+
+Server được chạy với cùng tham số như chế độ production (`app.server`), `--workers` worker.
+
+Kết quả (JSON) gồm thời gian khởi động (đến khi mọi worker trả lời), thông lượng, độ trễ
+p50/p95/p99 và tổng RSS đỉnh của các tiến trình server cho từng (kịch bản, mức đồng thời).
+Với `--baseline`, so sánh với lần chạy trước và trả mã thoát 1 nếu có kịch bản chậm đi quá
+`--tolerance`.
+
+    cd backend
+    python -m benchmarks.loadtest --rows 10000 --concurrency 1 10 50 --duration 10 --output results.json
+    python -m benchmarks.loadtest --baseline results.json
+    python -m benchmarks.loadtest --workers 4 --scenarios tiktok_data url_tiktok
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import httpx
+
+from benchmarks.bench_n8n_client import start_mock_server
+from benchmarks.standin import KEYWORD_TABLES, video_url
+
+SCENARIOS = ("report", "tiktok_data", "url_tiktok", "keywords", "improvement_script")
+# Số biến thể nội dung cho /improvement-script: phần lớn yêu cầu trúng cache
+SCRIPT_VARIANTS = 50
+
+
+def _request_factory(scenario: str, rows: int, miss_ratio: float) -> Callable[[random.Random], Tuple[str, str, dict]]:
+    """
+    Trả về hàm sinh (method, path, kwargs) cho một yêu cầu của kịch bản.
+    """
+    counter = iter(range(10 ** 12))
+
+    if scenario == "report":
+        def make(rng):
+            # Một phần yêu cầu là URL chưa có báo cáo để đi qua n8n
+            if rng.random() < miss_ratio:
+                url = f"https://www.tiktok.com/@bench/video/new-{os.getpid()}-{next(counter)}"
+            else:
+                url = video_url(rng.randrange(rows))
+            return "POST", "/report", {"json": {"product": url, "userId": "bench"}}
+    elif scenario == "tiktok_data":
+        def make(rng):
+            return "GET", "/tiktok_data", {"params": {"limit": 200}}
+    elif scenario == "url_tiktok":
+        def make(rng):
+            return "GET", "/url_tiktok", {"params": {"url_tiktok": video_url(rng.randrange(rows))}}
+    elif scenario == "keywords":
+        def make(rng):
+            category = rng.choice((None,) + KEYWORD_TABLES)
+            params = {"limit": 50, **({"category": category} if category else {})}
+            return "GET", "/keywords", {"params": params}
+    elif scenario == "improvement_script":
+        def make(rng):
+            variant = rng.randrange(SCRIPT_VARIANTS)
+            body = {"base_text": f"Kịch bản gốc số {variant}", "improvements": ["hook", "cta"], "is_iterative": False}
+            params = {"refresh": "true"} if rng.random() < miss_ratio else {}
+            return "POST", "/improvement-script", {"json": body, "params": params}
+    else:
+        raise ValueError(f"Kịch bản không hợp lệ: {scenario}")
+    return make
+
+
+def _percentile(sorted_values: List[float], percent: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(percent / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def _read_status(pid: int, key: str) -> Optional[int]:
+    # VmHWM/VmRSS của tiến trình server (kB), chỉ có trên Linux
+    try:
+        with open(f"/proc/{pid}/status") as status_file:
+            for line in status_file:
+                if line.startswith(key + ":"):
+                    return int(line.split()[1])
+    except OSError:
+        return None
+    return None
+
+
+def _reset_peak_rss(pid: int) -> None:
+    # Ghi "5" vào clear_refs đặt lại VmHWM về RSS hiện tại (Linux >= 4.0)
+    try:
+        with open(f"/proc/{pid}/clear_refs", "w") as clear_refs:
+            clear_refs.write("5")
+    except OSError:
+        pass
+
+
+def _process_tree(pid: int) -> List[int]:
+    # Tiến trình server và các tiến trình con (worker của uvicorn)
+    pids = [pid]
+    for current in pids:
+        try:
+            with open(f"/proc/{current}/task/{current}/children") as children:
+                pids.extend(int(child) for child in children.read().split())
+        except OSError:
+            pass
+    return pids
+
+
+def _peak_rss_kb(pid: int) -> Optional[int]:
+    values = [_read_status(current, "VmHWM") for current in _process_tree(pid)]
+    values = [value for value in values if value is not None]
+    return sum(values) if values else None
+
+
+async def _drive(
+    client: httpx.AsyncClient, make, concurrency: int, duration: float, warmup: float, seed: int
+) -> Dict[str, Any]:
+    latencies: List[float] = []
+    errors = 0
+    status_counts: Dict[int, int] = {}
+    start = time.perf_counter()
+    measure_from = start + warmup
+    stop_at = measure_from + duration
+
+    async def worker(index: int) -> None:
+        nonlocal errors
+        rng = random.Random(seed * 1000 + index)
+        while True:
+            now = time.perf_counter()
+            if now >= stop_at:
+                return
+            method, path, kwargs = make(rng)
+            started = time.perf_counter()
+            try:
+                response = await client.request(method, path, **kwargs)
+                await response.aread()
+                code = response.status_code
+            except httpx.HTTPError:
+                code = 0
+            elapsed = time.perf_counter() - started
+            if started >= measure_from:
+                latencies.append(elapsed)
+                status_counts[code] = status_counts.get(code, 0) + 1
+                if not 200 <= code < 400:
+                    errors += 1
+
+    await asyncio.gather(*(worker(i) for i in range(concurrency)))
+    latencies.sort()
+    milliseconds = [value * 1000 for value in latencies]
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "status_codes": {str(code): count for code, count in sorted(status_counts.items())},
+        "throughput_rps": round(len(latencies) / duration, 2),
+        "latency_ms": {
+            "mean": round(sum(milliseconds) / len(milliseconds), 3) if milliseconds else 0.0,
+            "p50": round(_percentile(milliseconds, 50), 3),
+            "p95": round(_percentile(milliseconds, 95), 3),
+            "p99": round(_percentile(milliseconds, 99), 3),
+            "max": round(milliseconds[-1], 3) if milliseconds else 0.0,
+        },
+    }
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _start_server(args, workdir: str, n8n_url: str, port: int) -> subprocess.Popen:
+    env = {
+        **os.environ,
+        # Các biến bắt buộc của Settings; giá trị DB không được dùng vì pool bị thay thế
+        "GOOGLE_API_KEY": "benchmark",
+        "HOSTNAME": "127.0.0.1",
+        "DB_HOST": "benchmark",
+        "USERNAME": "benchmark",
+        "PASSWORD": "benchmark",
+        "N8N_AUTH_TOKEN": "benchmark",
+        "N8N_WEBHOOK_BASE_URL": n8n_url,
+        "N8N_HTTP2": "false",
+        "DB_POOL_SIZE": str(args.db_pool_size),
+        "SEARCH_INDEX_PATH": os.path.join(workdir, "search_index.sqlite3"),
+        "SCRIPT_CACHE_PATH": os.path.join(workdir, "script_cache.sqlite3"),
+        "PYTHONUNBUFFERED": "1",
+    }
+    command = [
+        sys.executable, "-m", "benchmarks.loadtest", "--serve",
+        "--db-path", os.path.join(workdir, "standin.sqlite3"), "--port", str(port), "--workers", str(args.workers),
+    ]
+    return subprocess.Popen(
+        command,
+        env=env,
+        cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+        stdout=subprocess.DEVNULL if not args.verbose else None,
+        stderr=subprocess.DEVNULL if not args.verbose else None,
+    )
+
+
+async def _wait_ready(base_url: str, process: subprocess.Popen, workers: int = 1, timeout: float = 60.0) -> None:
+    # Sẵn sàng khi đã nhận /health từ đủ `workers` tiến trình khác nhau. Không giữ kết nối
+    # keep-alive để mỗi lần hỏi có thể tới một worker khác.
+    async def health(client: httpx.AsyncClient) -> Optional[int]:
+        try:
+            response = await client.get("/health")
+        except httpx.HTTPError:
+            return None
+        return response.json().get("pid") if response.status_code == 200 else None
+
+    ready = set()
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient(base_url=base_url, limits=httpx.Limits(max_keepalive_connections=0)) as client:
+        while time.monotonic() < deadline:
+            if process.poll() is not None:
+                raise RuntimeError(f"Server đã dừng với mã {process.returncode} (chạy lại với --verbose).")
+            ready.update(pid for pid in await asyncio.gather(*(health(client) for _ in range(2 * workers))) if pid)
+            if len(ready) >= workers:
+                return
+            await asyncio.sleep(0.05)
+    raise RuntimeError("Server không sẵn sàng trong thời gian chờ.")
+
+
+async def run(args) -> Dict[str, Any]:
+    from benchmarks.standin import seed
+
+    with tempfile.TemporaryDirectory(prefix="casesurf-bench-") as workdir:
+        seeded = seed(os.path.join(workdir, "standin.sqlite3"), args.rows)
+        mock = start_mock_server(handshake_ms=0.0, latency_ms=args.n8n_latency_ms)
+        n8n_url = f"http://127.0.0.1:{mock.server_address[1]}"
+        port = _free_port()
+        started = time.perf_counter()
+        process = _start_server(args, workdir, n8n_url, port)
+        results = []
+        limits = httpx.Limits(max_connections=max(args.concurrency), max_keepalive_connections=max(args.concurrency))
+        try:
+            async with httpx.AsyncClient(
+                base_url=f"http://127.0.0.1:{port}", limits=limits, timeout=args.timeout
+            ) as client:
+                await _wait_ready(str(client.base_url), process, args.workers)
+                startup = time.perf_counter() - started
+                print(f"server sẵn sàng: {args.workers} worker sau {startup:.2f}s", file=sys.stderr)
+                for scenario in args.scenarios:
+                    make = _request_factory(scenario, args.rows, args.miss_ratio)
+                    for concurrency in args.concurrency:
+                        for pid in _process_tree(process.pid):
+                            _reset_peak_rss(pid)
+                        result = await _drive(client, make, concurrency, args.duration, args.warmup, args.seed)
+                        peak_kb = _peak_rss_kb(process.pid)
+                        result.update({
+                            "scenario": scenario,
+                            "concurrency": concurrency,
+                            "server_peak_rss_mb": round(peak_kb / 1024, 1) if peak_kb else None,
+                        })
+                        results.append(result)
+                        latency = result["latency_ms"]
+                        print(
+                            f"{scenario:<20} c={concurrency:<4} {result['throughput_rps']:>9.1f} req/s  "
+                            f"p50={latency['p50']:.1f}ms p95={latency['p95']:.1f}ms p99={latency['p99']:.1f}ms  "
+                            f"errors={result['errors']}  rss={result['server_peak_rss_mb']}MB",
+                            file=sys.stderr,
+                        )
+        finally:
+            process.terminate()
+            try:
+                process.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                process.kill()
+            mock.shutdown()
+
+    return {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "workers": args.workers,
+            "startup_s": round(startup, 3),
+            "rows": args.rows,
+            "seeded": seeded,
+            "n8n_latency_ms": args.n8n_latency_ms,
+            "miss_ratio": args.miss_ratio,
+            "duration_s": args.duration,
+            "warmup_s": args.warmup,
+            "db_pool_size": args.db_pool_size,
+        },
+        "results": results,
+    }
+
+
+def compare(baseline: Dict[str, Any], current: Dict[str, Any], tolerance: float) -> List[str]:
+    """
+    Danh sách các kịch bản có thông lượng giảm hoặc p95 tăng quá `tolerance` so với baseline.
+    """
+    previous = {(r["scenario"], r["concurrency"]): r for r in baseline.get("results", [])}
+    regressions = []
+    for result in current["results"]:
+        old = previous.get((result["scenario"], result["concurrency"]))
+        if old is None:
+            continue
+        name = f"{result['scenario']} c={result['concurrency']}"
+        if result["throughput_rps"] < old["throughput_rps"] * (1 - tolerance):
+            regressions.append(f"{name}: throughput {old['throughput_rps']} -> {result['throughput_rps']} req/s")
+        if result["latency_ms"]["p95"] > old["latency_ms"]["p95"] * (1 + tolerance):
+            regressions.append(f"{name}: p95 {old['latency_ms']['p95']} -> {result['latency_ms']['p95']} ms")
+    return regressions
+
+
+def create_app():
+    """
+    Hàm tạo ứng dụng cho từng worker: thay pool MySQL bằng cơ sở dữ liệu thay thế trước khi import.
+    """
+    from benchmarks.standin import install
+
+    install(os.environ["STANDIN_DB_PATH"])
+    from main import app
+
+    return app
+
+
+def serve(args) -> None:
+    """
+    Tiến trình server: chạy uvicorn với tham số production của `app.server`.
+    """
+    import uvicorn
+
+    from app.config import get_settings
+    from app.server import server_options
+
+    os.environ["STANDIN_DB_PATH"] = args.db_path
+    options = server_options(get_settings(), args.workers)
+    options.update(host="127.0.0.1", port=args.port, log_level="warning")
+    uvicorn.run("benchmarks.loadtest:create_app", factory=True, **options)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 10, 50])
+    parser.add_argument("--duration", type=float, default=10.0, help="Số giây đo cho mỗi mức đồng thời.")
+    parser.add_argument("--warmup", type=float, default=2.0, help="Số giây chạy trước khi bắt đầu đo.")
+    parser.add_argument("--rows", type=int, default=10000, help="Số video tạo sẵn trong tiktok_info.")
+    parser.add_argument("--n8n-latency-ms", type=float, default=200.0)
+    parser.add_argument("--miss-ratio", type=float, default=0.1,
+                        help="Tỷ lệ yêu cầu /report, /improvement-script phải gọi n8n.")
+    parser.add_argument("--db-pool-size", type=int, default=10)
+    parser.add_argument("--workers", type=int, default=1, help="Số worker uvicorn của server.")
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Ghi kết quả JSON ra file (mặc định in ra stdout).")
+    parser.add_argument("--baseline", help="File JSON của lần chạy trước để so sánh.")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    parser.add_argument("--verbose", action="store_true", help="Hiện log của server.")
+    # Dùng nội bộ để chạy tiến trình server
+    parser.add_argument("--serve", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--db-path", help=argparse.SUPPRESS)
+    parser.add_argument("--port", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args)
+        return
+
+    baseline = None
+    if args.baseline:
+        # Đọc trước vì --output có thể trùng với file baseline
+        with open(args.baseline, encoding="utf-8") as baseline_file:
+            baseline = json.load(baseline_file)
+
+    report = asyncio.run(run(args))
+    output = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as output_file:
+            output_file.write(output)
+    else:
+        print(output)
+
+    if baseline is not None:
+        regressions = compare(baseline, report, args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
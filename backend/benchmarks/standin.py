@@ -0,0 +1,236 @@
+"""
+Cơ sở dữ liệu thay thế MySQL cho benchmark: SQLite với lớp bọc có cùng giao diện
+`mysql.connector` mà backend dùng (pool, cursor(dictionary=...), %s, commit/rollback)
+và các hàm MySQL cần thiết (CRC32, CONCAT_WS, BIT_XOR, SLEEP).
+
+`install(path)` thay pool MySQL của `app.services.database` bằng pool SQLite trên file `path`;
+`seed(path, rows)` tạo dữ liệu tổng hợp cho tiktok_info và các bảng từ khóa.
+"""
+import json
+import queue
+import random
+import sqlite3
+import time
+import types
+import zlib
+from typing import Any, Dict, Optional
+
+from mysql.connector import Error
+from mysql.connector.constants import FieldType
+
+from app.models.promt import TiktokData
+from app.services.keywords import KEYWORD_TABLES
+
+TIKTOK_COLUMNS = tuple(TiktokData.model_fields)
+# Kiểu MySQL của từng cột, trả về trong cursor.description như mysql.connector
+COLUMN_TYPES = {
+    **{column: FieldType.VAR_STRING for column in TIKTOK_COLUMNS},
+    "description": FieldType.BLOB,
+    "click": FieldType.LONG,
+    "tym": FieldType.LONG,
+    "keyword": FieldType.JSON,
+    "status": FieldType.VAR_STRING,
+}
+
+_VALUES = {
+    "niche": ["beauty", "fitness", "food", "tech", "fashion", "home", "pets", "travel", "finance", "gaming"],
+    "content_angle": ["review", "tutorial", "unboxing", "story", "comparison", "challenge"],
+    "hook_type": ["question", "shock", "promise", "pain point", "curiosity", "social proof"],
+    "product_type": ["physical", "digital", "service", "subscription"],
+    "script_framework": ["AIDA", "PAS", "BAB", "4P", "storytelling"],
+}
+_WORDS = (
+    "video hướng dẫn review sản phẩm mới nhất giá rẻ chất lượng cao mẹo hay cách làm "
+    "trải nghiệm thực tế so sánh top xu hướng viral bí quyết đơn giản nhanh chóng"
+).split()
+
+
+def _bit_xor_aggregate():
+    class BitXor:
+        def __init__(self):
+            self.value = 0
+
+        def step(self, value):
+            if value is not None:
+                self.value ^= int(value)
+
+        def finalize(self):
+            return self.value
+
+    return BitXor
+
+
+def _connect(path: str) -> sqlite3.Connection:
+    connection = sqlite3.connect(path, check_same_thread=False, timeout=30)
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.create_function(
+        "CRC32", 1, lambda value: None if value is None else zlib.crc32(str(value).encode("utf-8")),
+        deterministic=True,
+    )
+    connection.create_function(
+        "CONCAT_WS", -1,
+        lambda separator, *values: separator.join(str(value) for value in values if value is not None),
+        deterministic=True,
+    )
+    connection.create_aggregate("BIT_XOR", 1, _bit_xor_aggregate())
+    # SLEEP(giây) như MySQL, để giả lập truy vấn chậm (nhả GIL như khi chờ MySQL trả lời)
+    connection.create_function("SLEEP", 1, lambda seconds: time.sleep(float(seconds)) or 0)
+    return connection
+
+
+class StandinCursor:
+    def __init__(self, connection: sqlite3.Connection, dictionary: bool = False):
+        self._cursor = connection.cursor()
+        self._dictionary = dictionary
+        self.description = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _wrap(self, method, query: str, params):
+        try:
+            method(query.replace("%s", "?"), params)
+        except sqlite3.Error as e:
+            raise Error(msg=str(e)) from e
+        self.description = (
+            [(column[0], COLUMN_TYPES.get(column[0], FieldType.VAR_STRING)) + (None,) * 5
+             for column in self._cursor.description]
+            if self._cursor.description else None
+        )
+
+    def execute(self, query: str, params=()):
+        self._wrap(self._cursor.execute, query, tuple(params or ()))
+
+    def executemany(self, query: str, seq_params):
+        self._wrap(self._cursor.executemany, query, [tuple(params) for params in seq_params])
+
+    def _row(self, row):
+        if row is None or not self._dictionary:
+            return row
+        return dict(zip((column[0] for column in self.description), row))
+
+    def fetchone(self):
+        return self._row(self._cursor.fetchone())
+
+    def fetchall(self):
+        return [self._row(row) for row in self._cursor.fetchall()]
+
+    def close(self):
+        self._cursor.close()
+
+
+class StandinConnection:
+    def __init__(self, pool: "StandinPool", connection: sqlite3.Connection):
+        self._pool = pool
+        self._connection = connection
+
+    def is_connected(self) -> bool:
+        return True
+
+    def reconnect(self, attempts: int = 1, delay: int = 0) -> None:
+        pass
+
+    def cursor(self, dictionary: bool = False) -> StandinCursor:
+        return StandinCursor(self._connection, dictionary)
+
+    def commit(self) -> None:
+        self._connection.commit()
+
+    def rollback(self) -> None:
+        self._connection.rollback()
+
+    def close(self) -> None:
+        # Như PooledMySQLConnection: close() trả kết nối về pool (bỏ transaction dở dang)
+        self._connection.rollback()
+        self._pool._queue.put(self._connection)
+
+
+class StandinPool:
+    """
+    Cùng giao diện với `mysql.connector.pooling.MySQLConnectionPool` mà `Database` dùng.
+    """
+    path: Optional[str] = None
+
+    def __init__(self, pool_size: int = 5, **kwargs: Any):
+        self._queue: "queue.Queue[sqlite3.Connection]" = queue.Queue()
+        for _ in range(pool_size):
+            self._queue.put(_connect(self.path))
+
+    def get_connection(self) -> StandinConnection:
+        try:
+            return StandinConnection(self, self._queue.get(timeout=30))
+        except queue.Empty:
+            raise Error(msg="Failed getting connection; pool exhausted")
+
+    def _remove_connections(self) -> None:
+        while not self._queue.empty():
+            self._queue.get_nowait().close()
+
+
+def install(path: str) -> None:
+    """
+    Cho `app.services.database` dùng pool SQLite thay cho MySQL.
+    """
+    from app.services import database as database_module
+
+    StandinPool.path = path
+    database_module.pooling = types.SimpleNamespace(MySQLConnectionPool=StandinPool, CNX_POOL_MAXSIZE=32)
+
+
+def seed(path: str, rows: int, seed: int = 0) -> Dict[str, int]:
+    """
+    Tạo lại tiktok_info với `rows` video đã hoàn thành và các bảng từ khóa tương ứng.
+    """
+    rng = random.Random(seed)
+    # Từ khóa của video lấy từ nguồn ngẫu nhiên riêng để các cột khác giữ nguyên như trước
+    keyword_rng = random.Random(seed + 1)
+    connection = _connect(path)
+    with connection:
+        connection.execute("DROP TABLE IF EXISTS tiktok_info")
+        columns = ", ".join(
+            f"{column} {'INTEGER' if COLUMN_TYPES[column] == FieldType.LONG else 'TEXT'}"
+            for column in TIKTOK_COLUMNS
+        )
+        connection.execute(f"CREATE TABLE tiktok_info ({columns}, keyword TEXT, status TEXT)")
+        connection.execute("CREATE UNIQUE INDEX idx_tiktok_info_url ON tiktok_info (url_tiktok)")
+        for table in KEYWORD_TABLES:
+            connection.execute(f"DROP TABLE IF EXISTS {table}")
+            connection.execute(f"CREATE TABLE {table} (id INTEGER PRIMARY KEY, keyword TEXT)")
+
+        videos = []
+        keywords: Dict[str, list] = {table: [] for table in KEYWORD_TABLES}
+        for i in range(rows):
+            title = " ".join(rng.choices(_WORDS, k=6))
+            video = {
+                "url_tiktok": video_url(i),
+                "description": " ".join(rng.choices(_WORDS, k=80)),
+                "click": rng.randint(0, 5_000_000),
+                "tym": rng.randint(0, 500_000),
+                "userId": f"user{rng.randint(0, 99)}",
+                "title": title,
+                "title1": " ".join(rng.choices(_WORDS, k=5)),
+                "title2": " ".join(rng.choices(_WORDS, k=5)),
+                **{column: rng.choice(values) for column, values in _VALUES.items()},
+            }
+            videos.append(
+                tuple(video[column] for column in TIKTOK_COLUMNS)
+                + (json.dumps(keyword_rng.sample(_WORDS, 3), ensure_ascii=False),)
+            )
+            for table in KEYWORD_TABLES:
+                keywords[table].append((video[table],))
+        connection.executemany(
+            f"INSERT INTO tiktok_info ({', '.join(TIKTOK_COLUMNS)}, keyword, status) "
+            f"VALUES ({', '.join('?' * (len(TIKTOK_COLUMNS) + 1))}, 'completed')",
+            videos,
+        )
+        for table, values in keywords.items():
+            connection.executemany(f"INSERT INTO {table} (keyword) VALUES (?)", values)
+    connection.close()
+    return {"tiktok_info": rows, **{table: len(values) for table, values in keywords.items()}}
+
+
+def video_url(i: int) -> str:
+    return f"https://www.tiktok.com/@bench/video/{i:012d}"
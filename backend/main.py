@@ -1,9 +1,65 @@
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
-from app.config import settings
+from app.config import get_settings
 from fastapi.middleware.cors import CORSMiddleware
-from app.api.routes import router as api_router
+from fastapi.middleware.gzip import GZipMiddleware
+from app.api.middleware import MetricsMiddleware
+from app.api.routes import router as api_router, service_unavailable_handler, service, report_jobs, tiktok_cache, keyword_aggregate, search_index, similarity_index, similarity_version, tiktok_version, script_cache, report_writer, tiktok_serializer, profiler
+from app.logging_config import setup_logging
+from app.services.database import database
+from app.services.executor import cpu_executor
+from app.services.resilience import ServiceUnavailableError
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Mọi tài nguyên (pool, client, cache, luồng nền) được tạo ở đây, trong từng worker
+    settings = get_settings()
+    log_listener = setup_logging(settings.log_level, settings.log_json)
+    profiler.configure(settings)
+    # Khởi tạo pool kết nối một lần khi ứng dụng khởi động
+    database.open(settings)
+    cpu_executor.start(settings.cpu_executor_workers, settings.cpu_executor_max_queue)
+    service.configure(settings)
+    await service.start()
+    tiktok_cache.configure(settings)
+    report_jobs.configure(settings)
+    await report_jobs.start()
+    keyword_aggregate.configure(settings)
+    await keyword_aggregate.start()
+    await tiktok_serializer.prepare(database, "tiktok_info")
+    tiktok_version.ttl = settings.tiktok_version_ttl
+    similarity_version.ttl = settings.tiktok_version_ttl
+    search_index.configure(settings)
+    await search_index.start(database, tiktok_version)
+    similarity_index.configure(settings)
+    await similarity_index.start(database, similarity_version)
+    script_cache.configure(settings)
+    script_cache.open()
+    report_writer.configure(settings)
+    await report_writer.start()
+    try:
+        yield
+    finally:
+        script_cache.close()
+        # Dừng hàng đợi trước để báo cáo cuối cùng kịp vào bộ đệm ghi, rồi ghi nốt
+        # trước khi chỉ mục tìm kiếm và pool kết nối đóng lại
+        await report_jobs.stop()
+        await report_writer.stop()
+        await similarity_index.stop()
+        await search_index.stop()
+        await keyword_aggregate.stop()
+        await service.aclose()
+        await tiktok_cache.aclose()
+        database.close()
+        cpu_executor.shutdown()
+        log_listener.stop()
+
 
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
+# 503 kèm Retry-After khi thread-pool DB đầy hoặc n8n quá tải ở các route không tự xử lý
+app.add_exception_handler(ServiceUnavailableError, service_unavailable_handler)
 
 
 app.add_middleware(
@@ -14,6 +70,21 @@ app.add_middleware(
     allow_headers=["*"],  # Cho phép mọi header
 )
 
-app.include_router(api_router)
+# Nén phản hồi theo Accept-Encoding của từng request: brotli nếu đã cài brotli-asgi
+# (tự quay về gzip khi client không hỗ trợ), nếu không thì chỉ gzip.
+try:
+    from brotli_asgi import BrotliMiddleware
+    app.add_middleware(
+        BrotliMiddleware,
+        minimum_size=1000,
+        gzip_fallback=True,
+        excluded_handlers=[r"^/report/jobs/.+/events$", r"^/reports/batch$"],
+    )
+except ImportError:
+    app.add_middleware(GZipMiddleware, minimum_size=1000)
+
+# Thêm sau cùng nên bọc ngoài cùng: thời gian đo gồm cả nén và CORS
+app.add_middleware(MetricsMiddleware)
 
+app.include_router(api_router)
 
@@ -0,0 +1,29 @@
+-- Chỉ mục hỗ trợ phân trang keyset và bộ lọc của /tiktok_data.
+-- Mỗi chỉ mục lọc kết thúc bằng url_tiktok để các trang được đọc theo
+-- thứ tự khóa phân trang (ORDER BY url_tiktok) thay vì quét toàn bảng rồi filesort.
+--
+-- Chỉ mục tiền tố (url_tiktok(255)) không dùng được cho ORDER BY, nên các cột trong
+-- chỉ mục phải được đánh chỉ mục toàn bộ: url_tiktok là VARCHAR(255) (URL TikTok đã
+-- chuẩn hóa dài dưới 100 ký tự), các cột lọc là VARCHAR(191). Với utf8mb4, mỗi chỉ mục
+-- dài tối đa 191*4 + 255*4 = 1784 byte, dưới giới hạn 3072 byte của InnoDB.
+--
+-- Ở chế độ strict, MODIFY báo lỗi thay vì cắt bớt nếu có giá trị dài hơn; kiểm tra trước bằng:
+--   SELECT MAX(CHAR_LENGTH(url_tiktok)), MAX(CHAR_LENGTH(niche)),
+--          MAX(CHAR_LENGTH(hook_type)), MAX(CHAR_LENGTH(product_type)) FROM tiktok_info;
+--
+-- Nếu phiên bản trước của file này (chỉ mục tiền tố) đã được chạy, xóa các chỉ mục cũ trước:
+--   DROP INDEX idx_tiktok_info_url ON tiktok_info;
+--   DROP INDEX idx_tiktok_info_niche_url ON tiktok_info;
+--   DROP INDEX idx_tiktok_info_hook_type_url ON tiktok_info;
+--   DROP INDEX idx_tiktok_info_product_type_url ON tiktok_info;
+
+ALTER TABLE tiktok_info
+    MODIFY url_tiktok VARCHAR(255) NOT NULL,
+    MODIFY niche VARCHAR(191) NULL,
+    MODIFY hook_type VARCHAR(191) NULL,
+    MODIFY product_type VARCHAR(191) NULL;
+
+CREATE INDEX idx_tiktok_info_url ON tiktok_info (url_tiktok);
+CREATE INDEX idx_tiktok_info_niche_url ON tiktok_info (niche, url_tiktok);
+CREATE INDEX idx_tiktok_info_hook_type_url ON tiktok_info (hook_type, url_tiktok);
+CREATE INDEX idx_tiktok_info_product_type_url ON tiktok_info (product_type, url_tiktok);
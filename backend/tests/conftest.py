@@ -0,0 +1,137 @@
+import os
+
+import pytest
+
+# Settings bắt buộc các biến này; giá trị giả đủ để import và chạy ứng dụng khi kiểm thử
+os.environ.setdefault("GOOGLE_API_KEY", "test")
+os.environ.setdefault("HOSTNAME", "127.0.0.1")
+os.environ.setdefault("DB_HOST", "test")
+os.environ.setdefault("USERNAME", "test")
+os.environ.setdefault("PASSWORD", "test")
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+class SqliteDatabase:
+    """
+    Thay cho `app.services.database.database`: chạy hàm truy vấn trên SQLite của benchmarks/standin.
+    """
+    def __init__(self):
+        from benchmarks.standin import StandinPool
+
+        self.pool = StandinPool(pool_size=1)
+
+    async def run_bulk(self, func, *args):
+        connection = self.pool.get_connection()
+        try:
+            return func(connection, *args)
+        finally:
+            connection.close()
+
+    def query(self, sql, params=()):
+        connection = self.pool.get_connection()
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute(sql, params)
+                rows = cursor.fetchall()
+            connection.commit()
+            return rows
+        finally:
+            connection.close()
+
+
+@pytest.fixture
+def seed_rows():
+    # Số video tổng hợp trong cơ sở dữ liệu thay thế; module kiểm thử ghi đè khi cần
+    return 0
+
+
+@pytest.fixture
+def standin_path(tmp_path, monkeypatch, seed_rows):
+    from benchmarks.standin import StandinPool, seed
+
+    path = str(tmp_path / "standin.sqlite3")
+    seed(path, seed_rows)
+    monkeypatch.setattr(StandinPool, "path", path)
+    return path
+
+
+@pytest.fixture
+def database(standin_path):
+    return SqliteDatabase()
+
+
+@pytest.fixture
+def app_env():
+    # Tắt cache (mọi yêu cầu đều tới DB) và giữ các file SQLite trong bộ nhớ
+    return {
+        "CACHE_MAX_BYTES": "0",
+        "SEARCH_INDEX_PATH": ":memory:",
+        "SCRIPT_CACHE_PATH": ":memory:",
+        "LOG_LEVEL": "WARNING",
+    }
+
+
+@pytest.fixture
+async def app_client(standin_path, app_env, monkeypatch):
+    """
+    Client tới ứng dụng đầy đủ (chạy lifespan) trên cơ sở dữ liệu thay thế.
+    """
+    import httpx
+
+    from app.config import get_settings
+    from app.services import database as database_module
+    from benchmarks.standin import install
+
+    for name, value in app_env.items():
+        monkeypatch.setenv(name, value)
+    monkeypatch.setattr(database_module, "pooling", database_module.pooling)
+    install(standin_path)
+    get_settings.cache_clear()
+    from main import app
+
+    try:
+        async with app.router.lifespan_context(app):
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://test", timeout=30) as client:
+                yield client
+    finally:
+        get_settings.cache_clear()
+
+
+@pytest.fixture(scope="module")
+def webhook_server():
+    """
+    Webhook n8n giả (tests/fake_n8n.py) chạy trong luồng riêng, dùng chung cho cả module.
+    """
+    import threading
+    import time
+
+    import uvicorn
+
+    from tests.fake_n8n import FakeWebhook
+
+    webhook = FakeWebhook()
+    server = uvicorn.Server(uvicorn.Config(webhook.app, host="127.0.0.1", port=0, log_level="warning", lifespan="off"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    deadline = time.monotonic() + 10
+    while not server.started:
+        assert time.monotonic() < deadline, "Webhook giả không khởi động được"
+        time.sleep(0.01)
+    port = server.servers[0].sockets[0].getsockname()[1]
+    webhook.url = f"http://127.0.0.1:{port}"
+    yield webhook
+    server.should_exit = True
+    thread.join(timeout=10)
+
+
+@pytest.fixture
+def webhook(webhook_server):
+    webhook_server.replies.clear()
+    webhook_server.hits.clear()
+    webhook_server.bodies.clear()
+    return webhook_server
@@ -0,0 +1,57 @@
+import asyncio
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import List
+
+from starlette.applications import Starlette
+from starlette.responses import StreamingResponse
+from starlette.routing import Route
+
+from app.services.service import n8nService
+
+
+@dataclass
+class Reply:
+    status: int = 200
+    chunks: List[str] = field(default_factory=lambda: ["[]"])
+    delay: float = 0.0  # trước khi gửi header
+    chunk_delay: float = 0.0  # trước mỗi đoạn
+
+
+class FakeWebhook:
+    """
+    Webhook n8n giả chạy trên một cổng cục bộ thật (uvicorn trong luồng riêng): mỗi yêu cầu
+    lấy phản hồi kế tiếp trong `replies` (hết thì trả 200 "[]") và được ghi vào `hits`
+    (kèm thân yêu cầu trong `bodies`).
+    """
+    def __init__(self):
+        self.replies: List[Reply] = []
+        self.hits: List[str] = []
+        self.bodies: List[bytes] = []
+        self.url = ""
+        self.app = Starlette(routes=[Route("/{webhook}", self.handle, methods=["GET", "POST"])])
+
+    async def handle(self, request):
+        self.hits.append(request.path_params["webhook"])
+        self.bodies.append(await request.body())
+        reply = self.replies.pop(0) if self.replies else Reply()
+        await asyncio.sleep(reply.delay)
+
+        async def body():
+            for chunk in reply.chunks:
+                await asyncio.sleep(reply.chunk_delay)
+                yield chunk
+
+        return StreamingResponse(body(), status_code=reply.status, media_type="application/json")
+
+
+@asynccontextmanager
+async def n8n(webhook, **options):
+    options = {"base_url": webhook.url, "http2": False, **options}
+    service = n8nService(**options)
+    service.auth_token = "test"
+    await service.start()
+    try:
+        yield service
+    finally:
+        await service.aclose()
@@ -0,0 +1,95 @@
+import json
+
+import pytest
+
+from app.api import routes
+from benchmarks.standin import video_url
+from tests.fake_n8n import Reply, n8n
+
+pytestmark = pytest.mark.anyio
+
+NEW_URL = "https://www.tiktok.com/@shop/video/7300000000000000001"
+
+
+@pytest.fixture
+def seed_rows():
+    return 3
+
+
+@pytest.fixture
+async def service(webhook, monkeypatch):
+    async with n8n(webhook) as service:
+        monkeypatch.setattr(routes, "service", service)
+        yield service
+
+
+def report_reply(text):
+    return Reply(200, [json.dumps([{"text": text, "niche": "beauty"}])])
+
+
+async def batch(app_client, products, **params):
+    response = await app_client.post("/reports/batch", params=params, json={"products": products, "userId": "u1"})
+    assert response.status_code == 200
+    assert response.headers["Content-Type"].startswith("application/x-ndjson")
+    return [json.loads(line) for line in response.text.splitlines()]
+
+
+async def test_duplicate_urls_are_reported_once(app_client, webhook, service):
+    webhook.replies = [report_reply("Báo cáo mới")]
+    items = await batch(app_client, [
+        NEW_URL + "?lang=vi",
+        video_url(0),
+        NEW_URL,
+        video_url(0),
+        "HTTPS://WWW.TIKTOK.COM/@shop/video/7300000000000000001/",
+    ])
+
+    # Mỗi URL chuẩn hóa một dòng, giữ dạng gốc đầu tiên; báo cáo đã có trong DB được gửi trước
+    assert [(item["product"], item["source"]) for item in items] == [
+        (video_url(0), "db"),
+        (NEW_URL + "?lang=vi", "n8n"),
+    ]
+    assert items[1]["result"]["video_data"]["url_tiktok"] == NEW_URL
+    assert len(webhook.hits) == 1
+    assert json.loads(webhook.bodies[0])["product"] == NEW_URL
+
+
+async def test_failed_items_do_not_fail_the_batch(app_client, webhook, service):
+    # concurrency=1: các URL cần tạo gọi n8n lần lượt theo thứ tự gửi lên
+    webhook.replies = [Reply(500), Reply(200, ["[]"]), report_reply("Báo cáo")]
+    products = [f"{NEW_URL[:-1]}{i}" for i in range(1, 4)]
+    items = await batch(app_client, [video_url(1), *products], concurrency=1)
+
+    assert items[0]["product"] == video_url(1)
+    assert items[0]["status"] == "completed"
+    by_product = {item["product"]: item for item in items[1:]}
+    assert [
+        (by_product[product]["status"], by_product[product]["status_code"]) for product in products
+    ] == [("failed", 502), ("failed", 500), ("completed", None)]
+    assert by_product[products[0]]["error"] == "Lỗi từ dịch vụ bên ngoài: 500"
+    assert by_product[products[2]]["result"]["report_text"] == "Báo cáo"
+    assert len(webhook.hits) == 3
+
+
+@pytest.mark.parametrize("count", [0, 201])
+async def test_batch_size_is_limited(app_client, webhook, service, count):
+    products = [f"{NEW_URL}{i}" for i in range(count)]
+    response = await app_client.post("/reports/batch", json={"products": products, "userId": "u1"})
+    assert response.status_code == 422
+    assert webhook.hits == []
+
+
+async def test_batch_of_maximum_size_is_accepted(app_client, webhook, service):
+    items = await batch(app_client, [video_url(i % 3) for i in range(200)])
+    assert sorted(item["product"] for item in items) == sorted(video_url(i) for i in range(3))
+    assert webhook.hits == []
+
+
+async def test_sse_format(app_client, webhook, service):
+    response = await app_client.post(
+        "/reports/batch", params={"format": "sse"}, json={"products": [video_url(2)], "userId": "u1"}
+    )
+    assert response.headers["Content-Type"].startswith("text/event-stream")
+    event, data = response.text.strip().split("\n")
+    assert event == "event: report"
+    assert json.loads(data.removeprefix("data: "))["source"] == "db"
@@ -0,0 +1,118 @@
+import pytest
+
+from app.services.cache import LRUCache, TwoTierCache
+
+pytestmark = pytest.mark.anyio
+
+
+class FakeRedis:
+    """
+    Client giả có giao diện giống `redis.asyncio.Redis` mà TwoTierCache dùng; `fail = True`
+    giả lập Redis không truy cập được.
+    """
+    def __init__(self):
+        self.data = {}
+        self.ttls = {}
+        self.fail = False
+        self.calls = []
+
+    def _check(self, name):
+        self.calls.append(name)
+        if self.fail:
+            raise ConnectionError("redis unavailable")
+
+    async def get(self, key):
+        self._check("get")
+        return self.data.get(key)
+
+    async def set(self, key, value, ex=None):
+        self._check("set")
+        self.data[key] = value
+        self.ttls[key] = ex
+
+    async def delete(self, *keys):
+        self._check("delete")
+        for key in keys:
+            self.data.pop(key, None)
+
+
+@pytest.fixture
+def shared():
+    return FakeRedis()
+
+
+@pytest.fixture
+def cache(shared):
+    return TwoTierCache(local=LRUCache(), shared=shared, shared_ttl=60, prefix="test:")
+
+
+async def test_set_writes_both_tiers_with_prefix_and_ttl(cache, shared):
+    await cache.set("report:a", b"A")
+
+    assert shared.data == {"test:report:a": b"A"}
+    assert shared.ttls == {"test:report:a": 60}
+    assert await cache.get("report:a") == b"A"
+    # Tầng trong tiến trình trả lời, không cần hỏi Redis
+    assert "get" not in shared.calls
+
+
+async def test_shared_hit_fills_local_tier(cache, shared):
+    shared.data["test:report:b"] = b"B"
+
+    assert await cache.get("report:b") == b"B"
+    assert cache.shared_hits == 1
+    shared.data.clear()
+    assert await cache.get("report:b") == b"B"
+    assert cache.local.stats()["hits"] == 1
+
+
+async def test_miss_in_both_tiers(cache):
+    assert await cache.get("report:missing") is None
+    assert cache.shared_hits == 0
+
+
+async def test_shared_failure_falls_back_to_miss_and_local(cache, shared):
+    shared.fail = True
+
+    await cache.set("report:c", b"C")
+    assert await cache.get("report:c") == b"C"
+    assert await cache.get("report:other") is None
+    await cache.invalidate("report:c")
+    assert await cache.get("report:c") is None
+    # set, get (miss cục bộ), delete, get: mỗi lỗi được đếm, không lỗi nào lọt ra ngoài
+    assert cache.shared_errors == 4
+
+
+async def test_invalidate_removes_from_both_tiers(cache, shared):
+    await cache.set("report:d", b"D")
+    await cache.set("url_tiktok:d", b"U")
+
+    await cache.invalidate("report:d", "url_tiktok:d")
+
+    assert shared.data == {}
+    assert await cache.get("report:d") is None
+    assert await cache.get("url_tiktok:d") is None
+
+
+async def test_local_only_without_shared_tier():
+    cache = TwoTierCache(local=LRUCache())
+    await cache.set("k", b"v")
+    assert await cache.get("k") == b"v"
+    await cache.invalidate("k")
+    assert await cache.get("k") is None
+    assert cache.stats()["shared_enabled"] is False
+
+
+def test_lru_evicts_by_bytes_and_expires():
+    lru = LRUCache(max_bytes=4, ttl=60)
+    lru.set("a", b"12")
+    lru.set("b", b"34")
+    lru.get("a")
+    lru.set("c", b"56")
+    assert lru.get("b") is None
+    assert lru.get("a") == b"12"
+    assert lru.stats()["evictions"] == 1
+
+    expired = LRUCache(ttl=-1)
+    expired.set("a", b"1")
+    assert expired.get("a") is None
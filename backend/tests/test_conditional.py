@@ -0,0 +1,67 @@
+import pytest
+
+from app.api import routes
+from benchmarks.standin import video_url
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def seed_rows():
+    return 30
+
+
+async def test_keywords_etag_depends_only_on_the_data(app_client):
+    await routes.keyword_aggregate.refresh(force=True)
+    first = await app_client.get("/keywords", params={"limit": 5})
+    assert first.status_code == 200
+    assert len(first.json()) == 5
+
+    # Một lần tải lại khác (như ở worker khác) với cùng dữ liệu cho cùng ETag
+    await routes.keyword_aggregate.refresh(force=True)
+    response = await app_client.get("/keywords", params={"limit": 5}, headers={"If-None-Match": first.headers["ETag"]})
+    assert response.status_code == 304
+    assert response.headers["ETag"] == first.headers["ETag"]
+
+    routes.keyword_aggregate.add("niche", ["zz-new"] * 100)
+    response = await app_client.get("/keywords", params={"limit": 5}, headers={"If-None-Match": first.headers["ETag"]})
+    assert response.status_code == 200
+    assert response.json()[0] == {"keyword": "zz-new", "count": 100}
+
+
+def strong(etag):
+    return etag[2:] if etag.startswith("W/") else etag
+
+
+@pytest.mark.parametrize("path, params", [
+    ("/tiktok_data", {"limit": 10, "fields": "niche,title"}),
+    ("/url_tiktok", {"url_tiktok": video_url(3)}),
+])
+async def test_if_none_match(app_client, path, params):
+    first = await app_client.get(path, params=params)
+    assert first.status_code == 200
+    etag = first.headers["ETag"]
+    assert first.headers["Cache-Control"] == "no-cache"
+    assert "Last-Modified" not in first.headers
+
+    for if_none_match in (etag, strong(etag), f'W/"other", {etag}', "*"):
+        response = await app_client.get(path, params=params, headers={"If-None-Match": if_none_match})
+        assert response.status_code == 304, if_none_match
+        assert response.headers["ETag"] == etag
+        assert response.content == b""
+
+    response = await app_client.get(path, params=params, headers={"If-None-Match": 'W/"other"'})
+    assert response.status_code == 200
+    assert response.content == first.content
+
+
+async def test_tiktok_data_etag_changes_with_the_data_and_the_query(app_client, database):
+    first = await app_client.get("/tiktok_data", params={"limit": 10})
+    other_query = await app_client.get("/tiktok_data", params={"limit": 11})
+    assert other_query.headers["ETag"] != first.headers["ETag"]
+
+    database.query("UPDATE tiktok_info SET niche = 'changed' WHERE url_tiktok = %s", (video_url(0),))
+    routes.tiktok_version.invalidate()
+    response = await app_client.get("/tiktok_data", params={"limit": 10}, headers={"If-None-Match": first.headers["ETag"]})
+    assert response.status_code == 200
+    assert response.json()["tiktok"][0]["niche"] == "changed"
@@ -0,0 +1,108 @@
+import asyncio
+import random
+import threading
+import time
+
+import pytest
+
+from app.services import database as database_module
+from app.services.executor import BoundedExecutor, ExecutorSaturatedError
+from benchmarks.bench_executor import _slow_query
+from benchmarks.standin import video_url
+
+pytestmark = pytest.mark.anyio
+
+ROWS = 500
+SLOW_SECONDS = 0.5
+
+
+async def test_bounded_executor_rejects_beyond_workers_plus_queue():
+    executor = BoundedExecutor("test", max_workers=1, max_queue=1, retry_after=2.0)
+    executor.start()
+    release = threading.Event()
+    try:
+        running = [asyncio.ensure_future(executor.run(release.wait)) for _ in range(2)]
+        await asyncio.sleep(0.05)
+        with pytest.raises(ExecutorSaturatedError) as error:
+            await executor.run(time.sleep, 0)
+        assert error.value.retry_after == 2.0
+        stats = executor.stats()
+        assert (stats["active"], stats["queued"], stats["rejected"]) == (1, 1, 1)
+    finally:
+        release.set()
+        await asyncio.gather(*running)
+        executor.shutdown()
+    assert executor.stats()["completed"] == 2
+
+
+@pytest.fixture
+def seed_rows():
+    return ROWS
+
+
+@pytest.fixture
+def app_env(app_env):
+    # 3 luồng cho truy vấn tương tác, 3 luồng bulk
+    return {
+        **app_env,
+        "DB_POOL_SIZE": "6",
+        "DB_BULK_WORKERS": "3",
+        "DB_MAX_QUEUE": "4",
+        "DB_BULK_MAX_QUEUE": "50",
+    }
+
+
+async def _probe(client, duration: float, concurrency: int = 4):
+    latencies = []
+    statuses = []
+    deadline = time.perf_counter() + duration
+
+    async def worker(seed_value):
+        rng = random.Random(seed_value)
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            response = await client.get("/url_tiktok", params={"url_tiktok": video_url(rng.randrange(ROWS))})
+            latencies.append(time.perf_counter() - started)
+            statuses.append(response.status_code)
+
+    await asyncio.gather(*(worker(index) for index in range(concurrency)))
+    latencies.sort()
+    return latencies[min(len(latencies) - 1, int(0.99 * len(latencies)))], statuses
+
+
+async def test_url_tiktok_latency_stays_flat_while_bulk_lane_is_busy(app_client):
+    database = database_module.database
+    # Làm nóng (kết nối, import lười) trước khi đo
+    await _probe(app_client, 0.3)
+
+    slow = [asyncio.ensure_future(database.run_bulk(_slow_query, SLOW_SECONDS)) for _ in range(6)]
+    await asyncio.sleep(0.05)
+    p99, statuses = await _probe(app_client, 1.0)
+    await asyncio.gather(*slow)
+
+    assert set(statuses) == {200}
+    # Nếu chung thread-pool với truy vấn chậm, p99 sẽ xấp xỉ SLOW_SECONDS
+    assert p99 < SLOW_SECONDS / 2
+
+
+async def test_saturated_interactive_lane_returns_503_with_retry_after(app_client):
+    database = database_module.database
+    stats = database.stats()["executor"]
+    capacity = stats["workers"] + stats["max_queue"]
+    slow = [asyncio.ensure_future(database.run(_slow_query, SLOW_SECONDS)) for _ in range(capacity)]
+    await asyncio.sleep(0.05)
+    try:
+        started = time.perf_counter()
+        response = await app_client.get("/url_tiktok", params={"url_tiktok": video_url(1)})
+        elapsed = time.perf_counter() - started
+    finally:
+        await asyncio.gather(*slow)
+
+    assert response.status_code == 503
+    assert int(response.headers["Retry-After"]) >= 1
+    # Bị từ chối ngay, không xếp hàng sau các truy vấn chậm
+    assert elapsed < SLOW_SECONDS / 2
+    assert database.stats()["executor"]["rejected"] >= 1
+
+    response = await app_client.get("/url_tiktok", params={"url_tiktok": video_url(1)})
+    assert response.status_code == 200
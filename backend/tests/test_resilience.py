@@ -0,0 +1,200 @@
+import asyncio
+import json
+import time
+
+import httpx
+import pytest
+
+from app.api import routes
+from app.services import resilience
+from app.services.resilience import CircuitOpenError, ConcurrencyLimitError, DeadlineExceededError
+from main import app
+from tests.fake_n8n import Reply, n8n
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def jitter(monkeypatch):
+    # Ghi lại khoảng jitter được yêu cầu và chờ rất ngắn để kiểm thử chạy nhanh
+    bounds = []
+
+    def uniform(low, high):
+        bounds.append((low, high))
+        return 0.01
+
+    monkeypatch.setattr(resilience.random, "uniform", uniform)
+    return bounds
+
+
+async def test_idempotent_call_retries_with_full_jitter(webhook, jitter):
+    webhook.replies = [Reply(503), Reply(502), Reply(200, ['[{"url": "a"}]'])]
+    async with n8n(webhook, tiktok_data_retries=2) as service:
+        assert await service.get_tiktok_data() == [{"url": "a"}]
+
+    assert len(webhook.hits) == 3
+    assert service.policies["tiktok_data"].retried == 2
+    # Full jitter: [0, base * 2^attempt] với base mặc định 0,5 giây
+    assert jitter == [(0, 0.5), (0, 1.0)]
+    assert service.breaker.state == "closed"
+    assert service.breaker.consecutive_failures == 0
+
+
+async def test_retries_stop_after_limit_and_4xx_is_not_retried(webhook, jitter):
+    webhook.replies = [Reply(503)] * 3
+    async with n8n(webhook, tiktok_data_retries=2) as service:
+        with pytest.raises(httpx.HTTPStatusError):
+            await service.get_tiktok_data()
+        assert len(webhook.hits) == 3
+
+        webhook.replies = [Reply(400)]
+        with pytest.raises(httpx.HTTPStatusError):
+            await service.get_tiktok_data()
+    assert len(webhook.hits) == 4
+    # Lỗi 4xx không làm tăng số lỗi liên tiếp của cầu dao
+    assert service.breaker.consecutive_failures == 3
+
+
+async def test_breaker_opens_and_rejects_without_calling_n8n(webhook):
+    webhook.replies = [Reply(500), Reply(500)]
+    async with n8n(webhook, breaker_failure_threshold=2, breaker_reset_timeout=60) as service:
+        for _ in range(2):
+            with pytest.raises(httpx.HTTPStatusError):
+                await service.generate_report("https://www.tiktok.com/@a/video/1", "u1")
+        with pytest.raises(CircuitOpenError):
+            await service.generate_report("https://www.tiktok.com/@a/video/1", "u1")
+
+    assert len(webhook.hits) == 2
+    assert service.breaker.state == "open"
+    assert service.breaker.stats()["rejected"] == 1
+
+
+async def test_half_open_allows_one_trial_then_closes_or_reopens(webhook):
+    async with n8n(webhook, breaker_failure_threshold=1, breaker_reset_timeout=0.1) as service:
+        webhook.replies = [Reply(500)]
+        with pytest.raises(httpx.HTTPStatusError):
+            await service.generate_script("base", ["hook"], False)
+        assert service.breaker.state == "open"
+        await asyncio.sleep(0.15)
+
+        # Lời gọi thử thành công đóng cầu dao; lời gọi khác trong lúc đó bị từ chối
+        webhook.replies = [Reply(200, ["script"], delay=0.2)]
+        trial = asyncio.create_task(service.generate_script("base", ["hook"], False))
+        await asyncio.sleep(0.05)
+        assert service.breaker.state == "half_open"
+        with pytest.raises(CircuitOpenError):
+            await service.generate_script("base", ["hook"], False)
+        assert await trial == "script"
+        assert service.breaker.state == "closed"
+
+        # Lời gọi thử thất bại mở lại cầu dao ngay
+        webhook.replies = [Reply(500), Reply(500)]
+        with pytest.raises(httpx.HTTPStatusError):
+            await service.generate_script("base", ["hook"], False)
+        await asyncio.sleep(0.15)
+        with pytest.raises(httpx.HTTPStatusError):
+            await service.generate_script("base", ["hook"], False)
+        assert service.breaker.state == "open"
+        assert service.breaker.opens == 3
+
+
+async def test_cancelled_half_open_trial_releases_the_breaker(webhook):
+    async with n8n(webhook, breaker_failure_threshold=1, breaker_reset_timeout=0.05) as service:
+        webhook.replies = [Reply(500)]
+        with pytest.raises(httpx.HTTPStatusError):
+            await service.generate_script("base", ["hook"], False)
+        await asyncio.sleep(0.1)
+
+        # Client ngắt kết nối trong lúc lời gọi thử đang chờ n8n
+        webhook.replies = [Reply(200, ["late"], delay=1.0), Reply(200, ["script"])]
+        trial = asyncio.create_task(service.generate_script("base", ["hook"], False))
+        await asyncio.sleep(0.1)
+        trial.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await trial
+
+        assert await service.generate_script("base", ["hook"], False) == "script"
+        assert service.breaker.state == "closed"
+
+
+async def test_limiter_rejects_when_all_slots_are_busy(webhook):
+    webhook.replies = [Reply(200, ["slow"], delay=0.5)]
+    async with n8n(webhook, max_concurrency=1, limiter_timeout=0.05) as service:
+        busy = asyncio.create_task(service.generate_script("base", ["hook"], False))
+        await asyncio.sleep(0.1)
+        with pytest.raises(ConcurrencyLimitError):
+            await service.generate_script("base", ["hook"], False)
+        assert await busy == "slow"
+
+    assert service.limiter.stats()["rejected"] == 1
+    assert len(webhook.hits) == 1
+    # Bị từ chối vì quá tải phía mình không phải lỗi của n8n
+    assert service.breaker.consecutive_failures == 0
+
+
+async def test_deadline_returns_504(webhook, monkeypatch):
+    webhook.replies = [Reply(200, ["late"], delay=1.0)]
+    async with n8n(webhook, script_deadline=0.2) as service:
+        monkeypatch.setattr(routes, "service", service)
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            started = time.monotonic()
+            response = await client.post(
+                "/improvement-script",
+                params={"refresh": "true"},
+                json={"base_text": "base", "improvements": ["hook"], "is_iterative": False},
+            )
+
+    assert response.status_code == 504
+    assert time.monotonic() - started < 0.9
+    assert service.policies["script"].timeouts == 1
+    assert service.breaker.consecutive_failures == 1
+
+
+async def test_stream_deadline_stops_a_stalled_stream(webhook):
+    webhook.replies = [Reply(200, ["first", "second"], chunk_delay=0.15)]
+    received = []
+    async with n8n(webhook, script_deadline=0.25) as service:
+        with pytest.raises(DeadlineExceededError):
+            async for chunk in service.stream_script("base", ["hook"], False):
+                received.append(chunk)
+
+    assert received == ["first"]
+    assert service.policies["script"].timeouts == 1
+    assert service.breaker.consecutive_failures == 1
+    assert service.limiter.stats()["in_flight"] == 0
+
+
+REPORT_URL = "https://www.tiktok.com/@shop/video/7300000000000000001"
+
+
+@pytest.mark.parametrize("products", [
+    [REPORT_URL] * 5,
+    [
+        REPORT_URL,
+        REPORT_URL + "/",
+        REPORT_URL + "?is_from_webapp=1&sender_device=pc",
+        "  HTTPS://WWW.TIKTOK.COM/@shop/video/7300000000000000001#comments ",
+        REPORT_URL + "/?lang=vi",
+    ],
+])
+async def test_concurrent_reports_for_one_video_call_n8n_and_persist_once(webhook, app_client, database, monkeypatch, products):
+    reply = [{"text": "Báo cáo", "niche": "beauty", "keyword": ["serum"]}]
+    # n8n trả lời chậm để mọi yêu cầu đều đến trong lúc lời gọi đầu tiên đang chạy
+    webhook.replies = [Reply(200, [json.dumps(reply)], delay=0.3)]
+    coalesced = routes.report_flight.coalesced
+    async with n8n(webhook) as service:
+        monkeypatch.setattr(routes, "service", service)
+        responses = await asyncio.gather(*(
+            app_client.post("/report", json={"product": product, "userId": "u1"}) for product in products
+        ))
+        await routes.report_writer.flush()
+
+    assert [response.status_code for response in responses] == [200] * len(products)
+    assert {response.json()["video_data"]["url_tiktok"] for response in responses} == {REPORT_URL}
+    assert len(webhook.hits) == 1
+    assert json.loads(webhook.bodies[0])["product"] == REPORT_URL
+    assert routes.report_flight.coalesced - coalesced == len(products) - 1
+
+    rows = database.query("SELECT url_tiktok, niche, description FROM tiktok_info")
+    assert rows == [(REPORT_URL, "beauty", "Báo cáo")]
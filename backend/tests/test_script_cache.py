@@ -0,0 +1,128 @@
+import sqlite3
+
+import httpx
+import pytest
+
+from app.api import routes
+from app.services.script_cache import ScriptCache, script_cache_key
+from main import app
+
+
+class LockedConnection:
+    """
+    Kết nối SQLite giả luôn báo file đang bị khóa (như khi worker khác giữ khóa ghi).
+    """
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, *args):
+        raise sqlite3.OperationalError("database is locked")
+
+
+def test_key_ignores_whitespace_and_improvement_order():
+    key = script_cache_key("Hook\nBody  \n", ["b", " a"], False)
+    assert key == script_cache_key("  Hook\nBody", ["a", "b"], False)
+    assert key != script_cache_key("Hook\nBody", ["a", "b"], True)
+    assert key != script_cache_key("Hook\nOther", ["a", "b"], False)
+
+
+def test_hit_miss_and_expiry():
+    cache = ScriptCache()
+    cache.open()
+    assert cache.get("k") is None
+    cache.set("k", "script")
+    assert cache.get("k") == "script"
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 1
+
+    cache.ttl = -1
+    assert cache.get("k") is None
+    assert cache.stats()["entries"] == 0
+    cache.close()
+
+
+def test_evicts_least_recently_used_over_max_bytes():
+    cache = ScriptCache(max_bytes=10)
+    cache.open()
+    cache.set("a", "aaaa")
+    cache.set("b", "bbbb")
+    cache.get("a")
+    cache.set("c", "cccc")
+    assert cache.get("b") is None
+    assert cache.get("a") == "aaaa"
+    assert cache.stats()["evictions"] == 1
+    cache.close()
+
+
+def test_sqlite_errors_are_treated_as_miss():
+    cache = ScriptCache()
+    cache._conn = LockedConnection()
+    assert cache.get("k") is None
+    cache.set("k", "script")
+    assert cache.stats()["errors"] == 2
+
+
+def test_unopenable_file_disables_cache(tmp_path):
+    cache = ScriptCache(path=str(tmp_path / "missing" / "cache.sqlite3"))
+    cache.open()
+    assert cache.get("k") is None
+    cache.set("k", "script")
+    assert cache.stats()["errors"] == 1
+
+
+@pytest.fixture
+def n8n_calls(monkeypatch):
+    calls = []
+
+    async def generate_script(base_text, improvements, is_iterative):
+        calls.append(base_text)
+        return f"script for {base_text}"
+
+    monkeypatch.setattr(routes.service, "generate_script", generate_script)
+    return calls
+
+
+@pytest.fixture
+def client():
+    # Không chạy lifespan: route chỉ cần cache kịch bản và service n8n (đã được thay)
+    transport = httpx.ASGITransport(app=app)
+    return httpx.AsyncClient(transport=transport, base_url="http://test")
+
+
+@pytest.mark.anyio
+async def test_route_serves_repeat_requests_from_cache(monkeypatch, n8n_calls, client):
+    monkeypatch.setattr(routes, "script_cache", ScriptCache())
+    routes.script_cache.open()
+    body = {"base_text": "report", "improvements": ["hook", "cta"], "is_iterative": False}
+    reordered = {**body, "improvements": ["cta", "hook"]}
+    async with client:
+        first = await client.post("/improvement-script", json=body)
+        second = await client.post("/improvement-script", json=reordered)
+        refreshed = await client.post("/improvement-script", params={"refresh": "true"}, json=body)
+
+    assert first.status_code == second.status_code == refreshed.status_code == 200
+    assert first.headers["X-Cache"] == "MISS"
+    assert second.headers["X-Cache"] == "HIT"
+    assert second.json() == first.json() == "script for report"
+    assert refreshed.headers["X-Cache"] == "MISS"
+    assert n8n_calls == ["report", "report"]
+    routes.script_cache.close()
+
+
+@pytest.mark.anyio
+async def test_route_falls_through_to_n8n_when_cache_is_locked(monkeypatch, n8n_calls, client):
+    locked = ScriptCache()
+    locked._conn = LockedConnection()
+    monkeypatch.setattr(routes, "script_cache", locked)
+    body = {"base_text": "report", "improvements": ["hook"], "is_iterative": False}
+    async with client:
+        response = await client.post("/improvement-script", json=body)
+
+    assert response.status_code == 200
+    assert response.json() == "script for report"
+    assert response.headers["X-Cache"] == "MISS"
+    assert n8n_calls == ["report"]
+    assert locked.stats()["errors"] == 2
@@ -0,0 +1,55 @@
+import asyncio
+import sqlite3
+
+import pytest
+
+from app.api import routes
+from app.services.search import SearchIndex
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def seed_rows():
+    return 10
+
+
+async def test_unopenable_index_runs_closed_and_reopens(tmp_path, database):
+    path = tmp_path / "search.db"
+    path.write_bytes(b"day khong phai file sqlite" * 100)
+    index = SearchIndex(path=str(path), sync_interval=0.02)
+
+    await index.start(database)
+    try:
+        assert not index.is_open
+        assert index.stats()["errors"] == 1
+        assert index.stats()["documents"] == 0
+
+        # Sau khi file được thay, tác vụ nền tự mở lại và đồng bộ
+        path.unlink()
+        deadline = 100
+        while index.stats()["documents"] < 10 and deadline:
+            await asyncio.sleep(0.02)
+            deadline -= 1
+        assert index.is_open
+        assert index.stats()["documents"] == 10
+    finally:
+        await index.stop()
+    assert not index.is_open
+
+
+async def test_search_returns_503_when_the_index_is_closed_or_fails(app_client, monkeypatch):
+    response = await app_client.get("/search", params={"q": "beauty"})
+    assert response.status_code == 200
+
+    def locked(*args):
+        raise sqlite3.OperationalError("database is locked")
+
+    monkeypatch.setattr(routes.search_index, "search", locked)
+    response = await app_client.get("/search", params={"q": "beauty"})
+    assert response.status_code == 503
+    assert response.json()["detail"] == "Chỉ mục tìm kiếm tạm thời không khả dụng."
+
+    routes.search_index.close()
+    response = await app_client.get("/search", params={"q": "beauty"})
+    assert response.status_code == 503
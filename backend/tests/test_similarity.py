@@ -0,0 +1,93 @@
+import asyncio
+
+import pytest
+
+from app.api.conditional import VersionProbe
+from app.api.routes import _fetch_tiktok_version
+from app.services.similarity import SimilarityIndex, fetch_similarity_version
+from benchmarks.standin import video_url
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def seed_rows():
+    return 20
+
+
+def video(url, niche, *keywords):
+    return {"url_tiktok": url, "niche": niche, "keyword": list(keywords)}
+
+
+def library(**options):
+    # "common" có ở hầu hết video, "rare" chỉ ở hai video
+    index = SimilarityIndex(**options)
+    index.upsert([
+        video("shared-facet-rare", "beauty", "rare"),
+        video("shared-facet-common", "beauty", "common"),
+        video("other-rare", "food", "rare"),
+        *(video(f"filler-{i}", "tech", "common") for i in range(12)),
+    ])
+    return index
+
+
+async def wait_for(condition, timeout=2.0):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not condition():
+        assert asyncio.get_running_loop().time() < deadline, "Hết thời gian chờ đồng bộ"
+        await asyncio.sleep(0.01)
+
+
+async def test_keyword_only_edit_is_synced(database):
+    probe = VersionProbe(lambda: database.run_bulk(fetch_similarity_version), ttl=0)
+    index = SimilarityIndex(sync_interval=0.02)
+    await index.start(database, probe)
+    try:
+        await wait_for(lambda: index.loaded)
+        tiktok_version = await database.run_bulk(_fetch_tiktok_version)
+
+        database.query("UPDATE tiktok_info SET keyword = %s WHERE url_tiktok = %s", ('["zzunique"]', video_url(0)))
+        probe.invalidate()
+        query = {"url_tiktok": "https://example.com/new", "keyword": '["zzunique"]'}
+        await wait_for(lambda: bool(index.similar_to(query, limit=1)))
+    finally:
+        await index.stop()
+
+    # Token của /tiktok_data không theo dõi `keyword`, nên chỉ mục phải có token riêng
+    assert await database.run_bulk(_fetch_tiktok_version) == tiktok_version
+    [neighbor] = index.similar_to(query, limit=1)
+    assert neighbor.url_tiktok == video_url(0)
+    assert neighbor.matched_keywords == ["zzunique"]
+
+
+def test_shared_facet_and_rare_keyword_rank_above_common_keyword():
+    index = library()
+    neighbors = index.similar_to(video("query", "beauty", "rare", "common"), limit=4)
+
+    assert [n.url_tiktok for n in neighbors[:3]] == ["shared-facet-rare", "shared-facet-common", "other-rare"]
+    assert neighbors[0].matched_facets == ["niche"]
+    assert neighbors[0].matched_keywords == ["rare"]
+    assert neighbors[0].score > neighbors[1].score > neighbors[2].score > neighbors[3].score
+    # Thư viện nhỏ: từ khóa phổ biến vẫn được tính điểm
+    assert neighbors[3].matched_keywords == ["common"]
+
+
+def test_common_keywords_are_skipped_once_the_library_is_large_enough():
+    index = library(max_keyword_ratio=0.2, keyword_cap_min_documents=10)
+    neighbors = index.similar_to(video("query", "beauty", "rare", "common"), limit=4)
+
+    # "common" (12/15 video) bị bỏ qua: các video chỉ chung từ khóa này không còn được gợi ý
+    assert [n.url_tiktok for n in neighbors] == ["shared-facet-rare", "shared-facet-common", "other-rare"]
+    # Chỉ còn điểm của facet niche
+    assert neighbors[1].score == 3.0
+
+
+async def test_sync_removes_deleted_videos(database):
+    index = SimilarityIndex()
+    await index.sync(database)
+    assert index.similar(video_url(0)) is not None
+
+    database.query("DELETE FROM tiktok_info WHERE url_tiktok = %s", (video_url(0),))
+    assert await index.sync(database) == 1
+    assert index.similar(video_url(0)) is None
+    assert index.documents == 19
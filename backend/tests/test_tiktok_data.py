@@ -0,0 +1,87 @@
+import base64
+
+import pytest
+from fastapi import HTTPException
+
+from app.api import routes
+from app.api.routes import _decode_cursor, _encode_cursor
+from benchmarks.standin import video_url
+
+pytestmark = pytest.mark.anyio
+
+ROWS = 45
+
+
+@pytest.fixture
+def seed_rows():
+    return ROWS
+
+
+def test_cursor_round_trip():
+    for url in (video_url(0), "https://www.tiktok.com/@bếp_nhà/video/1?lang=vi"):
+        cursor = _encode_cursor(url)
+        assert set(cursor) <= set("ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789-_=")
+        assert _decode_cursor(cursor) == url
+
+
+@pytest.mark.parametrize("cursor", [
+    "!!!",
+    "abc",  # thiếu padding
+    _encode_cursor("ab").rstrip("="),  # cursor thật nhưng bị bỏ padding
+    base64.b64encode(b"\xff\xfe").decode(),  # không phải UTF-8
+    base64.urlsafe_b64encode(b"a\nb").decode(),  # ký tự điều khiển
+    "",
+])
+def test_invalid_cursor_is_rejected(cursor):
+    with pytest.raises(HTTPException) as error:
+        _decode_cursor(cursor)
+    assert error.value.status_code == 400
+
+
+async def test_pages_cover_the_table_once(app_client):
+    urls = []
+    cursor = None
+    for _ in range(ROWS):
+        params = {"limit": 20, **({"after": cursor} if cursor else {})}
+        response = await app_client.get("/tiktok_data", params=params)
+        assert response.status_code == 200
+        page = response.json()
+        urls.extend(video["url_tiktok"] for video in page["tiktok"])
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+
+    assert urls == sorted(video_url(i) for i in range(ROWS))
+
+
+@pytest.mark.parametrize("after", ["!!!", "abc", "_w=="])
+async def test_invalid_cursor_returns_400(app_client, after):
+    response = await app_client.get("/tiktok_data", params={"after": after})
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Cursor không hợp lệ."
+
+
+async def get_both(app_client, monkeypatch, params):
+    assert routes.tiktok_serializer.enabled
+    fast = await app_client.get("/tiktok_data", params=params)
+    with monkeypatch.context() as patch:
+        patch.setattr(routes.tiktok_serializer, "enabled", False)
+        slow = await app_client.get("/tiktok_data", params=params)
+    return fast, slow
+
+
+@pytest.mark.parametrize("params", [
+    {},
+    {"limit": 7, "fields": "niche,click,title1"},
+    {"limit": 7, "after": _encode_cursor(video_url(10))},
+    {"limit": 5, "fields": "tym,description", "after": _encode_cursor(video_url(3))},
+    {"limit": 200, "niche": "beauty"},
+    {"all": "true"},
+])
+async def test_fast_and_pydantic_paths_return_identical_bytes(app_client, monkeypatch, params):
+    fast, slow = await get_both(app_client, monkeypatch, params)
+
+    assert fast.status_code == slow.status_code == 200
+    assert fast.content == slow.content
+    assert fast.headers["ETag"] == slow.headers["ETag"]
+    assert fast.json()["tiktok"]
@@ -0,0 +1,131 @@
+import asyncio
+import json
+import sqlite3
+
+import pytest
+
+from app.services.writer import ReportWriter
+
+pytestmark = pytest.mark.anyio
+
+
+class RecordingIndex:
+    def __init__(self, error=None):
+        self.error = error
+        self.rows = []
+
+    def upsert(self, rows):
+        if self.error is not None:
+            raise self.error
+        self.rows.extend(rows)
+
+
+class FlakyAggregate:
+    def __init__(self):
+        self.calls = 0
+
+    def add(self, table, keywords):
+        self.calls += 1
+        if self.calls == 1:
+            raise RuntimeError("boom")
+
+
+def report(url, **extra):
+    return {"url_tiktok": url, "description": "report", "niche": "beauty", "title": "title", **extra}
+
+
+async def test_keyword_is_persisted_and_kept_on_update(database):
+    writer = ReportWriter(database)
+    writer.add(report("u1", keyword=["mẹo", "review"]))
+    writer.add(report("u2", keyword='["a"]'))
+    assert await writer.flush()
+
+    rows = dict(database.query("SELECT url_tiktok, keyword FROM tiktok_info ORDER BY url_tiktok"))
+    assert json.loads(rows["u1"]) == ["mẹo", "review"]
+    assert json.loads(rows["u2"]) == ["a"]
+
+    # Dòng chưa hoàn thành được cập nhật; báo cáo không kèm từ khóa giữ nguyên từ khóa cũ
+    database.query("UPDATE tiktok_info SET status = 'pending' WHERE url_tiktok = 'u1'")
+    writer.add(report("u1", description="new report"))
+    assert await writer.flush()
+    assert database.query("SELECT description, keyword FROM tiktok_info WHERE url_tiktok = 'u1'") == [
+        ("new report", '["mẹo", "review"]')
+    ]
+
+
+async def test_local_index_failure_does_not_fail_the_write(database):
+    search_index = RecordingIndex(error=sqlite3.OperationalError("database is locked"))
+    similarity_index = RecordingIndex()
+    writer = ReportWriter(database, search_index=search_index, similarity_index=similarity_index)
+    writer.add(report("u1", keyword=["a"]))
+
+    assert await writer.flush()
+    assert database.query("SELECT COUNT(*) FROM tiktok_info") == [(1,)]
+    assert [row["url_tiktok"] for row in similarity_index.rows] == ["u1"]
+    assert writer.stats()["index_errors"] == 1
+    assert writer.stats()["written"] == 1
+
+
+async def test_flush_loop_survives_unexpected_errors(database):
+    writer = ReportWriter(database, keyword_aggregate=FlakyAggregate(), flush_interval=0.02)
+    await writer.start()
+    try:
+        writer.add(report("u1"))
+        await asyncio.sleep(0.1)
+        writer.add(report("u2"))
+        await asyncio.sleep(0.1)
+        assert not writer._task.done()
+    finally:
+        await writer.stop()
+
+    assert database.query("SELECT url_tiktok FROM tiktok_info ORDER BY url_tiktok") == [("u1",), ("u2",)]
+    assert writer.stats()["errors"] == 1
+
+
+class GatedDatabase:
+    """
+    Lô ghi chờ `release` như khi luồng bulk đang bận với truy vấn khác.
+    """
+    def __init__(self, database):
+        self.database = database
+        self.waiting = asyncio.Event()
+        self.release = asyncio.Event()
+
+    async def run_bulk(self, func, *args):
+        self.waiting.set()
+        await self.release.wait()
+        return await self.database.run_bulk(func, *args)
+
+
+async def test_stop_during_an_in_flight_flush_keeps_the_batch(database):
+    gated = GatedDatabase(database)
+    writer = ReportWriter(gated, batch_size=1)
+    await writer.start()
+    writer.add(report("u1"))
+    await asyncio.wait_for(gated.waiting.wait(), 1)
+    assert writer.stats()["pending"] == 0
+
+    stopping = asyncio.create_task(writer.stop())
+    await asyncio.sleep(0.05)
+    assert not stopping.done()
+    gated.release.set()
+    await asyncio.wait_for(stopping, 1)
+
+    assert database.query("SELECT url_tiktok FROM tiktok_info") == [("u1",)]
+    assert (writer.stats()["written"], writer.stats()["dropped"]) == (1, 0)
+
+
+async def test_cancelled_flush_returns_the_batch_to_the_buffer(database):
+    gated = GatedDatabase(database)
+    writer = ReportWriter(gated)
+    writer.add(report("u1"))
+    flush = asyncio.create_task(writer.flush())
+    await asyncio.wait_for(gated.waiting.wait(), 1)
+    flush.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await flush
+
+    assert writer.stats()["pending"] == 1
+    gated.release.set()
+    assert await writer.flush()
+    assert database.query("SELECT url_tiktok FROM tiktok_info") == [("u1",)]
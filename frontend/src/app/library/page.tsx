@@ -9,6 +9,7 @@ import { collection, query, where, getDocs } from 'firebase/firestore';
 import { db } from '@/lib/firebase';
 import { Footer } from '@/components/Footer';
 import { TikTokData } from '@/types/tiktok';
+import { fetchTiktokPage } from '@/lib/tiktokData';
 
 // --- Icons ---
 const MagnifyingGlassIcon = ({ className }: { className?: string }) => (<svg xmlns="http://www.w3.org/2000/svg" fill="none" viewBox="0 0 24 24" strokeWidth={1.5} stroke="currentColor" className={className || "w-6 h-6"}><path strokeLinecap="round" strokeLinejoin="round" d="m21 21-5.197-5.197m0 0A7.5 7.5 0 1 0 5.196 5.196a7.5 7.5 0 0 0 10.607 10.607Z" /></svg>);
@@ -18,6 +19,10 @@ const TagIcon = ({ className }: { className?: string }) => (<svg xmlns="http://w
 // --- Hằng số và Kiểu dữ liệu ---
 const TIKTOK_DATA_CACHE_KEY = 'tiktokDataCache';
 const VIDEOS_PER_PAGE = 12;
+// Số video mỗi lần đọc /tiktok_data; trang tiếp theo chỉ được tải khi người dùng cuộn tới cuối
+const LIBRARY_PAGE_SIZE = 48;
+// Firestore giới hạn số giá trị của toán tử 'in' trong một truy vấn
+const USER_QUERY_BATCH = 10;
 
 
 
@@ -37,8 +42,30 @@ export default function TiktokLibrary() {
     const [topKeywords, setTopKeywords] = useState<KeywordData[]>([]);
     const [keywordsLoading, setKeywordsLoading] = useState(true);
     const [userNames, setUserNames] = useState<Record<string, string>>({});
+    const [nextCursor, setNextCursor] = useState<string | null>(null);
+    const isFetchingPage = useRef(false);
+    const requestedUserIds = useRef<Set<string>>(new Set());
 
-    const { visibleItems, loadMoreItems, hasMore } = useInfiniteScroll(filteredVideos, VIDEOS_PER_PAGE);
+    // Đọc trang tiếp theo của thư viện theo next_cursor và nối vào danh sách đã có
+    const fetchNextPage = useCallback(async () => {
+        if (!nextCursor || isFetchingPage.current) return;
+        isFetchingPage.current = true;
+        try {
+            const page = await fetchTiktokPage(nextCursor, LIBRARY_PAGE_SIZE);
+            setAllVideos(prev => [...prev, ...page.videos]);
+            setNextCursor(page.nextCursor);
+        } catch (error) {
+            console.error("Error fetching videos:", error);
+        } finally {
+            isFetchingPage.current = false;
+        }
+    }, [nextCursor]);
+
+    const { visibleItems, loadMoreItems, hasMore } = useInfiniteScroll(filteredVideos, VIDEOS_PER_PAGE, {
+        resetKey: `${searchTerm}|${sortOption}`,
+        fetchMore: fetchNextPage,
+        canFetchMore: nextCursor !== null,
+    });
 
     const observer = useRef<IntersectionObserver | null>(null);
     const loadMoreRef = useCallback((node: HTMLDivElement | null) => {
@@ -52,48 +79,27 @@ export default function TiktokLibrary() {
         if (node) observer.current.observe(node);
     }, [isInitialLoading, loadMoreItems, hasMore]);
 
-    // Effect để tải dữ liệu video, keywords, và usernames
+    // Effect để tải dữ liệu video và keywords
     useEffect(() => {
         const fetchData = async () => {
-            let videosFromCache: TikTokData[] = [];
-            // Tải video từ cache
+            // Hiển thị ngay các video trong cache (trang chủ lưu trang đầu tiên)
             try {
                 const cachedItem = localStorage.getItem(TIKTOK_DATA_CACHE_KEY);
                 if (cachedItem) {
                     const cachedData = JSON.parse(cachedItem);
-                    videosFromCache = cachedData.videos;
-                    setAllVideos(videosFromCache);
-                    setFilteredVideos(videosFromCache);
+                    setAllVideos(cachedData.videos);
+                    setFilteredVideos(cachedData.videos);
                 }
             } catch (e) { console.error("Error reading cache:", e); }
             finally { setIsInitialLoading(false); }
 
-            // --- THÊM LOGIC: Lấy tên người dùng ---
-            if (videosFromCache.length > 0) {
-                // Lấy danh sách các ID người dùng duy nhất
-                const userIds = [...new Set(videosFromCache.map(v => v.userId).filter(Boolean))] as string[];
-
-                if (userIds.length > 0) {
-                    try {
-                        const usersRef = collection(db, 'users');
-
-                        // THAY ĐỔI: Tìm kiếm dựa trên trường 'uid' thay vì ID của document
-                        const q = query(usersRef, where('uid', 'in', userIds));
-
-                        const querySnapshot = await getDocs(q);
-                        const namesMap: Record<string, string> = {};
-
-                        querySnapshot.forEach((doc) => {
-                            const userData = doc.data();
-                            // Dùng userData.uid để làm key cho map
-                            namesMap[userData.uid] = userData.username || 'Unknown User';
-                        });
-
-                        setUserNames(namesMap);
-                    } catch (error) {
-                        console.error("Error fetching usernames:", error);
-                    }
-                }
+            // Trang đầu tiên từ backend; các trang sau được tải dần khi cuộn (fetchNextPage)
+            try {
+                const page = await fetchTiktokPage(null, LIBRARY_PAGE_SIZE);
+                setAllVideos(page.videos);
+                setNextCursor(page.nextCursor);
+            } catch (error) {
+                console.error("Error fetching videos:", error);
             }
 
             // Tải keywords từ backend (giữ nguyên)
@@ -111,6 +117,36 @@ export default function TiktokLibrary() {
         };
         fetchData();
     }, []);
+
+    // Lấy tên người dùng cho các video mới được tải (mỗi ID chỉ hỏi Firestore một lần)
+    useEffect(() => {
+        const userIds = [...new Set(allVideos.map(v => v.userId).filter(Boolean))]
+            .filter(id => !requestedUserIds.current.has(id as string)) as string[];
+        if (userIds.length === 0) return;
+        userIds.forEach(id => requestedUserIds.current.add(id));
+
+        const fetchUserNames = async () => {
+            try {
+                const usersRef = collection(db, 'users');
+                const namesMap: Record<string, string> = {};
+                for (let i = 0; i < userIds.length; i += USER_QUERY_BATCH) {
+                    // Tìm kiếm dựa trên trường 'uid' thay vì ID của document
+                    const q = query(usersRef, where('uid', 'in', userIds.slice(i, i + USER_QUERY_BATCH)));
+                    const querySnapshot = await getDocs(q);
+                    querySnapshot.forEach((doc) => {
+                        const userData = doc.data();
+                        // Dùng userData.uid để làm key cho map
+                        namesMap[userData.uid] = userData.username || 'Unknown User';
+                    });
+                }
+                setUserNames(prev => ({ ...prev, ...namesMap }));
+            } catch (error) {
+                console.error("Error fetching usernames:", error);
+            }
+        };
+        fetchUserNames();
+    }, [allVideos]);
+
     useEffect(() => {
         let processedVideos = [...allVideos];
         // SỬA LỖI 1: Đảm bảo searchTerm luôn là một chuỗi trước khi gọi toLowerCase
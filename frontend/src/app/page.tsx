@@ -7,9 +7,12 @@ import SearchBox from '@/components/SearchBox';
 import TikTokGrid from '@/components/TiktokGrid';
 import Image from 'next/image';
 import { Footer } from '@/components/Footer';
+import { fetchTiktokPage } from '@/lib/tiktokData';
 
 // --- Hằng số và Kiểu dữ liệu (giữ nguyên) ---
 const TIKTOK_DATA_CACHE_KEY = 'tiktokDataCache';
+// Số video hiển thị trên trang chủ (thư viện đầy đủ tải dần ở /library)
+const HOME_VIDEO_COUNT = 12;
 
 interface TikTokData {
     url_tiktok: string;
@@ -49,29 +52,15 @@ export default function Page() {
                 }
             } catch (e) { console.error("Error reading cache:", e); }
 
-            // Luôn fetch dữ liệu mới
+            // Luôn fetch dữ liệu mới; trang chủ chỉ hiển thị vài video nên chỉ đọc trang đầu tiên
             try {
-                const response = await fetch(`${process.env.NEXT_PUBLIC_API_URL}/tiktok_data`);
-                if (!response.ok) throw new Error(`API Error: ${response.statusText}`);
-                
-                const data: { tiktok: any[] } = await response.json();
-
-                const parsedVideos: TikTokData[] = data.tiktok.map(video => {
-                    let parsedKeywords: string[] | null = null;
-                    if (video.keyword && typeof video.keyword === 'string') {
-                        try { parsedKeywords = JSON.parse(video.keyword); } catch (e) { /* ignore */ }
-                    } else if (Array.isArray(video.keyword)) {
-                        parsedKeywords = video.keyword;
-                    }
-                    return { ...video, keyword: parsedKeywords };
-                });
-
-                setVideos(parsedVideos);
+                const { videos: freshVideos } = await fetchTiktokPage(null, HOME_VIDEO_COUNT);
+                setVideos(freshVideos);
                 setError(null);
 
-                const newCacheData: CachedTiktokData = { videos: parsedVideos, timestamp: Date.now() };
+                const newCacheData: CachedTiktokData = { videos: freshVideos, timestamp: Date.now() };
                 localStorage.setItem(TIKTOK_DATA_CACHE_KEY, JSON.stringify(newCacheData));
-                
+
             } catch (err: any) {
                 if (videos.length === 0) {
                    setError("Could not load video library. Please try again.");
@@ -116,8 +105,7 @@ export default function Page() {
                 
                 {videos.length > 0 && (
                     <TikTokGrid 
-                        videos={videos.slice(0, 12
-                        )} // Chỉ hiển thị 10 video
+                        videos={videos.slice(0, HOME_VIDEO_COUNT)}
                         userNames={{}} // Giả sử không cần dữ liệu userNames ở đây
                     />
                 )}
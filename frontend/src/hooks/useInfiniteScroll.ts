@@ -1,24 +1,33 @@
-import { useState, useEffect, useCallback } from 'react';
+import { useState, useEffect, useCallback, useMemo } from 'react';
+
+interface InfiniteScrollOptions {
+    resetKey?: unknown; // Thay đổi (ví dụ từ khóa tìm kiếm, cách sắp xếp) thì quay về trang đầu
+    fetchMore?: () => void; // Tải thêm dữ liệu từ server khi đã hiển thị hết `items`
+    canFetchMore?: boolean;
+}
 
 // Custom hook để quản lý việc hiển thị dữ liệu theo từng trang
-export function useInfiniteScroll<T>(items: T[], itemsPerPage: number = 20) {
+export function useInfiniteScroll<T>(items: T[], itemsPerPage: number = 20, options: InfiniteScrollOptions = {}) {
+    const { resetKey, fetchMore, canFetchMore = false } = options;
     const [page, setPage] = useState(1);
-    const [visibleItems, setVisibleItems] = useState<T[]>(() => items.slice(0, itemsPerPage));
 
-    // Cập nhật lại visibleItems khi danh sách gốc (đã lọc/sắp xếp) thay đổi
+    // Quay về trang 1 khi bộ lọc thay đổi; khi chỉ có thêm dữ liệu (trang mới từ server) thì giữ nguyên
     useEffect(() => {
-        setPage(1); // Reset lại trang về 1
-        setVisibleItems(items.slice(0, itemsPerPage));
-    }, [items, itemsPerPage]);
+        setPage(1);
+    }, [resetKey, itemsPerPage]);
+
+    const visibleItems = useMemo(() => items.slice(0, page * itemsPerPage), [items, page, itemsPerPage]);
+    const hasLocalMore = visibleItems.length < items.length;
 
     const loadMoreItems = useCallback(() => {
-        const nextPage = page + 1;
-        const newItems = items.slice(0, nextPage * itemsPerPage);
-        setVisibleItems(newItems);
-        setPage(nextPage);
-    }, [page, items, itemsPerPage]);
+        if (hasLocalMore) {
+            setPage(current => current + 1);
+        } else if (canFetchMore && fetchMore) {
+            fetchMore();
+        }
+    }, [hasLocalMore, canFetchMore, fetchMore]);
 
-    const hasMore = visibleItems.length < items.length;
+    const hasMore = hasLocalMore || canFetchMore;
 
     return { visibleItems, loadMoreItems, hasMore };
-}
\ No newline at end of file
+}
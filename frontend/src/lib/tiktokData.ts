@@ -0,0 +1,25 @@
+// src/lib/tiktokData.ts
+
+import { TikTokData } from '@/types/tiktok';
+
+// Các cột lưới video cần; bỏ `description` (nội dung báo cáo, rất lớn) vì trang nghiên cứu tự tải lại
+export const TIKTOK_GRID_FIELDS = [
+    'url_tiktok', 'click', 'tym', 'userId', 'niche', 'content_angle', 'hook_type',
+    'product_type', 'script_framework', 'title', 'title1', 'title2',
+];
+
+export interface TikTokDataPage {
+    videos: TikTokData[];
+    nextCursor: string | null; // null nếu đã hết dữ liệu
+}
+
+// Đọc một trang /tiktok_data (phân trang theo keyset); truyền `cursor` của trang trước để đọc trang tiếp theo
+export async function fetchTiktokPage(cursor: string | null, limit: number): Promise<TikTokDataPage> {
+    const params = new URLSearchParams({ limit: String(limit), fields: TIKTOK_GRID_FIELDS.join(',') });
+    if (cursor) params.set('after', cursor);
+    const response = await fetch(`${process.env.NEXT_PUBLIC_API_URL}/tiktok_data?${params.toString()}`);
+    if (!response.ok) throw new Error(`API Error: ${response.statusText}`);
+
+    const data: { tiktok: TikTokData[]; next_cursor?: string | null } = await response.json();
+    return { videos: data.tiktok, nextCursor: data.next_cursor ?? null };
+}